@@ -18,6 +18,90 @@ const long SERIAL_SPEED = 1000000;
 // 모든 센서 데이터를 담을 버퍼 (넉넉하게 1024 바이트 할당)
 char dataBuffer[1024];
 
+// --- 바이너리 프레임 모드 ---
+// 호스트가 'B' 를 보내면 바이너리 프레임, 'A' 를 보내면 ASCII(디버깅용)로 전환 (기본값 ASCII)
+// 'T' 는 ASCII 라인 앞에 "#seq,micros," 를 붙여 보냄 (호스트 clock_sync.py 가 장치 시각 -> 호스트 시각 변환에 사용)
+// 구조는 호스트 측 frame_protocol.py 의 FRAME_DTYPE 과 반드시 일치해야 함
+const int TOTAL_SENSORS = NUM_MUXES * SENSORS_PER_MUX;
+const uint16_t FRAME_SYNC = 0x5AA5;
+
+struct __attribute__((packed)) BinaryFrame {
+    uint16_t sync;          // 0x5AA5 (전송 바이트: A5 5A)
+    uint32_t seq;           // 프레임 순번
+    uint32_t micros;        // 스캔 시작 시각 (Teensy micros())
+    uint32_t failMask;      // bit i: 센서 i 미연결 (ASCII 의 FAIL)
+    uint32_t rFailMask;     // bit i: 센서 i 읽기 실패 (ASCII 의 R_FAIL)
+    float values[TOTAL_SENSORS * 3];  // 센서 순서대로 x, y, z
+    uint16_t crc;           // seq ~ values 구간의 CRC-16/CCITT-FALSE
+};
+
+BinaryFrame frame;
+uint32_t frameSeq = 0;
+bool binaryMode = false;
+bool asciiClock = false;
+
+/**
+ * @brief CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)
+ */
+uint16_t crc16_ccitt(const uint8_t *data, size_t len) {
+    uint16_t crc = 0xFFFF;
+    for (size_t n = 0; n < len; n++) {
+        crc ^= (uint16_t)data[n] << 8;
+        for (int b = 0; b < 8; b++) {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+        }
+    }
+    return crc;
+}
+
+/**
+ * @brief 호스트에서 온 출력 모드 전환 명령('A'/'B'/'T') 처리
+ */
+void checkModeCommand() {
+    while (Serial.available() > 0) {
+        char c = Serial.read();
+        if (c == 'B') binaryMode = true;
+        else if (c == 'A') { binaryMode = false; asciiClock = false; }
+        else if (c == 'T') { binaryMode = false; asciiClock = true; }
+    }
+}
+
+/**
+ * @brief 모든 센서를 읽어 하나의 바이너리 프레임으로 전송
+ * 실패한 센서의 값은 0 으로 채우고 상태는 비트마스크로 전달
+ */
+void sendBinaryFrame() {
+    frame.sync = FRAME_SYNC;
+    frame.seq = frameSeq++;
+    frame.micros = micros();
+    frame.failMask = 0;
+    frame.rFailMask = 0;
+
+    for (int j = 0; j < NUM_MUXES; j++) {
+        TwoWire* bus = (j == 0) ? &Wire : (j == 1) ? &Wire1 : &Wire2;
+        for (int i = 0; i < SENSORS_PER_MUX; i++) {
+            int idx = j * SENSORS_PER_MUX + i;
+            float *v = &frame.values[idx * 3];
+            v[0] = v[1] = v[2] = 0.0f;
+            if (!is_connected[j][i]) {
+                frame.failMask |= (1UL << idx);
+                continue;
+            }
+            tcaSelect(muxAddresses[j], i, bus);
+            if (sensors[j][i].getEvent(&event)) {
+                v[0] = event.magnetic.x;
+                v[1] = event.magnetic.y;
+                v[2] = event.magnetic.z;
+            } else {
+                frame.rFailMask |= (1UL << idx);
+            }
+        }
+    }
+
+    frame.crc = crc16_ccitt((const uint8_t *)&frame + 2, sizeof(frame) - 4);
+    Serial.write((const uint8_t *)&frame, sizeof(frame));
+}
+
 /**
  * @brief TCA9548A 멀티플렉서 채널 선택
  * @param muxAddress 멀티플렉서의 I2C 주소
@@ -87,21 +171,33 @@ void setup() {
 }
 
 void loop() {
-    // 버퍼 초기화
-    dataBuffer[0] = '\0';
+    checkModeCommand();
+    if (binaryMode) {
+        sendBinaryFrame();
+        return;
+    }
+
+    // 버퍼 초기화 (타임스탬프 모드에서는 바이너리 프레임과 같은 순번/스캔 시작 시각을 앞에 붙임)
+    uint32_t seq = frameSeq++;
+    uint32_t scanMicros = micros();
+    int prefixLen = asciiClock ? snprintf(dataBuffer, sizeof(dataBuffer), "#%lu,%lu,",
+                                          (unsigned long)seq, (unsigned long)scanMicros) : 0;
+    char* line = dataBuffer + prefixLen;
+    size_t lineSize = sizeof(dataBuffer) - prefixLen;
+    line[0] = '\0';
     
     // 첫 센서 데이터는 앞에 콤마가 없도록 별도로 처리
     if (is_connected[0][0]) {
         tcaSelect(muxAddresses[0], 0, &Wire);
         if (sensors[0][0].getEvent(&event)) {
-            snprintf(dataBuffer, sizeof(dataBuffer), "S_%x_%d,%.2f,%.2f,%.2f", 
+            snprintf(line, lineSize, "S_%x_%d,%.2f,%.2f,%.2f", 
                      muxAddresses[0], 0, event.magnetic.x, event.magnetic.y, event.magnetic.z);
         } else {
-            snprintf(dataBuffer, sizeof(dataBuffer), "S_%x_%d,R_FAIL,R_FAIL,R_FAIL", 
+            snprintf(line, lineSize, "S_%x_%d,R_FAIL,R_FAIL,R_FAIL", 
                      muxAddresses[0], 0);
         }
     } else {
-        snprintf(dataBuffer, sizeof(dataBuffer), "S_%x_%d,FAIL,FAIL,FAIL", 
+        snprintf(line, lineSize, "S_%x_%d,FAIL,FAIL,FAIL", 
                  muxAddresses[0], 0);
     }
 
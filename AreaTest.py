@@ -1,23 +1,25 @@
 import serial
-import numpy as np
 import openvr
 import pandas as pd
 from datetime import datetime
 import time
 import os
 import threading
-import queue
 import msvcrt
+from frame_parser import SENSOR_COLUMN_NAMES
+from serial_stream import make_frame_ring, serial_reader
+from session_recorder import SessionRecorder, export_csv
+from pose_math import get_euler_angles_from_matrix, get_quaternion_from_matrix
 
 # --- Configuration ---
 ARDUINO_PORT = 'COM9'
 BAUD_RATE = 1000000
 TOTAL_SENSORS = 24
-MAX_RECORDS = 100000
+EXPORT_CSV_ON_EXIT = True  # Export the session segments to training_data_*.csv on exit (processing.py input format)
 NUM_TRACKERS = 2
 
 # --- Inter-thread data sharing and control ---
-data_queue = queue.Queue()
+frame_ring = make_frame_ring()
 stop_thread = threading.Event()
 
 # User input states
@@ -26,27 +28,6 @@ patch1_inference_enabled = False
 patch2_inference_enabled = False
 
 # --- Helper Functions ---
-def serial_reader_optimized(ser, q, stop_event):
-    """
-    Optimized thread function to continuously read data from the serial port.
-    It reads a large chunk of available data at once to reduce I/O overhead.
-    """
-    print("Optimized serial reader thread started.")
-    buffer = b''
-    while not stop_event.is_set():
-        try:
-            if ser.in_waiting > 0:
-                buffer += ser.read(ser.in_waiting)
-                while b'\n' in buffer:
-                    line, buffer = buffer.split(b'\n', 1)
-                    if line:
-                        q.put(line.decode('utf-8', 'ignore').strip())
-        except (serial.SerialException, TypeError):
-            break
-        
-        time.sleep(0.0001)
-    print("Optimized serial reader thread finished.")
-
 def input_listener_non_blocking():
     """
     Thread function to listen for non-blocking key presses.
@@ -81,43 +62,6 @@ def get_tracker_poses(tracker_ids):
             tracker_data[tracker_id] = {'pos': pos, 'matrix': matrix}
     return tracker_data
 
-def get_euler_angles_from_matrix(m):
-    """Calculates Roll, Pitch, and Yaw Euler angles from a rotation matrix."""
-    yaw = np.degrees(np.arctan2(m[1][0], m[0][0]))
-    pitch = np.degrees(np.arctan2(-m[2][0], np.sqrt(m[2][1]**2 + m[2][2]**2)))
-    roll = np.degrees(np.arctan2(m[2][1], m[2][2]))
-    return roll, pitch, yaw
-    
-def get_quaternion_from_matrix(m):
-    """Calculates the Quaternion (x, y, z, w) from a rotation matrix."""
-    trace = m[0][0] + m[1][1] + m[2][2]
-    if trace > 0:
-        s = 0.5 / np.sqrt(trace + 1.0)
-        w = 0.25 / s
-        x = (m[2][1] - m[1][2]) * s
-        y = (m[0][2] - m[2][0]) * s
-        z = (m[1][0] - m[0][1]) * s
-    else:
-        if m[0][0] > m[1][1] and m[0][0] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[0][0] - m[1][1] - m[2][2])
-            w = (m[2][1] - m[1][2]) / s
-            x = 0.25 * s
-            y = (m[0][1] + m[1][0]) / s
-            z = (m[0][2] + m[2][0]) / s
-        elif m[1][1] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[1][1] - m[0][0] - m[2][2])
-            w = (m[0][2] - m[2][0]) / s
-            x = (m[0][1] + m[1][0]) / s
-            y = 0.25 * s
-            z = (m[1][2] + m[2][1]) / s
-        else:
-            s = 2.0 * np.sqrt(1.0 + m[2][2] - m[0][0] - m[1][1])
-            w = (m[1][0] - m[0][1]) / s
-            x = (m[0][2] + m[2][0]) / s
-            y = (m[1][2] + m[2][1]) / s
-            z = 0.25 * s
-    return [x, y, z, w]
-
 def record_area_points(tracker_id, area_label, geom_data_list):
     """Records the corner position for a given area using a specific tracker."""
     print(f"\n>>> Recording for {area_label} using Tracker {tracker_id}. Press 'q' to stop.")
@@ -131,21 +75,24 @@ def record_area_points(tracker_id, area_label, geom_data_list):
         else:
             print("      - Error: Could not read tracker position. Skipping this point.")
 
-def save_to_csv(data_array, col_order, num_records, geom_data):
-    """Saves collected data to CSV files."""
+def save_session(recorder, session_stamp, geom_data):
+    """Saves geometry data, links it to the session, closes the session and (optionally) exports it to CSV."""
     if len(geom_data) > 0:
         print("\nSaving geometry (fixed coordinates) data...")
         df_geom = pd.DataFrame(geom_data)
-        geom_filename = f"device_geometry_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        geom_filename = f"device_geometry_{session_stamp}.csv"
         df_geom.to_csv(geom_filename, index=False)
+        recorder.set_geometry(geom_filename)
         print(f"File '{geom_filename}' saved.")
 
-    if num_records > 0:
-        print("\nSaving real-time collected data...")
-        df_ts = pd.DataFrame(data_array[:num_records], columns=col_order)
-        ts_filename = f"training_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        df_ts.to_csv(ts_filename, index=False)
-        print(f"Total {num_records} time-series data points saved to '{ts_filename}'.")
+    # Time-series rows are already on disk as segments; trim the last one and mark the manifest complete
+    manifest_path = recorder.close()
+    print(f"\nTotal {recorder.rows} time-series data points recorded in session '{manifest_path}'.")
+
+    if EXPORT_CSV_ON_EXIT and recorder.rows > 0:
+        ts_filename = f"training_data_{session_stamp}.csv"
+        export_csv(recorder.session_dir, ts_filename)
+        print(f"Exported to '{ts_filename}'.")
 
 # --- OpenVR and Serial Port Initialization ---
 try:
@@ -173,17 +120,10 @@ for i in range(NUM_TRACKERS):
         f'tracker{i+1}_rot_quat_x', f'tracker{i+1}_rot_quat_y', f'tracker{i+1}_rot_quat_z', f'tracker{i+1}_rot_quat_w'
     ])
 
-sensor_column_names = []
-sensor_ids_ordered = []
-for i in range(TOTAL_SENSORS):
-    mux_addr, channel = 0x70 + (i // 8), i % 8
-    sid = f"S_{mux_addr:x}_{channel}"
-    sensor_ids_ordered.append(sid)
-    sensor_column_names.extend([f'{sid}_x', f'{sid}_y', f'{sid}_z'])
-column_order.extend(sensor_column_names)
+column_order.extend(SENSOR_COLUMN_NAMES)
 
-time_series_data_array = np.zeros((MAX_RECORDS, len(column_order)))
-record_index = 0
+session_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+recorder = SessionRecorder(f"session_{session_stamp}", column_order)
 
 # --- Main Execution Logic ---
 reader_thread = None
@@ -198,7 +138,7 @@ try:
             print("--- ✅ Synchronization complete! Press 'g' to start geometry mode, 'o' to toggle inference, 'Ctrl+C' to stop. ---")
             break
 
-    reader_thread = threading.Thread(target=serial_reader_optimized, args=(ser, data_queue, stop_thread))
+    reader_thread = threading.Thread(target=serial_reader, args=(ser, frame_ring, stop_thread))
     reader_thread.start()
     input_thread = threading.Thread(target=input_listener_non_blocking, daemon=True)
     input_thread.start()
@@ -224,45 +164,24 @@ try:
                         break
                 time.sleep(0.1)
 
-        if record_index >= MAX_RECORDS:
-            print("\nMaximum record count reached, stopping collection.")
-            stop_thread.set()
-            break
-        
-        try:
-            line = data_queue.get_nowait()
-        except queue.Empty:
-            time.sleep(0.001)
-            continue
+        # Block until frames arrive (no busy polling) and take everything queued so far in one batch
+        frames = frame_ring.read(timeout=0.1)
 
-        if not line.startswith("S_"):
-            continue
-            
-        parts = line.split(',')
-        if len(parts) != TOTAL_SENSORS * 4: 
-            print(f"Warning: Unexpected data length. Expected {TOTAL_SENSORS * 4} parts, got {len(parts)}. Skipping this line.")
-            continue
+        for frame in frames:
+            # The reader thread provides the 72 sensor values already in column order
+            sensor_values = frame['values'].tolist()
 
-        temp_sensor_readings = {}
-        for i in range(0, len(parts), 4):
-            sensor_id, cx_str, cy_str, cz_str = parts[i:i+4]
-            try:
-                temp_sensor_readings[sensor_id] = {'x': float(cx_str), 'y': float(cy_str), 'z': float(cz_str)}
-            except ValueError:
-                temp_sensor_readings[sensor_id] = {'x': 0, 'y': 0, 'z': 0}
-        
-        if len(temp_sensor_readings) == TOTAL_SENSORS:
             tracker_poses = get_tracker_poses(tracker_ids)
-            
-            status_line = f"Collecting data... [{record_index + 1}/{MAX_RECORDS}] | T1: {'OK' if tracker_ids[0] in tracker_poses else 'N/A'}, T2: {'OK' if tracker_ids[1] in tracker_poses else 'N/A'}"
+        
+            status_line = f"Collecting data... [{recorder.rows + 1}] | T1: {'OK' if tracker_ids[0] in tracker_poses else 'N/A'}, T2: {'OK' if tracker_ids[1] in tracker_poses else 'N/A'}"
             print(status_line, end='\r')
-            
+        
             row_data = [
-                time.time(), 
+                float(frame['host_time']), 
                 int(patch1_inference_enabled), 
                 int(patch2_inference_enabled)
             ]
-            
+        
             for tracker_id in tracker_ids:
                 if tracker_id in tracker_poses:
                     pos = tracker_poses[tracker_id]['pos']
@@ -277,15 +196,10 @@ try:
                 else:
                     # Append zeros if tracker data is missing
                     row_data.extend([0.0] * 10)
-            
-            sensor_values = []
-            for sid in sensor_ids_ordered:
-                sensor_data = temp_sensor_readings.get(sid, {'x': 0, 'y': 0, 'z': 0})
-                sensor_values.extend([sensor_data['x'], sensor_data['y'], sensor_data['z']])
+        
             row_data.extend(sensor_values)
-            
-            time_series_data_array[record_index] = row_data
-            record_index += 1
+        
+            recorder.append(row_data)
     
     # 2단계: 꼭짓점 좌표 기록 (프로그램 종료 전)
     print("\n\n--- Geometry recording mode activated. Press 'q' to exit this mode. ---")
@@ -307,10 +221,11 @@ finally:
     stop_thread.set()
     if reader_thread:
         reader_thread.join()
+    print(f"Ring buffer stats: {frame_ring.stats()}")
     if input_thread:
         input_thread.join()
     
-    save_to_csv(time_series_data_array, column_order, record_index, geometry_data)
+    save_session(recorder, session_stamp, geometry_data)
     
     ser.close()
     if 'vr_system' in locals() and vr_system is not None:
@@ -1,25 +1,42 @@
-import serial
 import numpy as np
-import openvr
 import pandas as pd
 from datetime import datetime
 import time
 import os
 import threading
-import queue
-import msvcrt
+import sys
+import select
+try:
+    import msvcrt
+except ImportError:  # Windows 가 아닌 환경 (mock 트래커 + 재생 포트로 시험할 때): 줄 단위 입력으로 대체
+    msvcrt = None
+from frame_parser import SENSOR_COLUMN_NAMES
+from replay_serial import open_serial
+from serial_stream import make_frame_ring, serial_reader
+from session_recorder import SessionRecorder, export_csv
+from tracker_provider import open_tracker_provider
+from pose_sampler import PoseSampler
+from pose_math import pose_columns
+from clock_sync import ClockSync, start_clock_stream
+from metrics import Metrics, MetricsReporter, METRICS_FILE
+from calibration import open_calibration, capture_from_ring, CALIBRATION_FILE
 
 # --- 설정 ---
-ARDUINO_PORT = 'COM9'
+ARDUINO_PORT = 'COM9'  # 'replay:<training_data CSV>' 로 지정하면 녹화 세션을 재생
 BAUD_RATE = 1000000
+TRACKER_SOURCE = 'openvr'  # SteamVR 없이 시험/벤치마크: 'mock:circle' 또는 'mock:<training_data CSV>' (tracker_provider.py)
 TOTAL_SENSORS = 24
-MAX_RECORDS = 100000
+FRAME_MODE = 'ascii'  # 'ascii': 기존 텍스트 출력, 'binary': 바이너리 프레임 (고속, 바이너리 모드를 지원하는 Mux.ino 필요)
+EXPORT_CSV_ON_EXIT = True # 종료 시 세션 세그먼트를 training_data_*.csv 로 내보냄 (processing.py 입력 형식)
+CALIBRATION = None  # 배경장 보정: None (원시값 기록), 'capture' (시작 시 자석 없이 기준선 측정), 'calibration.json' 경로 (저장된 프로필)
 NUM_TRACKERS = 2
 
 # --- 스레드 간 데이터 공유 및 제어 ---
-data_queue = queue.Queue()
+frame_ring = make_frame_ring()
 stop_thread = threading.Event()
 start_data_collection = threading.Event()
+metrics = Metrics()
+last_valid = np.zeros(NUM_TRACKERS, dtype=bool)  # 마지막 프레임의 트래커 유효 여부 (상태 줄 표시용)
 
 # User input states
 patch1_inference_enabled = False
@@ -28,25 +45,13 @@ patch1_area_id = 0
 patch2_area_id = 0
 
 # --- 헬퍼 함수 ---
-def serial_reader_optimized(ser, q, stop_event):
-    """
-    최적화된 시리얼 리더 스레드 함수. 한 번에 대량의 데이터를 읽어 I/O 오버헤드를 줄입니다.
-    """
-    print("최적화된 시리얼 리더 스레드 시작.")
-    buffer = b''
-    while not stop_event.is_set():
-        try:
-            if ser.in_waiting > 0:
-                buffer += ser.read(ser.in_waiting)
-                while b'\n' in buffer:
-                    line, buffer = buffer.split(b'\n', 1)
-                    if line:
-                        q.put(line.decode('utf-8', 'ignore').strip())
-        except (serial.SerialException, TypeError):
-            break
-        
-        time.sleep(0.0001)
-    print("최적화된 시리얼 리더 스레드 종료.")
+def read_key():
+    """눌린 키 하나를 반환합니다 (없으면 None). Windows 가 아니면 Enter 로 입력한 줄의 첫 글자."""
+    if msvcrt is not None:
+        return msvcrt.getch().decode('utf-8') if msvcrt.kbhit() else None
+    if select.select([sys.stdin], [], [], 0)[0]:
+        return sys.stdin.readline().strip()[:1] or None
+    return None
 
 def input_listener_non_blocking():
     """
@@ -56,8 +61,8 @@ def input_listener_non_blocking():
     global start_data_collection
     
     while not stop_thread.is_set():
-        if msvcrt.kbhit():
-            key = msvcrt.getch().decode('utf-8')
+        key = read_key()
+        if key:
             if key == 'o':
                 patch1_inference_enabled = not patch1_inference_enabled
                 patch2_inference_enabled = not patch2_inference_enabled
@@ -67,62 +72,12 @@ def input_listener_non_blocking():
                 start_data_collection.clear() # 데이터 수집 중단
         time.sleep(0.1)
 
-def get_tracker_poses(tracker_ids):
-    """
-    여러 VIVE 트래커의 현재 위치 및 회전 행렬을 반환합니다.
-    """
-    poses = vr_system.getDeviceToAbsoluteTrackingPose(openvr.TrackingUniverseStanding, 0, openvr.k_unMaxTrackedDeviceCount)
-    tracker_data = {}
-    for tracker_id in tracker_ids:
-        if poses[tracker_id].bPoseIsValid:
-            matrix = poses[tracker_id].mDeviceToAbsoluteTracking
-            pos = [matrix[0][3], matrix[1][3], matrix[2][3]]
-            tracker_data[tracker_id] = {'pos': pos, 'matrix': matrix}
-    return tracker_data
-
-def get_euler_angles_from_matrix(m):
-    """회전 행렬에서 Roll, Pitch, Yaw 오일러 각도를 계산합니다."""
-    yaw = np.degrees(np.arctan2(m[1][0], m[0][0]))
-    pitch = np.degrees(np.arctan2(-m[2][0], np.sqrt(m[2][1]**2 + m[2][2]**2)))
-    roll = np.degrees(np.arctan2(m[2][1], m[2][2]))
-    return roll, pitch, yaw
-    
-def get_quaternion_from_matrix(m):
-    """회전 행렬에서 쿼터니언(x, y, z, w)을 계산합니다."""
-    trace = m[0][0] + m[1][1] + m[2][2]
-    if trace > 0:
-        s = 0.5 / np.sqrt(trace + 1.0)
-        w = 0.25 / s
-        x = (m[2][1] - m[1][2]) * s
-        y = (m[0][2] - m[2][0]) * s
-        z = (m[1][0] - m[0][1]) * s
-    else:
-        if m[0][0] > m[1][1] and m[0][0] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[0][0] - m[1][1] - m[2][2])
-            w = (m[2][1] - m[1][2]) / s
-            x = 0.25 * s
-            y = (m[0][1] + m[1][0]) / s
-            z = (m[0][2] + m[2][0]) / s
-        elif m[1][1] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[1][1] - m[0][0] - m[2][2])
-            w = (m[0][2] - m[2][0]) / s
-            x = (m[0][1] + m[1][0]) / s
-            y = 0.25 * s
-            z = (m[1][2] + m[2][1]) / s
-        else:
-            s = 2.0 * np.sqrt(1.0 + m[2][2] - m[0][0] - m[1][1])
-            w = (m[1][0] - m[0][1]) / s
-            x = (m[0][2] + m[2][0]) / s
-            y = (m[1][2] + m[2][1]) / s
-            z = 0.25 * s
-    return [x, y, z, w]
-
 def record_area_points(tracker_id, area_label, geom_data_list):
     """지정된 트래커를 사용하여 에리어의 꼭짓점 위치를 기록합니다."""
     print(f"\n>>> 트래커 {tracker_id}를 사용하여 '{area_label}'의 꼭짓점을 기록합니다.")
     for i in range(1, 5):
         input(f"    - 트래커를 '{area_label} Corner_{i}' 위치에 놓고 Enter를 누르세요...")
-        poses = get_tracker_poses([tracker_id])
+        poses = tracker.get_poses([tracker_id])
         pos = poses.get(tracker_id, {}).get('pos')
         if pos:
             print(f"      - 기록 완료: (X={pos[0]:.4f}, Y={pos[1]:.4f}, Z={pos[2]:.4f})")
@@ -138,6 +93,10 @@ def record_area_points(tracker_id, area_label, geom_data_list):
             print("      - 오류: 트래커 위치를 읽을 수 없습니다. 건너뜁니다.")
     print(f"\n--- '{area_label}' 기록 완료! ---")
 
+def status_line():
+    """메트릭 출력 줄 앞에 붙는 수집 상태 (MetricsReporter 스레드가 REPORT_INTERVAL 마다 호출)."""
+    return f"데이터 수집 중... [{recorder.rows}] | T1: {'OK' if last_valid[0] else 'N/A'}, T2: {'OK' if last_valid[1] else 'N/A'}"
+
 def handle_geometry_recording(tracker_ids, geometry_data):
     """
     사용자 입력을 받아 영역 ID를 지정하고 꼭짓점 좌표를 기록하는 함수.
@@ -184,37 +143,35 @@ def handle_geometry_recording(tracker_ids, geometry_data):
     print("\n--- 지오메트리 모드 종료 ---")
     start_data_collection.set() # 데이터 수집 재개
 
-def save_to_csv(data_array, col_order, num_records, geom_data):
-    """수집된 데이터를 CSV 파일로 저장합니다."""
+def save_session(recorder, session_stamp, geom_data):
+    """고정 좌표를 저장해 세션에 연결하고, 세션을 닫은 뒤 (설정 시) CSV 로 내보냅니다."""
     if len(geom_data) > 0:
         print("\n고정 좌표(geometry) 데이터 저장 중...")
         df_geom = pd.DataFrame(geom_data)
-        geom_filename = f"device_geometry_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        geom_filename = f"device_geometry_{session_stamp}.csv"
         df_geom.to_csv(geom_filename, index=False)
+        recorder.set_geometry(geom_filename)
         print(f"'{geom_filename}' 파일이 저장되었습니다.")
 
-    if num_records > 0:
-        print("\n실시간 수집 데이터 저장 중...")
-        df_ts = pd.DataFrame(data_array[:num_records], columns=col_order)
-        ts_filename = f"training_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        df_ts.to_csv(ts_filename, index=False)
-        print(f"'{ts_filename}' 파일에 총 {num_records}개의 시간대 데이터가 저장되었습니다.")
+    # 시계열 데이터는 수집 중에 이미 세그먼트로 기록됨 -> 마지막 세그먼트 정리 후 매니페스트 완료 처리
+    manifest_path = recorder.close()
+    print(f"\n총 {recorder.rows}개의 시간대 데이터가 세션 '{manifest_path}'에 기록되었습니다.")
+
+    if EXPORT_CSV_ON_EXIT and recorder.rows > 0:
+        ts_filename = f"training_data_{session_stamp}.csv"
+        export_csv(recorder.session_dir, ts_filename)
+        print(f"'{ts_filename}' 파일로 내보냈습니다.")
 
 # --- OpenVR 및 시리얼 포트 초기화 ---
 try:
-    print("OpenVR 초기화 시도..."); vr_system = openvr.init(openvr.VRApplication_Other)
-    ser = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=0.1)
+    print(f"트래커 초기화 시도... ({TRACKER_SOURCE})"); tracker = open_tracker_provider(TRACKER_SOURCE, NUM_TRACKERS)
+    ser = open_serial(ARDUINO_PORT, BAUD_RATE, timeout=0.1)
 except Exception as e: 
     print(f"오류: 초기화 실패. 에러: {e}"); exit()
 
-tracker_ids = []
-for i in range(openvr.k_unMaxTrackedDeviceCount):
-    if vr_system.getTrackedDeviceClass(i) == openvr.TrackedDeviceClass_GenericTracker:
-        tracker_ids.append(i)
-        if len(tracker_ids) == NUM_TRACKERS:
-            break
+tracker_ids = tracker.find_trackers(NUM_TRACKERS)
 if len(tracker_ids) < NUM_TRACKERS:
-    print(f"오류: {NUM_TRACKERS}개의 VIVE 트래커가 필요하지만, {len(tracker_ids)}개만 찾았습니다. 종료합니다."); ser.close(); openvr.shutdown(); exit()
+    print(f"오류: {NUM_TRACKERS}개의 VIVE 트래커가 필요하지만, {len(tracker_ids)}개만 찾았습니다. 종료합니다."); ser.close(); tracker.shutdown(); exit()
 print(f"VIVE 트래커를 찾았습니다. 장치 ID: {tracker_ids}")
 
 # --- 데이터 구조 정의 ---
@@ -226,21 +183,18 @@ for i in range(NUM_TRACKERS):
         f'tracker{i+1}_rot_quat_x', f'tracker{i+1}_rot_quat_y', f'tracker{i+1}_rot_quat_z', f'tracker{i+1}_rot_quat_w'
     ])
 
-sensor_column_names = []
-sensor_ids_ordered = []
-for i in range(TOTAL_SENSORS):
-    mux_addr, channel = 0x70 + (i // 8), i % 8
-    sid = f"S_{mux_addr:x}_{channel}"
-    sensor_ids_ordered.append(sid)
-    sensor_column_names.extend([f'{sid}_x', f'{sid}_y', f'{sid}_z'])
-column_order.extend(sensor_column_names)
+column_order.extend(SENSOR_COLUMN_NAMES)
 
-time_series_data_array = np.zeros((MAX_RECORDS, len(column_order)))
-record_index = 0
+session_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+recorder = SessionRecorder(f"session_{session_stamp}", column_order)
 
 # --- 메인 실행 로직 ---
 reader_thread = None
 input_thread = None
+pose_sampler = None
+reporter = None
+clock = ClockSync()
+calibration = open_calibration(CALIBRATION)
 geometry_data = []
 
 try:
@@ -251,79 +205,53 @@ try:
             print("--- ✅ 동기화 완료! 'g'를 눌러 지오메트리 모드 시작, 'o'로 추론 상태 토글, 'Ctrl+C'로 종료 ---")
             break
 
-    reader_thread = threading.Thread(target=serial_reader_optimized, args=(ser, data_queue, stop_thread))
+    # 프레임마다 장치 seq/micros 를 받음 (바이너리 프레임에 포함, ASCII 는 타임스탬프 모드로 전환)
+    start_clock_stream(ser, FRAME_MODE)
+    reader_thread = threading.Thread(target=serial_reader, args=(ser, frame_ring, stop_thread, FRAME_MODE, metrics, calibration))
     reader_thread.start()
+    if calibration is not None and calibration.baseline is None:
+        # 리더가 받은 처음 프레임으로 센서별 배경 기준선 측정 (측정이 끝난 뒤 프레임부터 기준선을 뺀 값이 기록됨)
+        print("배경장 기준선 측정 중... 센서 위에 자석을 두지 마세요.")
+        if not capture_from_ring(frame_ring, calibration):
+            print("경고: 기준선 측정용 프레임을 받지 못해 보정 없이 기록합니다.")
     input_thread = threading.Thread(target=input_listener_non_blocking, daemon=True)
     input_thread.start()
+    # 트래커 포즈는 전용 스레드가 고정 주기로 읽음 (메인 루프는 프레임마다 OpenVR 를 호출하지 않음)
+    pose_sampler = PoseSampler(tracker, tracker_ids, metrics=metrics).start()
+    # 프레임마다 상태를 print 하지 않고, 계측값과 함께 고정 주기로 콘솔과 세션의 메트릭 파일에 출력
+    metrics.gauge('ring_overflow', lambda: frame_ring.overflow)
+    metrics.gauge('dropped', lambda: clock.dropped)
+    row_write = metrics.timer('row_write')
+    reporter = MetricsReporter(metrics, os.path.join(recorder.session_dir, METRICS_FILE), status=status_line).start()
     
     start_data_collection.set()
 
     while not stop_thread.is_set():
         if not start_data_collection.is_set():
+            reporter.pause()
             handle_geometry_recording(tracker_ids, geometry_data)
+            reporter.resume()
             
-        if record_index >= MAX_RECORDS:
-            print("\n최대 기록 개수에 도달하여 수집을 중단합니다.")
-            stop_thread.set()
-            break
-        
-        try:
-            line = data_queue.get_nowait()
-        except queue.Empty:
-            time.sleep(0.001)
-            continue
+        # 프레임이 올 때까지 블로킹 대기 (바쁜 폴링 없음). 그동안 쌓인 프레임은 한 번에 받음
+        frames = frame_ring.read(timeout=0.1)
+        # 장치 스캔 시각을 호스트 시계로 옮긴 프레임 시각 (큐/버퍼 지연 제거) 으로 보간한 트래커 포즈 (위치 lerp, 회전 slerp)
+        times = clock.update(frames)
+        poses, valid = pose_sampler.join(times)
 
-        if not line.startswith("S_"):
-            continue
-            
-        parts = line.split(',')
-        if len(parts) != TOTAL_SENSORS * 4: 
+        if not len(frames):
             continue
 
-        temp_sensor_readings = {}
-        for i in range(0, len(parts), 4):
-            sensor_id, cx_str, cy_str, cz_str = parts[i:i+4]
-            try:
-                temp_sensor_readings[sensor_id] = {'x': float(cx_str), 'y': float(cy_str), 'z': float(cz_str)}
-            except ValueError:
-                temp_sensor_readings[sensor_id] = {'x': 0, 'y': 0, 'z': 0}
-        
-        if len(temp_sensor_readings) == TOTAL_SENSORS:
-            tracker_poses = get_tracker_poses(tracker_ids)
-            
-            status_line = f"데이터 수집 중... [{record_index + 1}/{MAX_RECORDS}] | T1: {'OK' if tracker_ids[0] in tracker_poses else 'N/A'}, T2: {'OK' if tracker_ids[1] in tracker_poses else 'N/A'}"
-            print(status_line, end='\r')
-            
-            row_data = [
-                time.time(), 
-                patch1_area_id, 
-                patch2_area_id, 
-                int(patch1_inference_enabled), 
-                int(patch2_inference_enabled)
-            ]
-            
-            for tracker_id in tracker_ids:
-                if tracker_id in tracker_poses:
-                    pos = tracker_poses[tracker_id]['pos']
-                    matrix = tracker_poses[tracker_id]['matrix']
-                    roll, pitch, yaw = get_euler_angles_from_matrix(matrix)
-                    quaternion = get_quaternion_from_matrix(matrix)
-                    row_data.extend([
-                        pos[0], pos[1], pos[2], 
-                        roll, pitch, yaw,
-                        quaternion[0], quaternion[1], quaternion[2], quaternion[3]
-                    ])
-                else:
-                    row_data.extend([0.0] * 10)
-            
-            sensor_values = []
-            for sid in sensor_ids_ordered:
-                sensor_data = temp_sensor_readings.get(sid, {'x': 0, 'y': 0, 'z': 0})
-                sensor_values.extend([sensor_data['x'], sensor_data['y'], sensor_data['z']])
-            row_data.extend(sensor_values)
-            
-            time_series_data_array[record_index] = row_data
-            record_index += 1
+        # 회전 컬럼(roll/pitch/yaw, 쿼터니언)을 배치 전체에 대해 한 번에 계산 (못 읽은 트래커는 0)
+        tracker_data = pose_columns(poses, valid).reshape(len(frames), -1)
+        state = [patch1_area_id, patch2_area_id, int(patch1_inference_enabled), int(patch2_inference_enabled)]
+        with row_write:
+            recorder.append_rows(np.column_stack([
+                times,
+                np.tile(state, (len(frames), 1)),
+                tracker_data,
+                frames['values'],
+            ]))
+        last_valid = valid[-1]
     
 except KeyboardInterrupt:
     print("\n\n프로그램이 사용자에 의해 강제 중단되었습니다.")
@@ -331,12 +259,30 @@ finally:
     stop_thread.set()
     if reader_thread:
         reader_thread.join()
+    if reporter:
+        reporter.stop()
+    if pose_sampler:
+        pose_sampler.stop()
+        print(f"포즈 샘플러 상태: {pose_sampler.stats()}")
+    print(f"링 버퍼 상태: {frame_ring.stats()}")
+    print(f"포즈 조회 비용: {tracker.stats()}")
+    print(f"클럭 동기화: {clock.stats()}")
+    # 부가 정보 기록이 실패해도 아래 세션 저장(close + CSV 내보내기)은 반드시 실행
+    try:
+        recorder.set_info('clock', clock.stats())
+        if calibration is not None and calibration.baseline is not None:
+            # 드리프트까지 반영된 기준선을 세션에 저장 (다음 세션에서 CALIBRATION 경로로 재사용 가능)
+            calibration.save(os.path.join(recorder.session_dir, CALIBRATION_FILE))
+            recorder.set_info('calibration', {'source': CALIBRATION, 'file': CALIBRATION_FILE,
+                                              'quiet_frames': calibration.quiet_frames,
+                                              'present_frames': calibration.present_frames})
+    except Exception as e:
+        print(f"세션 부가 정보 기록 실패: {e}")
     if input_thread:
         input_thread.join()
     
-    save_to_csv(time_series_data_array, column_order, record_index, geometry_data)
+    save_session(recorder, session_stamp, geometry_data)
     
     ser.close()
-    if 'vr_system' in locals() and vr_system is not None:
-        openvr.shutdown()
+    tracker.shutdown()
     print("시리얼 포트와 OpenVR을 종료했습니다.")
@@ -1,41 +1,40 @@
-import serial
 import numpy as np
-import openvr
 import pandas as pd
 from datetime import datetime
-import time
 import os
 import threading
-import queue
 import re # 파일명 파싱을 위해 re 모듈 추가
+from frame_parser import SENSOR_COLUMN_NAMES
+from replay_serial import open_serial
+from serial_stream import make_frame_ring, serial_reader
+from session_recorder import SessionRecorder, export_csv
+from tracker_provider import open_tracker_provider
+from pose_sampler import PoseSampler
+from pose_math import pose_columns
+from clock_sync import ClockSync, start_clock_stream
+from metrics import Metrics, MetricsReporter, METRICS_FILE
+from calibration import open_calibration, capture_from_ring, CALIBRATION_FILE
 
 # --- Configuration ---
-ARDUINO_PORT = 'COM9'  # Teensy COM 포트
+ARDUINO_PORT = 'COM9'  # Teensy COM 포트 ('replay:<training_data CSV>' 로 지정하면 녹화 세션을 재생)
 BAUD_RATE = 1000000
+TRACKER_SOURCE = 'openvr'  # SteamVR 없이 시험/벤치마크: 'mock:circle' 또는 'mock:<training_data CSV>' (tracker_provider.py)
 TOTAL_SENSORS = 24
-MAX_RECORDS = 100000  # 미리 할당할 최대 행 수
+FRAME_MODE = 'ascii'  # 'ascii': 기존 텍스트 출력, 'binary': 바이너리 프레임 (고속, 바이너리 모드를 지원하는 Mux.ino 필요)
+EXPORT_CSV_ON_EXIT = True  # 종료 시 세션 세그먼트를 training_data_*.csv 로 내보냄 (processing.py 입력 형식)
+CALIBRATION = None  # 배경장 보정: None (원시값 기록), 'capture' (시작 시 자석 없이 기준선 측정), 'calibration.json' 경로 (저장된 프로필)
 # 저장 경로 지정 (Windows 경로를 위해 raw string 'r' 사용)
 SAVE_PATH = r"C:\Users\Administrator\Desktop\MagToTheFuture\0814"
 
 # --- 스레드 간 데이터 공유 및 제어 ---
-data_queue = queue.Queue()
+frame_ring = make_frame_ring()
 start_tracker2_recording = threading.Event()
 start_geometry_phase = threading.Event()
 stop_thread = threading.Event()
+metrics = Metrics()
+last_valid = np.zeros(2, dtype=bool)  # 마지막 프레임의 트래커 유효 여부 (상태 줄 표시용)
 
 # --- Helper Functions ---
-def serial_reader(ser, q, stop_event):
-    """시리얼 포트에서 지속적으로 데이터를 읽어 큐에 넣는 스레드 함수."""
-    print("시리얼 리더 스레드 시작.")
-    while not stop_event.is_set():
-        try:
-            line = ser.readline().decode('utf-8', 'ignore').strip()
-            if line:
-                q.put(line)
-        except (serial.SerialException, TypeError):
-            break
-    print("시리얼 리더 스레드 종료.")
-
 def input_listener():
     """사용자 입력을 기다리는 스레드 함수 (2단계 진행)"""
     input("\n데이터 수집 중... 첫 번째 Enter를 누르면 트래커 2의 데이터 기록을 시작합니다.")
@@ -45,57 +44,11 @@ def input_listener():
     input("두 번째 Enter를 누르면 실시간 데이터 수집을 멈추고 꼭짓점 좌표 기록을 시작합니다.")
     start_geometry_phase.set()
 
-def get_tracker_pose(tracker_id):
-    """주어진 ID의 VIVE 트래커의 현재 위치와 회전 행렬을 반환합니다."""
-    poses = vr_system.getDeviceToAbsoluteTrackingPose(openvr.TrackingUniverseStanding, 0, openvr.k_unMaxTrackedDeviceCount)
-    if tracker_id is not None and poses[tracker_id].bPoseIsValid:
-        matrix = poses[tracker_id].mDeviceToAbsoluteTracking
-        pos = [matrix[0][3], matrix[1][3], matrix[2][3]]
-        return pos, matrix
-    return None, None
-
-def get_euler_angles_from_matrix(m):
-    """회전 행렬에서 Roll, Pitch, Yaw 오일러 각도를 계산합니다."""
-    yaw = np.degrees(np.arctan2(m[1][0], m[0][0]))
-    pitch = np.degrees(np.arctan2(-m[2][0], np.sqrt(m[2][1]**2 + m[2][2]**2)))
-    roll = np.degrees(np.arctan2(m[2][1], m[2][2]))
-    return roll, pitch, yaw
-    
-def get_quaternion_from_matrix(m):
-    """회전 행렬에서 쿼터니언(x, y, z, w)을 계산합니다."""
-    trace = m[0][0] + m[1][1] + m[2][2]
-    if trace > 0:
-        s = 0.5 / np.sqrt(trace + 1.0)
-        w = 0.25 / s
-        x = (m[2][1] - m[1][2]) * s
-        y = (m[0][2] - m[2][0]) * s
-        z = (m[1][0] - m[0][1]) * s
-    else:
-        if m[0][0] > m[1][1] and m[0][0] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[0][0] - m[1][1] - m[2][2])
-            w = (m[2][1] - m[1][2]) / s
-            x = 0.25 * s
-            y = (m[0][1] + m[1][0]) / s
-            z = (m[0][2] + m[2][0]) / s
-        elif m[1][1] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[1][1] - m[0][0] - m[2][2])
-            w = (m[0][2] - m[2][0]) / s
-            x = (m[0][1] + m[1][0]) / s
-            y = 0.25 * s
-            z = (m[1][2] + m[2][1]) / s
-        else:
-            s = 2.0 * np.sqrt(1.0 + m[2][2] - m[0][0] - m[1][1])
-            w = (m[1][0] - m[0][1]) / s
-            x = (m[0][2] + m[2][0]) / s
-            y = (m[1][2] + m[2][1]) / s
-            z = 0.25 * s
-    return [x, y, z, w]
-
 def record_point(label, geom_data_list, tracker_id_to_use):
     """주어진 레이블에 대한 꼭짓점 위치를 기록합니다."""
     while True:
         input(f"\n>>> 트래커 1을 '{label}' 위치에 놓고 Enter를 누르세요...")
-        pos, _ = get_tracker_pose(tracker_id_to_use)
+        pos, _ = tracker.get_pose(tracker_id_to_use)
         if pos:
             print(f"'{label}' 위치 기록됨: (X={pos[0]:.4f}, Y={pos[1]:.4f}, Z={pos[2]:.4f})")
             geom_data_list.append({'label': label, 'pos_x': pos[0], 'pos_y': pos[1], 'pos_z': pos[2]})
@@ -103,11 +56,17 @@ def record_point(label, geom_data_list, tracker_id_to_use):
         else:
             print("오류: 트래커 위치를 읽을 수 없습니다. 다시 시도해 주세요.")
 
+def status_line():
+    """메트릭 출력 줄 앞에 붙는 수집 상태 (MetricsReporter 스레드가 REPORT_INTERVAL 마다 호출)."""
+    t1_status = 'OK' if last_valid[0] else 'N/A'
+    t2_status = 'OK' if last_valid[1] else ('Waiting...' if not start_tracker2_recording.is_set() else 'N/A')
+    return f"수집 중... [{recorder.rows}] | 트래커1: {t1_status} | 트래커2: {t2_status}"
+
 def get_next_run_number(path):
     """디렉토리를 스캔하여 다음 실행 번호를 결정합니다."""
     os.makedirs(path, exist_ok=True)  # 디렉토리가 없으면 생성
     max_num = 0
-    p = re.compile(r'DualPatchData_(\d+)\.csv$')
+    p = re.compile(r'DualPatchData_(\d+)(\.csv)?$')  # CSV 또는 세션 디렉토리
     for f in os.listdir(path):
         match = p.search(f)
         if match:
@@ -116,12 +75,8 @@ def get_next_run_number(path):
                 max_num = num
     return max_num + 1
 
-def save_to_csv(data_array, col_order, num_records, geom_data):
-    """수집된 데이터를 지정된 경로와 파일명 규칙에 따라 CSV 파일로 저장합니다."""
-    run_number = get_next_run_number(SAVE_PATH)
-    base_filename = f"DualPatchData_{run_number}"
-    print(f"\n데이터 저장 준비 중... 실행 번호: {run_number}")
-
+def save_session(recorder, base_filename, geom_data):
+    """꼭짓점 좌표를 저장해 세션에 연결하고, 세션을 닫은 뒤 (설정 시) CSV 로 내보냅니다."""
     # 꼭짓점 좌표 데이터 저장
     if len(geom_data) > 0:
         print("\n꼭짓점 좌표 데이터 저장 중...")
@@ -129,31 +84,31 @@ def save_to_csv(data_array, col_order, num_records, geom_data):
         geom_filename = f"device_geometry_{base_filename}.csv"
         full_path = os.path.join(SAVE_PATH, geom_filename)
         df_geom.to_csv(full_path, index=False)
+        recorder.set_geometry(full_path)
         print(f"'{full_path}' 파일 저장 완료.")
 
-    # 시계열 데이터 저장
-    if num_records > 0:
-        print("\n실시간 수집 데이터 저장 중...")
-        df_ts = pd.DataFrame(data_array[:num_records], columns=col_order)
-        ts_filename = f"training_data_{base_filename}.csv"
-        full_path = os.path.join(SAVE_PATH, ts_filename)
-        df_ts.to_csv(full_path, index=False)
-        print(f"총 {num_records}개의 시계열 데이터가 '{full_path}'에 저장되었습니다.")
+    # 시계열 데이터는 수집 중에 이미 세그먼트로 기록됨 -> 마지막 세그먼트 정리 후 매니페스트 완료 처리
+    manifest_path = recorder.close()
+    print(f"\n총 {recorder.rows}개의 시계열 데이터가 세션 '{manifest_path}'에 기록되었습니다.")
+
+    if EXPORT_CSV_ON_EXIT and recorder.rows > 0:
+        print("CSV 내보내는 중...")
+        full_path = os.path.join(SAVE_PATH, f"training_data_{base_filename}.csv")
+        export_csv(recorder.session_dir, full_path)
+        print(f"'{full_path}' 파일 저장 완료.")
 
 # --- OpenVR 및 시리얼 포트 초기화 ---
 try:
-    print("OpenVR 초기화 시도 중..."); vr_system = openvr.init(openvr.VRApplication_Other)
-    ser = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
+    print(f"트래커 초기화 시도 중... ({TRACKER_SOURCE})"); tracker = open_tracker_provider(TRACKER_SOURCE, num_trackers=2)
+    ser = open_serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
 except Exception as e: 
     print(f"오류: 초기화 실패. 오류: {e}"); exit()
 
-tracker_ids = []
-for i in range(openvr.k_unMaxTrackedDeviceCount):
-    if vr_system.getTrackedDeviceClass(i) == openvr.TrackedDeviceClass_GenericTracker:
-        tracker_ids.append(i)
-        print(f"VIVE 트래커 발견. 장치 ID: {i}")
+tracker_ids = tracker.find_trackers()
+for i in tracker_ids:
+    print(f"VIVE 트래커 발견. 장치 ID: {i}")
 if len(tracker_ids) < 2:
-    print(f"오류: 2개의 VIVE 트래커를 찾지 못했습니다 (찾은 개수: {len(tracker_ids)})."); ser.close(); openvr.shutdown(); exit()
+    print(f"오류: 2개의 VIVE 트래커를 찾지 못했습니다 (찾은 개수: {len(tracker_ids)})."); ser.close(); tracker.shutdown(); exit()
 print(f"트래커 1 ID: {tracker_ids[0]}, 트래커 2 ID: {tracker_ids[1]}")
 
 # --- 데이터 구조 정의 ---
@@ -171,20 +126,19 @@ tracker2_cols = [
 column_order.extend(tracker1_cols)
 column_order.extend(tracker2_cols)
 
-sensor_column_names = []
-sensor_ids_ordered = []
-for i in range(TOTAL_SENSORS):
-    mux_addr, channel = 0x70 + (i // 8), i % 8
-    sid = f"S_{mux_addr:x}_{channel}"
-    sensor_ids_ordered.append(sid)
-    sensor_column_names.extend([f'{sid}_x', f'{sid}_y', f'{sid}_z'])
-column_order.extend(sensor_column_names)
+column_order.extend(SENSOR_COLUMN_NAMES)
 
-time_series_data_array = np.zeros((MAX_RECORDS, len(column_order)))
-record_index = 0
+run_number = get_next_run_number(SAVE_PATH)
+base_filename = f"DualPatchData_{run_number}"
+print(f"실행 번호: {run_number}")
+recorder = SessionRecorder(os.path.join(SAVE_PATH, f"session_{base_filename}"), column_order)
 
 # --- 메인 실행 로직 ---
 reader_thread = None
+pose_sampler = None
+reporter = None
+clock = ClockSync()
+calibration = open_calibration(CALIBRATION)
 geometry_data = []
 try:
     print("\n--- Teensy 동기화 대기 중 ---")
@@ -194,73 +148,46 @@ try:
             print("--- ✅ 동기화 완료! ---")
             break
 
-    reader_thread = threading.Thread(target=serial_reader, args=(ser, data_queue, stop_thread))
+    # 프레임마다 장치 seq/micros 를 받음 (바이너리 프레임에 포함, ASCII 는 타임스탬프 모드로 전환)
+    start_clock_stream(ser, FRAME_MODE)
+    reader_thread = threading.Thread(target=serial_reader, args=(ser, frame_ring, stop_thread, FRAME_MODE, metrics, calibration))
     reader_thread.start()
+    if calibration is not None and calibration.baseline is None:
+        # 리더가 받은 처음 프레임으로 센서별 배경 기준선 측정 (측정이 끝난 뒤 프레임부터 기준선을 뺀 값이 기록됨)
+        print("배경장 기준선 측정 중... 센서 위에 자석을 두지 마세요.")
+        if not capture_from_ring(frame_ring, calibration):
+            print("경고: 기준선 측정용 프레임을 받지 못해 보정 없이 기록합니다.")
     listener_thread = threading.Thread(target=input_listener, daemon=True)
     listener_thread.start()
+    # 트래커 포즈는 전용 스레드가 고정 주기로 읽음 (메인 루프는 프레임마다 OpenVR 를 호출하지 않음)
+    pose_sampler = PoseSampler(tracker, tracker_ids[:2], metrics=metrics).start()
+    # 프레임마다 상태를 print 하지 않고, 계측값과 함께 고정 주기로 콘솔과 세션의 메트릭 파일에 출력
+    metrics.gauge('ring_overflow', lambda: frame_ring.overflow)
+    metrics.gauge('dropped', lambda: clock.dropped)
+    row_write = metrics.timer('row_write')
+    reporter = MetricsReporter(metrics, os.path.join(recorder.session_dir, METRICS_FILE), status=status_line).start()
     
     while not start_geometry_phase.is_set():
-        if record_index >= MAX_RECORDS:
-            print("\n최대 기록 수에 도달하여 수집을 중단합니다.")
-            start_geometry_phase.set()
-            break
-        
-        try:
-            line = data_queue.get_nowait()
-        except queue.Empty:
-            continue
+        # 프레임이 올 때까지 블로킹 대기 (바쁜 폴링 없음). 그동안 쌓인 프레임은 한 번에 받음
+        frames = frame_ring.read(timeout=0.1)
+        # 장치 스캔 시각을 호스트 시계로 옮긴 프레임 시각 (큐/버퍼 지연 제거) 으로 보간한 트래커 포즈 (위치 lerp, 회전 slerp)
+        times = clock.update(frames)
+        poses, valid = pose_sampler.join(times)
 
-        if not line.startswith("S_"):
+        if not len(frames):
             continue
-            
-        parts = line.split(',')
-        if len(parts) != TOTAL_SENSORS * 4:
-            print(f"경고: 데이터 길이가 일치하지 않습니다. 예상: {TOTAL_SENSORS * 4}, 실제: {len(parts)}. 이 라인을 건너뜁니다.")
-            continue
-
-        temp_sensor_readings = {}
-        for i in range(0, len(parts), 4):
-            sensor_id, cx, cy, cz = parts[i:i+4]
-            try:
-                temp_sensor_readings[sensor_id] = {'x': float(cx), 'y': float(cy), 'z': float(cz)}
-            except ValueError:
-                temp_sensor_readings[sensor_id] = {'x': 0, 'y': 0, 'z': 0}
-        
-        if len(temp_sensor_readings) == TOTAL_SENSORS:
-            pos1, matrix1 = get_tracker_pose(tracker_ids[0])
-            
-            if start_tracker2_recording.is_set():
-                pos2, matrix2 = get_tracker_pose(tracker_ids[1])
-            else:
-                pos2, matrix2 = None, None
-
-            t1_status = 'OK' if pos1 else 'N/A'
-            t2_status = 'OK' if pos2 else ('Waiting...' if not start_tracker2_recording.is_set() else 'N/A')
-            status_line = f"수집 중... [{record_index + 1}/{MAX_RECORDS}] | 트래커1: {t1_status} | 트래커2: {t2_status}"
-            print(status_line, end='\r')
-            
-            if pos1:
-                roll1, pitch1, yaw1 = get_euler_angles_from_matrix(matrix1)
-                quat1 = get_quaternion_from_matrix(matrix1)
-                tracker1_data = [pos1[0], pos1[1], pos1[2], roll1, pitch1, yaw1, quat1[0], quat1[1], quat1[2], quat1[3]]
-                
-                if pos2 and matrix2:
-                    roll2, pitch2, yaw2 = get_euler_angles_from_matrix(matrix2)
-                    quat2 = get_quaternion_from_matrix(matrix2)
-                    tracker2_data = [pos2[0], pos2[1], pos2[2], roll2, pitch2, yaw2, quat2[0], quat2[1], quat2[2], quat2[3]]
-                else:
-                    tracker2_data = [0] * 10
-
-                sensor_values = []
-                for sid in sensor_ids_ordered:
-                    sensor_data = temp_sensor_readings.get(sid, {'x': 0, 'y': 0, 'z': 0})
-                    sensor_values.extend([sensor_data['x'], sensor_data['y'], sensor_data['z']])
-                
-                row_data = [time.time()] + tracker1_data + tracker2_data + sensor_values
-                
-                time_series_data_array[record_index] = row_data
-                record_index += 1
+        if not start_tracker2_recording.is_set():
+            valid[:, 1] = False
+
+        # 회전 컬럼(roll/pitch/yaw, 쿼터니언)을 배치 전체에 대해 한 번에 계산하고, 트래커 1 이 유효한 프레임만 기록
+        tracker_data = pose_columns(poses[:, :2], valid[:, :2]).reshape(len(frames), 20)
+        keep = valid[:, 0]
+        with row_write:
+            recorder.append_rows(np.column_stack([times[keep], tracker_data[keep], frames['values'][keep]]))
+        last_valid = valid[-1, :2]
     
+    pose_sampler.stop()
+    reporter.stop()
     print("\n\n--- 실시간 데이터 수집을 중단하고 꼭짓점 좌표 기록을 시작합니다. ---")
     for i in range(4):
         record_point(f'Corner_{i+1}', geometry_data, tracker_ids[0])
@@ -272,10 +199,28 @@ finally:
     stop_thread.set()
     if reader_thread:
         reader_thread.join()
+    if reporter:
+        reporter.stop()
+    if pose_sampler:
+        pose_sampler.stop()
+        print(f"포즈 샘플러 상태: {pose_sampler.stats()}")
+    print(f"링 버퍼 상태: {frame_ring.stats()}")
+    print(f"포즈 조회 비용: {tracker.stats()}")
+    print(f"클럭 동기화: {clock.stats()}")
+    # 부가 정보 기록이 실패해도 아래 세션 저장(close + CSV 내보내기)은 반드시 실행
+    try:
+        recorder.set_info('clock', clock.stats())
+        if calibration is not None and calibration.baseline is not None:
+            # 드리프트까지 반영된 기준선을 세션에 저장 (다음 세션에서 CALIBRATION 경로로 재사용 가능)
+            calibration.save(os.path.join(recorder.session_dir, CALIBRATION_FILE))
+            recorder.set_info('calibration', {'source': CALIBRATION, 'file': CALIBRATION_FILE,
+                                              'quiet_frames': calibration.quiet_frames,
+                                              'present_frames': calibration.present_frames})
+    except Exception as e:
+        print(f"세션 부가 정보 기록 실패: {e}")
     
-    save_to_csv(time_series_data_array, column_order, record_index, geometry_data)
+    save_session(recorder, base_filename, geometry_data)
     
     ser.close()
-    if 'vr_system' in locals() and vr_system is not None:
-        openvr.shutdown()
+    tracker.shutdown()
     print("시리얼 포트와 OpenVR 연결이 종료되었습니다.")
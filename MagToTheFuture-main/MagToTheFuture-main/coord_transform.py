@@ -0,0 +1,140 @@
+import numpy as np
+
+# 센서 배열: 24개 센서 x (x, y, z) = 72 값, 센서 순서대로 [S_70_0_x, S_70_0_y, S_70_0_z, S_70_1_x, ...]
+NUM_SENSORS = 24
+AXES = 3
+
+
+def build_orthonormal_axes_2d(geometry_df, origin_label='Corner_2',
+                              xref_label='Corner_1', zref_label='Corner_3'):
+    """
+    geometry_df: columns ['label','pos_x','pos_y','pos_z'] 가정
+    반환: (origin(dict-like), u_x(np.array[2]), u_z(np.array[2]), Lx(float), Lz(float))
+    """
+    geo = geometry_df.set_index('label')
+
+    origin  = geo.loc[origin_label]
+    corner1 = geo.loc[xref_label]
+    corner3 = geo.loc[zref_label]
+
+    v_x = np.array([corner1['pos_x'] - origin['pos_x'],
+                    corner1['pos_z'] - origin['pos_z']], dtype=float)
+    v_z = np.array([corner3['pos_x'] - origin['pos_x'],
+                    corner3['pos_z'] - origin['pos_z']], dtype=float)
+
+    if np.linalg.norm(v_x) == 0 or np.linalg.norm(v_z) == 0:
+        raise ValueError("The length of the Corner vector is 0. Please check the geometry CSV.")
+
+    u_x = v_x / np.linalg.norm(v_x)
+    v_z_orth = v_z - (v_z @ u_x) * u_x
+    if np.linalg.norm(v_z_orth) == 0:
+        raise ValueError("The x-axis and z-axis vectors are parallel. Please select a different corner.")
+    u_z = v_z_orth / np.linalg.norm(v_z_orth)
+
+    Lx = v_x @ u_x
+    Lz = v_z @ u_z
+    if Lx < 0:
+        u_x = -u_x; Lx = -Lx
+    if Lz < 0:
+        u_z = -u_z; Lz = -Lz
+
+    return origin, u_x, u_z, float(Lx), float(Lz)
+
+def build_axes_3d(geometry_df, origin_label='Corner_2', xref_label='Corner_1', zref_label='Corner_3'):
+    """
+    processing.py (단일 패치 학습 데이터) 의 3D 좌표계: Corner_2 를 원점으로, Corner_1 / Corner_3 방향을 기준으로
+    직교 좌표축을 만듭니다. geometry_df 는 'label' 컬럼이 있거나 이미 label 로 인덱싱된 DataFrame.
+    반환: (origin(dict-like), u_x, u_y, u_z (np.array[3]))
+    """
+    geo = geometry_df.set_index('label') if 'label' in geometry_df.columns else geometry_df
+    cols = ['pos_x', 'pos_y', 'pos_z']
+    origin = geo.loc[origin_label]
+    p0 = origin[cols].to_numpy(dtype=float)
+
+    vec_x_raw = geo.loc[xref_label, cols].to_numpy(dtype=float) - p0
+    vec_z_raw = geo.loc[zref_label, cols].to_numpy(dtype=float) - p0
+
+    u_x = vec_x_raw / np.linalg.norm(vec_x_raw)
+    vec_y_raw = np.cross(vec_z_raw, vec_x_raw)
+    u_y = vec_y_raw / np.linalg.norm(vec_y_raw)
+    u_z = np.cross(u_x, u_y)
+    return origin, u_x, u_y, u_z
+
+def proj_xz(x, z, origin, u_x, u_z):
+    """원점 이동 후 (u_x, u_z) 축으로 투영합니다. 스칼라와 배열 모두 가능 (배열이면 원소별로 브로드캐스트)."""
+    tx = x - origin['pos_x']
+    tz = z - origin['pos_z']
+    new_x = tx * u_x[0] + tz * u_x[1]
+    new_z = tx * u_z[0] + tz * u_z[1]
+    return new_x, new_z
+
+def transform_xz(xz, origin, u_x, u_z):
+    """
+    (..., 2) 형태의 (x, z) 쌍 전체에 ([x, z] - origin) @ [u_x; u_z].T 를 한 번에 적용합니다.
+    2x2 곱을 원소별 연산으로 풀어 쓴 것이라 proj_xz 를 한 행씩 호출한 결과와 비트 단위로 동일합니다.
+    (BLAS matmul 은 FMA 사용 여부에 따라 마지막 자리가 달라질 수 있음)
+    """
+    xz = np.asarray(xz, dtype=np.float64)
+    out = np.empty(xz.shape, dtype=np.float64)
+    out[..., 0], out[..., 1] = proj_xz(xz[..., 0], xz[..., 1], origin, u_x, u_z)
+    return out
+
+def transform_tracker_array(pos, origin, u_x, u_z):
+    """(N, 3) 트래커 위치 -> 패치 좌표계. x/z 는 투영, y 는 원점 높이만 뺌."""
+    pos = np.asarray(pos, dtype=np.float64)
+    out = np.empty(pos.shape, dtype=np.float64)
+    out[..., [0, 2]] = transform_xz(pos[..., [0, 2]], origin, u_x, u_z)
+    out[..., 1] = pos[..., 1] - origin['pos_y']
+    return out
+
+def inverse_transform_tracker_array(pos, origin, u_x, u_z):
+    """패치 좌표계 위치 (N, 3) -> 원래 좌표계. transform_tracker_array 의 역변환 (u_x, u_z 가 정규직교라 전치로 되돌림)."""
+    pos = np.asarray(pos, dtype=np.float64)
+    out = np.empty(pos.shape, dtype=np.float64)
+    out[..., 0] = pos[..., 0] * u_x[0] + pos[..., 2] * u_z[0] + origin['pos_x']
+    out[..., 2] = pos[..., 0] * u_x[1] + pos[..., 2] * u_z[1] + origin['pos_z']
+    out[..., 1] = pos[..., 1] + origin['pos_y']
+    return out
+
+def inverse_transform_tracker_array_3d(pos, origin, u_x, u_y, u_z):
+    """
+    processing.py 좌표계 위치 (N, 3) -> 원래 좌표계.
+    processing.py 는 원점 이동 후 (u_x, u_y, u_z) 로 투영하므로, 정규직교 행렬의 전치로 되돌리고 원점을 더합니다.
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    R = np.array([u_x, u_y, u_z], dtype=np.float64)
+    o = np.array([origin['pos_x'], origin['pos_y'], origin['pos_z']], dtype=np.float64)
+    return pos @ R + o
+
+def rotate_sensor_array_3d(values, u_x, u_z):
+    """
+    센서 값 (N, 72) 또는 (N, 24, 3) 에 processing.py 의 센서 회전을 적용합니다. (원점 이동 없음, y 성분은 그대로)
+    new_x = x * u_x[0] + z * u_x[2], new_z = x * u_z[0] + z * u_z[2]
+    """
+    values = np.asarray(values, dtype=np.float64)
+    sensors = values.reshape(values.shape[:-1] + (-1, AXES)) if values.shape[-1] != AXES else values
+    out = sensors.copy()
+    x, z = sensors[..., 0], sensors[..., 2]
+    out[..., 0] = x * u_x[0] + z * u_x[2]
+    out[..., 2] = x * u_z[0] + z * u_z[2]
+    return out.reshape(values.shape)
+
+def transform_sensor_array(values, origin, u_x, u_z):
+    """
+    센서 값 (N, 72) 또는 (N, 24, 3) -> 같은 형태로 반환. 24개 센서의 (x, z) 쌍을 (N, 24, 2) 로 묶어 한 번에 변환합니다.
+    학습 데이터 전처리(processing_multipatch.transform_sensors)와 동일하게 원점 이동도 포함합니다.
+    추론/수집 스크립트에서 모델 입력을 학습 때와 같은 좌표계로 맞출 때 사용합니다.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = values.reshape(values.shape[:-1] + (-1, AXES)) if values.shape[-1] != AXES else values
+    out = out.copy()
+    out[..., [0, 2]] = transform_xz(out[..., [0, 2]], origin, u_x, u_z)
+    return out.reshape(values.shape)
+
+def sensor_xz_columns(columns):
+    """x, z 컬럼이 모두 있는 센서를 이름순으로 골라 (x 컬럼 목록, z 컬럼 목록) 으로 반환합니다."""
+    columns = list(columns)
+    column_set = set(columns)
+    bases = sorted(set('_'.join(c.split('_')[:-1]) for c in columns if c.startswith('S_')))
+    bases = [b for b in bases if f'{b}_x' in column_set and f'{b}_z' in column_set]
+    return [f'{b}_x' for b in bases], [f'{b}_z' for b in bases]
@@ -0,0 +1,147 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+import torch
+import torch.nn as nn
+
+from coord_transform import rotate_sensor_array_3d
+from inference_engine import InferenceEngine, INPUT_SIZE, load_models
+from inference_runtime import EXPORT_NPZ, EXPORT_TORCHSCRIPT, EXPORT_ONNX, load_runtime
+
+# --- 설정 ---
+data_dir = './data'
+model_dir = './models'
+time_stamp = '20250727_224824'
+ONNX_OPSET = 17
+EXPORT_FORMATS = ('npz', 'torchscript', 'onnx')
+CHECK_ROWS = 512
+CHECK_TOLERANCE = 1e-4   # float32 융합 모델과 float64 전처리 + 원본 모델의 허용 오차
+
+
+def _tail_arrays(tail, prefix):
+    linears = [m for m in tail if isinstance(m, nn.Linear)]
+    arrays = {}
+    for i, m in enumerate(linears):
+        arrays[f'{prefix}_W_{i}'] = m.weight.detach().cpu().numpy()
+        arrays[f'{prefix}_b_{i}'] = m.bias.detach().cpu().numpy()
+    return arrays
+
+
+def export_npz(engine, path):
+    """전처리가 흡수된 가중치와 좌표계 정보를 npz 로 저장합니다. (numpy 백엔드 및 모든 백엔드의 메타데이터)"""
+    model = engine.model
+    arrays = {
+        'first_W': model.first.weight.detach().cpu().numpy(),
+        'first_b': model.first.bias.detach().cpu().numpy(),
+        'split': np.int64(model.split),
+        'origin': np.array([engine.origin['pos_x'], engine.origin['pos_y'], engine.origin['pos_z']], dtype=np.float64),
+        'u_x': engine.u_x,
+        'u_y': engine.u_y,
+        'u_z': engine.u_z,
+        'threshold': np.float64(engine.threshold),
+    }
+    arrays.update(_tail_arrays(model.position_tail, 'position'))
+    arrays.update(_tail_arrays(model.presence_tail, 'presence'))
+    np.savez(path, **arrays)
+
+
+def export_torchscript(engine, path):
+    scripted = torch.jit.script(engine.model.cpu().eval())
+    scripted.save(path)
+
+
+def export_onnx(engine, path, opset=ONNX_OPSET):
+    dummy = torch.zeros(1, INPUT_SIZE)
+    torch.onnx.export(engine.model.cpu().eval(), dummy, path, opset_version=opset,
+                      input_names=['raw'], output_names=['presence', 'position'],
+                      dynamic_axes={'raw': {0: 'batch'}, 'presence': {0: 'batch'}, 'position': {0: 'batch'}})
+
+
+def export_engine(engine, out_dir, formats=EXPORT_FORMATS):
+    """
+    InferenceEngine 의 융합 모델(좌표 회전 + 스케일러가 첫 층에 흡수된 상태)을 out_dir 에 저장합니다.
+    입력은 원시 센서 값 (B, 72), 출력은 (presence (B, 1), position (B, 3)).
+    npz 는 다른 형식의 메타데이터로도 쓰이므로 항상 저장합니다.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    export_npz(engine, os.path.join(out_dir, EXPORT_NPZ))
+    written.append(EXPORT_NPZ)
+    if 'torchscript' in formats:
+        export_torchscript(engine, os.path.join(out_dir, EXPORT_TORCHSCRIPT))
+        written.append(EXPORT_TORCHSCRIPT)
+    if 'onnx' in formats:
+        export_onnx(engine, os.path.join(out_dir, EXPORT_ONNX))
+        written.append(EXPORT_ONNX)
+    return [os.path.join(out_dir, name) for name in written]
+
+
+def reference_predict(raw, engine, scaler, position_model, presence_model):
+    """흡수하지 않은 원래 경로: processing.py 센서 회전 -> scaler.transform -> 두 모델 (학습 때와 같은 입력)."""
+    rotated = rotate_sensor_array_3d(raw, engine.u_x, engine.u_z)
+    if hasattr(scaler, 'feature_names_in_'):
+        rotated = pd.DataFrame(rotated, columns=scaler.feature_names_in_)
+    features = scaler.transform(rotated)
+    x = torch.from_numpy(np.asarray(features, dtype=np.float32))
+    with torch.inference_mode():
+        return presence_model(x)[:, 0].numpy(), position_model(x).numpy()
+
+
+def check_export(engine, out_dir, raw, scaler, position_model, presence_model, tolerance=CHECK_TOLERANCE):
+    """
+    export 된 각 백엔드의 출력과 좌표 역변환을 흡수하지 않은 참조 경로와 비교합니다.
+    차이가 tolerance 를 넘으면 RuntimeError. 반환: {백엔드: (presence 최대 차이, position 최대 차이)}
+    """
+    ref_presence, ref_positions = reference_predict(raw, engine, scaler, position_model, presence_model)
+    ref_device = engine.to_device_coords(ref_positions)
+    backends = ['numpy'] + [b for b, name in (('torchscript', EXPORT_TORCHSCRIPT), ('onnx', EXPORT_ONNX))
+                            if os.path.exists(os.path.join(out_dir, name))]
+    results = {}
+    for backend in backends:
+        try:
+            runtime = load_runtime(out_dir, backend)
+        except ImportError as e:
+            print(f"Check skipped for {backend}: {e}")
+            continue
+        presence, positions = runtime.predict(raw)
+        diffs = (np.abs(presence - ref_presence).max(), np.abs(positions - ref_positions).max(),
+                 np.abs(runtime.to_device_coords(positions) - ref_device).max())
+        print(f"Check {backend}: max abs diff presence {diffs[0]:.2e}, position {diffs[1]:.2e}, "
+              f"device coords {diffs[2]:.2e}")
+        if max(diffs) > tolerance:
+            raise RuntimeError(f"Exported '{backend}' model disagrees with the reference pipeline.")
+        results[backend] = diffs
+    return results
+
+
+def check_inputs(data_file=None, rows=CHECK_ROWS, seed=0):
+    """검사용 원시 센서 입력: 학습 데이터 CSV 가 있으면 그 센서 컬럼, 없으면 난수 (rows, 72)."""
+    if data_file:
+        df = pd.read_csv(data_file, nrows=rows)
+        return df[[c for c in df.columns if c.startswith('S_')]].to_numpy(dtype=np.float32)
+    return (np.random.default_rng(seed).standard_normal((rows, INPUT_SIZE)) * 50).astype(np.float32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the fused position/presence model for deployment.")
+    parser.add_argument('--geometry', default=f'{data_dir}/device_geometry_no_tracker.csv')
+    parser.add_argument('--scaler', default=f'{model_dir}/sensor_scaler_{time_stamp}.joblib')
+    parser.add_argument('--position-model', default=f'{model_dir}/hall_sensor_model_{time_stamp}.pth')
+    parser.add_argument('--presence-model', default=f'{model_dir}/presence_detector_{time_stamp}.pth')
+    parser.add_argument('-o', '--out', default=f'{model_dir}/export_{time_stamp}')
+    parser.add_argument('--formats', nargs='+', default=list(EXPORT_FORMATS), choices=EXPORT_FORMATS)
+    parser.add_argument('--check-data', help="raw training_data CSV whose sensor columns are used for the export check "
+                                             "(random inputs if omitted)")
+    args = parser.parse_args(argv)
+
+    engine = InferenceEngine.from_files(args.geometry, args.scaler, args.position_model, args.presence_model)
+    for path in export_engine(engine, args.out, args.formats):
+        print(f"Exported: {path}")
+    check_export(engine, args.out, check_inputs(args.check_data), joblib.load(args.scaler),
+                 *load_models(args.position_model, args.presence_model))
+
+
+if __name__ == '__main__':
+    main()
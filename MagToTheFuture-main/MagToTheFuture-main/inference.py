@@ -1,11 +1,10 @@
-import pandas as pd
-import numpy as np
-import joblib
-import torch
-import time
-from models import MLP, PresenceDetector
+import argparse
 from warnings import filterwarnings
 
+from live_pipeline import LivePipeline, SerialSource, SessionSource
+# replay_serial 은 저장소 루트 모듈 (live_pipeline import 시 경로가 추가됨)
+from replay_serial import open_serial
+
 filterwarnings('ignore')
 
 data_dir = './data'
@@ -15,102 +14,59 @@ scaler_file = f'{model_dir}/sensor_scaler_20250727_224824.joblib'
 position_model_file = f'{model_dir}/hall_sensor_model_20250727_224824.pth'
 presence_model_file = f'{model_dir}/presence_detector_20250727_224824.pth'
 
-try:
-    device_geometry = pd.read_csv(device_geometry_file)
-    geometry = device_geometry.set_index('label')
-    origin = geometry.loc['Corner_2']
-    corner1 = geometry.loc['Corner_1']
-    corner3 = geometry.loc['Corner_3']
-    vec_x = corner1[['pos_x', 'pos_z']] - origin[['pos_x', 'pos_z']]
-    vec_z = corner3[['pos_x', 'pos_z']] - origin[['pos_x', 'pos_z']]
-    u_x = vec_x / np.linalg.norm(vec_x)
-    u_z = vec_z / np.linalg.norm(vec_z)
-
-    scaler = joblib.load(scaler_file)
-
-    input_size = 72
-    output_size = 3
-    position_model = MLP(input_size, output_size)
-    position_model.load_state_dict(torch.load(position_model_file))
-    position_model.eval()
-
-    presence_model = PresenceDetector(input_size)
-    presence_model.load_state_dict(torch.load(presence_model_file))
-    presence_model.eval()
-except FileNotFoundError as e:
-    print(f"Error: {e}. Please put the required files in the {data_dir} folder.")
-    exit()
-
-print("Loading completed. Starting real-time inference.")
-print("-" * 40)
-
-def preprocess_input(raw_sensor_data, u_x, u_z, scaler):
-    processed_data = raw_sensor_data.copy()
-    num_sensors = len(processed_data) // 3
-    
-    for i in range(num_sensors):
-        x_idx, z_idx = i * 3, i * 3 + 2
-        original_x = raw_sensor_data[x_idx]
-        original_z = raw_sensor_data[z_idx]
-        
-        processed_data[x_idx] = original_x * u_x['pos_x'] + original_z * u_x['pos_z']
-        processed_data[z_idx] = original_x * u_z['pos_x'] + original_z * u_z['pos_z']
-
-    scaled_data = scaler.transform(processed_data.reshape(1, -1))
-    
-    return scaled_data
-
-def get_new_sensor_data():
-    #### 실제 환경에서는 이 부분을 하드웨어 데이터 수집 코드로 대체해야 함 ####
-    if int(time.time()) % 10 < 5:
-        # 자석 없음 (배경 노이즈)
-        return np.random.randn(72) * 0.1
+ARDUINO_PORT = 'COM9'
+BAUD_RATE = 1000000
+
+
+def load_engine(export_dir=None, backend='numpy'):
+    """export_model.py 결과가 있으면 선택한 백엔드로, 없으면 원본 파일로 eager 엔진을 만듭니다."""
+    if export_dir:
+        from inference_runtime import load_runtime
+        return load_runtime(export_dir, backend)
+    from inference_engine import InferenceEngine
+    # 좌표 회전 + 스케일러는 엔진 안에서 첫 Linear 층에 흡수됨 (학습 전처리와 같은 좌표계)
+    return InferenceEngine.from_files(device_geometry_file, scaler_file,
+                                      position_model_file, presence_model_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live position inference from the sensor stream.")
+    parser.add_argument('--port', default=ARDUINO_PORT, help="serial port of the sensor board ('replay:<csv>' for a virtual port)")
+    parser.add_argument('--frame-mode', default='ascii', choices=('ascii', 'binary'))
+    parser.add_argument('--session', help="replay a recorded session (.mags, training_data CSV or recorder "
+                                          "directory) instead of reading the serial port")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed factor (0 = as fast as possible)")
+    parser.add_argument('--loop', action='store_true', help="replay the session repeatedly")
+    parser.add_argument('--export-dir', help="directory written by export_model.py")
+    parser.add_argument('--backend', default='numpy', help="runtime backend when --export-dir is given")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    try:
+        engine = load_engine(args.export_dir, args.backend)
+    except FileNotFoundError as e:
+        print(f"Error: {e}. Please put the required files in the {data_dir} folder.")
+        return
+
+    ser = None
+    if args.session:
+        source = SessionSource(args.session, speed=args.speed, loop=args.loop)
+        frame_mode = 'ascii'
+        print(f"Replaying '{args.session}' ({len(source.values)} frames, speed x{args.speed or 'max'}).")
     else:
-        # 자석 있음 (강한 신호)
-        return np.random.rand(72) * 5 - 2.5
-
-
-
-try:
-    while True:
-        raw_data = get_new_sensor_data()
-        sensor_magnitudes = []
-        for i in range(24):
-            x = raw_data[i * 3]
-            y = raw_data[i * 3 + 1]
-            z = raw_data[i * 3 + 2]
-            mag = np.sqrt(x**2 + y**2 + z**2)
-            sensor_magnitudes.append(mag)
-
-        print(sensor_magnitudes)
-
-        # preprocessed_data = preprocess_input(raw_data, u_x, u_z, scaler)
-        
-        # input_tensor = torch.FloatTensor(preprocessed_data)
-
-        # with torch.no_grad():
-        #     presence_prob = presence_model(input_tensor).item()
-
-        # if presence_prob > 0.8:
-        #     with torch.no_grad():
-        #         predicted_pos_transformed = position_model(input_tensor).numpy().flatten()
-        #         print(f"Predicted position: {predicted_pos_transformed}")
-
-                # (선택 사항) 결과를 원래 좌표계로 역변환
-                # x_prime, y_prime, z_prime = predicted_pos_transformed
-                # rev_rotated_x = x_prime * u_x['pos_x'] + z_prime * u_z['pos_x']
-                # rev_rotated_z = x_prime * u_x['pos_z'] + z_prime * u_z['pos_z']
-                # final_x = rev_rotated_x + origin['pos_x']
-                # final_y = y_prime + origin['pos_y']
-                # final_z = rev_rotated_z + origin['pos_z']
-                
-                # print(f"[{time.strftime('%H:%M:%S')}] Predicted Position (Original Coords): "
-                #       f"X={final_x:.3f}, Y={final_y:.3f}, Z={final_z:.3f}")
-            time.sleep(3)
-        else:
-            print("No presence detected.")
-
-        time.sleep(1/3)
-
-except KeyboardInterrupt:
-    print("\nInference terminated.")
\ No newline at end of file
+        ser = open_serial(args.port, BAUD_RATE, timeout=0.1)
+        source = SerialSource(ser, args.frame_mode)
+        frame_mode = args.frame_mode
+
+    print("Loading completed. Starting real-time inference.")
+    print("-" * 40)
+    try:
+        LivePipeline(engine, source, frame_mode=frame_mode).run(duration=args.duration)
+    finally:
+        if ser is not None:
+            ser.close()
+    print("\nInference terminated.")
+
+
+if __name__ == '__main__':
+    main()
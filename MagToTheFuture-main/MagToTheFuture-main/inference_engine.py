@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import joblib
+import torch
+import torch.nn as nn
+
+from models import MLP, PresenceDetector
+from coord_transform import NUM_SENSORS, AXES, build_axes_3d, inverse_transform_tracker_array_3d
+from inference_runtime import benchmark
+
+# --- 설정 ---
+INPUT_SIZE = NUM_SENSORS * AXES
+OUTPUT_SIZE = 3
+PRESENCE_THRESHOLD = 0.8
+NUM_THREADS = 1   # 작은 MLP 는 스레드 동기화 비용이 연산보다 커서 1 스레드가 가장 빠름
+
+
+def build_input_affine(u_x, u_z, scaler=None, input_columns=None):
+    """
+    원시 센서 벡터 (72,) -> 모델 입력 (72,) 변환을 하나의 아핀 변환 x @ A.T + c 로 만듭니다.
+    모델을 학습시킨 processing.py 의 센서 회전(x, z 성분만 3D 축 u_x, u_z 의 x/z 성분으로 회전, 원점 이동 없음)과
+    StandardScaler 를 합친 것입니다.
+
+    input_columns: 원시 벡터의 컬럼 이름 순서. 스케일러에 feature_names_in_ 이 있으면
+                   스케일러(=모델 입력) 순서로 재배열하는 것까지 A 에 포함합니다. 없으면 순서가 같다고 가정.
+    """
+    n = INPUT_SIZE
+    M = np.eye(n)
+    # processing.py: new_x = x*u_x[0] + z*u_x[2], new_z = x*u_z[0] + z*u_z[2]
+    R = np.array([[u_x[0], u_x[2]], [u_z[0], u_z[2]]], dtype=np.float64)
+    for k in range(NUM_SENSORS):
+        xz = [k * AXES, k * AXES + 2]
+        M[np.ix_(xz, xz)] = R
+
+    perm = np.arange(n)
+    if scaler is not None and input_columns is not None and hasattr(scaler, 'feature_names_in_'):
+        position = {name: i for i, name in enumerate(input_columns)}
+        perm = np.array([position[name] for name in scaler.feature_names_in_])
+    A, c = M[perm], np.zeros(n)
+    if scaler is not None:
+        A = A / scaler.scale_[:, None]
+        c = (c - scaler.mean_) / scaler.scale_
+    return A, c
+
+
+def linear_stack(model):
+    """nn.Sequential(layers) 에서 Linear 층의 (W, b) 를 numpy float64 로 순서대로 꺼냅니다. (ReLU/Dropout 은 건너뜀)"""
+    return [(m.weight.detach().cpu().double().numpy(), m.bias.detach().cpu().double().numpy())
+            for m in model.layers if isinstance(m, nn.Linear)]
+
+
+def fold_affine(W, b, A, c):
+    """Linear(W, b) 앞의 아핀 변환 (A, c) 를 가중치에 흡수: W @ (A x + c) + b = (W @ A) x + (W @ c + b)."""
+    return W @ A, W @ c + b
+
+
+def _mlp_tail(layers):
+    """첫 Linear 이후의 층들을 ReLU 로 이은 Sequential (마지막 Linear 뒤에는 활성화 없음)."""
+    modules = []
+    for i, (W, b) in enumerate(layers):
+        linear = nn.Linear(W.shape[1], W.shape[0])
+        linear.weight.data = torch.from_numpy(W.astype(np.float32))
+        linear.bias.data = torch.from_numpy(b.astype(np.float32))
+        modules.append(linear)
+        if i < len(layers) - 1:
+            modules.append(nn.ReLU())
+    return nn.Sequential(*modules)
+
+
+def load_models(position_model_file, presence_model_file):
+    """train.py / train_classifier.py 가 저장한 state_dict 로 (MLP, PresenceDetector) 를 eval 모드로 만듭니다."""
+    position_model = MLP(INPUT_SIZE, OUTPUT_SIZE)
+    position_model.load_state_dict(torch.load(position_model_file, map_location='cpu'))
+    presence_model = PresenceDetector(INPUT_SIZE)
+    presence_model.load_state_dict(torch.load(presence_model_file, map_location='cpu'))
+    return position_model.eval(), presence_model.eval()
+
+
+class FusedPositionPresence(nn.Module):
+    """
+    전처리 아핀 변환을 흡수한 두 모델의 첫 Linear 를 하나의 (256 + 64, 72) Linear 로 합친 모듈.
+    입력은 원시 센서 값 (B, 72), 출력은 (존재 확률 (B, 1), 위치 (B, 3)).
+    Dropout 은 추론 시 항등이므로 제외합니다.
+    """
+    def __init__(self, position_layers, presence_layers, A, c):
+        super().__init__()
+        W_pos, b_pos = fold_affine(*position_layers[0], A, c)
+        W_pre, b_pre = fold_affine(*presence_layers[0], A, c)
+        self.split = W_pos.shape[0]
+        self.first = nn.Linear(A.shape[1], W_pos.shape[0] + W_pre.shape[0])
+        self.first.weight.data = torch.from_numpy(np.vstack([W_pos, W_pre]).astype(np.float32))
+        self.first.bias.data = torch.from_numpy(np.concatenate([b_pos, b_pre]).astype(np.float32))
+        self.position_tail = _mlp_tail(position_layers[1:])
+        self.presence_tail = _mlp_tail(presence_layers[1:])
+
+    def hidden(self, x):
+        h = torch.relu(self.first(x))
+        return h[:, :self.split], h[:, self.split:]
+
+    def forward(self, x):
+        h_pos, h_pre = self.hidden(x)
+        return torch.sigmoid(self.presence_tail(h_pre)), self.position_tail(h_pos)
+
+
+class InferenceEngine:
+    """
+    원시 센서 배치 (B, 72) -> (존재 확률 (B,), 패치 좌표계 위치 (B, 3)) 를 한 번의 배치 forward 로 계산합니다.
+
+    - 좌표 회전 + 스케일러는 첫 Linear 층에 흡수 (샘플별 파이썬 루프/scaler.transform 없음)
+      좌표계는 모델을 학습시킨 processing.py 와 같은 build_axes_3d 기준
+    - PresenceDetector 와 MLP 의 첫 층을 하나의 행렬곱으로 합쳐 입력을 한 번만 읽음
+    - gate=True 이면 존재 확률이 threshold 이하인 행은 위치 층을 계산하지 않고 NaN 으로 둠
+    """
+    def __init__(self, position_model, presence_model, origin, u_x, u_y, u_z, scaler=None,
+                 input_columns=None, threshold=PRESENCE_THRESHOLD, device='cpu', num_threads=NUM_THREADS):
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.origin = origin
+        self.u_x = np.asarray(u_x, dtype=np.float64)
+        self.u_y = np.asarray(u_y, dtype=np.float64)
+        self.u_z = np.asarray(u_z, dtype=np.float64)
+        self.threshold = threshold
+        self.device = torch.device(device)
+        A, c = build_input_affine(u_x, u_z, scaler, input_columns)
+        self.model = FusedPositionPresence(linear_stack(position_model), linear_stack(presence_model), A, c)
+        self.model.to(self.device).eval()
+
+    @classmethod
+    def from_files(cls, geometry_file, scaler_file, position_model_file, presence_model_file, **kwargs):
+        """지오메트리 CSV, 스케일러(joblib), 두 모델의 state_dict 파일로 엔진을 만듭니다."""
+        origin, u_x, u_y, u_z = build_axes_3d(pd.read_csv(geometry_file))
+        position_model, presence_model = load_models(position_model_file, presence_model_file)
+        return cls(position_model, presence_model, origin, u_x, u_y, u_z, joblib.load(scaler_file), **kwargs)
+
+    @torch.inference_mode()
+    def predict(self, raw, gate=False):
+        """
+        raw: (B, 72) 또는 (72,) 원시 센서 값 (센서 순서대로 x, y, z)
+        반환: (presence (B,), positions (B, 3)) numpy float32. 1차원 입력이면 B = 1.
+        """
+        x = torch.as_tensor(np.atleast_2d(np.asarray(raw, dtype=np.float32)), device=self.device)
+        if not gate:
+            presence, positions = self.model(x)
+            return presence[:, 0].cpu().numpy(), positions.cpu().numpy()
+
+        h_pos, h_pre = self.model.hidden(x)
+        presence = torch.sigmoid(self.model.presence_tail(h_pre))[:, 0]
+        positions = torch.full((x.shape[0], OUTPUT_SIZE), float('nan'), device=self.device)
+        present = presence > self.threshold
+        if bool(present.all()):
+            positions = self.model.position_tail(h_pos)
+        elif bool(present.any()):
+            positions[present] = self.model.position_tail(h_pos[present])
+        return presence.cpu().numpy(), positions.cpu().numpy()
+
+    def to_device_coords(self, positions):
+        """패치 좌표계 위치 (B, 3) -> 지오메트리(트래커) 원래 좌표계. (processing.py 의 3D 라벨 변환의 역변환)"""
+        return inverse_transform_tracker_array_3d(positions, self.origin, self.u_x, self.u_y, self.u_z)
+
+
+if __name__ == '__main__':
+    data_dir = './data'
+    model_dir = './models'
+    time_stamp = '20250727_224824'
+    engine = InferenceEngine.from_files(
+        f'{data_dir}/device_geometry_no_tracker.csv',
+        f'{model_dir}/sensor_scaler_{time_stamp}.joblib',
+        f'{model_dir}/hall_sensor_model_{time_stamp}.pth',
+        f'{model_dir}/presence_detector_{time_stamp}.pth')
+    benchmark(engine)
@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from coord_transform import NUM_SENSORS, AXES, inverse_transform_tracker_array_3d
+
+# --- 설정 ---
+# export_model.py 가 만드는 파일 이름 (모두 같은 export 디렉토리에 저장됨)
+EXPORT_NPZ = 'engine.npz'            # 전처리를 흡수한 가중치 + 좌표계 정보 (모든 백엔드가 메타데이터로 읽음)
+EXPORT_TORCHSCRIPT = 'engine.pt'
+EXPORT_ONNX = 'engine.onnx'
+EXPORT_INT8_DYNAMIC = 'engine_int8_dynamic.pt'   # quantize_model.py 가 만드는 int8 TorchScript
+EXPORT_INT8_STATIC = 'engine_int8_static.pt'
+BACKENDS = ('numpy', 'torchscript', 'int8-dynamic', 'int8-static', 'onnx', 'eager')
+DEFAULT_BACKEND = 'numpy'
+
+
+def load_export(export_dir):
+    """engine.npz 를 읽어 가중치와 메타데이터 dict 로 반환합니다. (torch 불필요)"""
+    with np.load(os.path.join(export_dir, EXPORT_NPZ)) as npz:
+        data = {k: npz[k] for k in npz.files}
+    if 'u_y' not in data:
+        # u_y 가 없는 export 는 processing_multipatch 좌표계를 잘못 흡수한 이전 버전이라 사용할 수 없음
+        raise ValueError(f"'{export_dir}' was exported with the old 2D coordinate convention. "
+                         "Please run export_model.py again.")
+    data['origin'] = dict(zip(('pos_x', 'pos_y', 'pos_z'), data['origin'].tolist()))
+    data['split'] = int(data['split'])
+    data['threshold'] = float(data['threshold'])
+    return data
+
+
+def _layers(data, prefix):
+    layers = []
+    while f'{prefix}_W_{len(layers)}' in data:
+        i = len(layers)
+        layers.append((data[f'{prefix}_W_{i}'], data[f'{prefix}_b_{i}']))
+    return layers
+
+
+class _Runtime:
+    """백엔드 공통: 좌표계 정보, 게이팅, 좌표 역변환. 하위 클래스는 _forward(x) -> (presence (B,), positions (B, 3)) 구현."""
+    name = None
+
+    def __init__(self, data):
+        self.origin = data['origin']
+        self.u_x = data['u_x']
+        self.u_y = data['u_y']
+        self.u_z = data['u_z']
+        self.threshold = data['threshold']
+
+    def predict(self, raw, gate=False):
+        """InferenceEngine.predict 와 같은 인터페이스: raw (B, 72) 또는 (72,) -> (presence (B,), positions (B, 3))."""
+        x = np.atleast_2d(np.asarray(raw, dtype=np.float32))
+        presence, positions = self._forward(x)
+        if gate:
+            positions[presence <= self.threshold] = np.nan
+        return presence, positions
+
+    def to_device_coords(self, positions):
+        return inverse_transform_tracker_array_3d(positions, self.origin, self.u_x, self.u_y, self.u_z)
+
+
+class NumpyRuntime(_Runtime):
+    """
+    순수 numpy 행렬곱 백엔드. torch 를 import 하지 않으므로 시작이 빠르고,
+    72→256→128→64→3 정도의 작은 망에서는 eager torch 의 연산자 디스패치 비용이 없어 호출당 지연도 짧습니다.
+    가중치는 (입력, 출력) 전치 형태의 연속 배열로 두어 x @ W 한 번으로 계산합니다.
+    """
+    name = 'numpy'
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.split = data['split']
+        self.first_W = np.ascontiguousarray(data['first_W'].T, dtype=np.float32)
+        self.first_b = data['first_b'].astype(np.float32)
+        self.position_tail = [(np.ascontiguousarray(W.T, dtype=np.float32), b.astype(np.float32))
+                              for W, b in _layers(data, 'position')]
+        self.presence_tail = [(np.ascontiguousarray(W.T, dtype=np.float32), b.astype(np.float32))
+                              for W, b in _layers(data, 'presence')]
+
+    @staticmethod
+    def _tail(h, layers):
+        last = len(layers) - 1
+        for i, (W, b) in enumerate(layers):
+            h = h @ W
+            h += b
+            if i < last:
+                np.maximum(h, 0, out=h)
+        return h
+
+    def _hidden(self, x):
+        h = x @ self.first_W
+        h += self.first_b
+        np.maximum(h, 0, out=h)
+        return h[:, :self.split], h[:, self.split:]
+
+    def _presence(self, h_pre):
+        return 1.0 / (1.0 + np.exp(-self._tail(h_pre, self.presence_tail)[:, 0]))
+
+    def _forward(self, x):
+        h_pos, h_pre = self._hidden(x)
+        return self._presence(h_pre), self._tail(h_pos, self.position_tail)
+
+    def predict(self, raw, gate=False):
+        # 게이팅 시 존재하지 않는 행은 위치 층을 계산하지 않음
+        if not gate:
+            return super().predict(raw)
+        x = np.atleast_2d(np.asarray(raw, dtype=np.float32))
+        h_pos, h_pre = self._hidden(x)
+        presence = self._presence(h_pre)
+        present = presence > self.threshold
+        if present.all():
+            return presence, self._tail(h_pos, self.position_tail)
+        positions = np.full((len(x), 3), np.nan, dtype=np.float32)
+        if present.any():
+            positions[present] = self._tail(h_pos[present], self.position_tail)
+        return presence, positions
+
+
+class _TorchRuntime(_Runtime):
+    def __init__(self, data, num_threads=1):
+        super().__init__(data)
+        import torch
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+
+    def _forward(self, x):
+        with self.torch.inference_mode():
+            presence, positions = self.model(self.torch.from_numpy(x))
+        return presence[:, 0].numpy(), positions.numpy()
+
+
+class TorchScriptRuntime(_TorchRuntime):
+    name = 'torchscript'
+
+    def __init__(self, data, export_dir, num_threads=1, filename=EXPORT_TORCHSCRIPT):
+        super().__init__(data, num_threads)
+        self.model = self.torch.jit.load(os.path.join(export_dir, filename), map_location='cpu')
+        self.model.eval()
+
+
+class EagerRuntime(_TorchRuntime):
+    """export 된 가중치로 FusedPositionPresence 를 다시 만든 eager PyTorch 백엔드 (비교/디버깅용)."""
+    name = 'eager'
+
+    def __init__(self, data, num_threads=1):
+        super().__init__(data, num_threads)
+        from inference_engine import FusedPositionPresence
+        split = data['split']
+        W, b = data['first_W'].astype(np.float64), data['first_b'].astype(np.float64)
+        position = [(W[:split], b[:split])] + _layers(data, 'position')
+        presence = [(W[split:], b[split:])] + _layers(data, 'presence')
+        # 첫 층은 이미 전처리가 흡수된 가중치이므로 항등 변환으로 다시 접음
+        identity = np.eye(W.shape[1])
+        self.model = FusedPositionPresence(position, presence, identity, np.zeros(W.shape[1])).eval()
+
+
+class OnnxRuntime(_Runtime):
+    """onnxruntime 백엔드 (선택 설치: pip install onnxruntime)."""
+    name = 'onnx'
+
+    def __init__(self, data, export_dir, num_threads=1):
+        super().__init__(data)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The 'onnx' backend requires onnxruntime (pip install onnxruntime).")
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(os.path.join(export_dir, EXPORT_ONNX), options,
+                                            providers=['CPUExecutionProvider'])
+
+    def _forward(self, x):
+        presence, positions = self.session.run(None, {'raw': x})
+        return presence[:, 0], positions
+
+
+def load_runtime(export_dir, backend=DEFAULT_BACKEND, num_threads=1):
+    """export 디렉토리에서 지정한 백엔드의 추론 런타임을 만듭니다. 모든 백엔드는 같은 predict() 인터페이스를 가집니다."""
+    data = load_export(export_dir)
+    if backend == 'numpy':
+        return NumpyRuntime(data)
+    if backend == 'torchscript':
+        return TorchScriptRuntime(data, export_dir, num_threads)
+    if backend == 'int8-dynamic':
+        return TorchScriptRuntime(data, export_dir, num_threads, EXPORT_INT8_DYNAMIC)
+    if backend == 'int8-static':
+        return TorchScriptRuntime(data, export_dir, num_threads, EXPORT_INT8_STATIC)
+    if backend == 'onnx':
+        return OnnxRuntime(data, export_dir, num_threads)
+    if backend == 'eager':
+        return EagerRuntime(data, num_threads)
+    raise ValueError(f"Unknown backend '{backend}'. Choose from {BACKENDS}.")
+
+
+def benchmark(engine, batch_sizes=(1, 8, 64, 512), repeats=200, gate=False):
+    """배치 크기별 호출당 지연과 프레임당 시간(µs)을 출력합니다."""
+    results = []
+    for batch in batch_sizes:
+        raw = np.random.randn(batch, NUM_SENSORS * AXES).astype(np.float32)
+        for _ in range(10):
+            engine.predict(raw, gate=gate)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            engine.predict(raw, gate=gate)
+        per_call = (time.perf_counter() - t0) / repeats
+        results.append((batch, per_call * 1e6, per_call * 1e6 / batch))
+        print(f"batch {batch:5d}: {per_call * 1e6:9.1f} us/call, {per_call * 1e6 / batch:7.2f} us/frame")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark exported inference backends.")
+    parser.add_argument('export_dir', help="directory written by export_model.py")
+    parser.add_argument('--backend', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    reference = None
+    raw = np.random.randn(256, NUM_SENSORS * AXES).astype(np.float32)
+    for backend in args.backend:
+        print(f"\n[{backend}]")
+        t0 = time.perf_counter()
+        try:
+            engine = load_runtime(args.export_dir, backend)
+        except (ImportError, OSError, ValueError, RuntimeError) as e:
+            print(f"  -> Skipped: {e}")
+            continue
+        print(f"load: {(time.perf_counter() - t0) * 1e3:.1f} ms "
+              f"(torch imported: {'torch' in sys.modules})")
+        presence, positions = engine.predict(raw)
+        if reference is None:
+            reference = (presence, positions)
+        else:
+            print(f"max abs diff vs {args.backend[0]}: presence {np.abs(presence - reference[0]).max():.2e}, "
+                  f"position {np.abs(positions - reference[1]).max():.2e}")
+        benchmark(engine, repeats=args.repeats)
+
+
+if __name__ == '__main__':
+    main()
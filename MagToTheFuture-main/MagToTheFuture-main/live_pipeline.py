@@ -0,0 +1,331 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+
+from session_store import SESSION_EXT, load_session, load_recorder_session
+
+# 시리얼 프레임 파서/디코더는 저장소 루트(수집 스크립트 쪽)의 모듈을 그대로 사용
+HARDWARE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+if HARDWARE_DIR not in sys.path:
+    sys.path.append(HARDWARE_DIR)
+from frame_parser import FrameParser, SENSOR_COLUMN_NAMES  # noqa: E402
+from frame_protocol import STATUS_OK, BINARY_MODE_COMMAND, FrameDecoder, frame_status  # noqa: E402
+from replay_serial import encode_ascii_frames  # noqa: E402
+
+# --- 설정 ---
+QUEUE_SIZE = 8          # 단계 사이 큐에 쌓아 둘 수 있는 배치 수 (넘치면 가장 오래된 배치를 버림)
+MAX_BATCH = 64          # 추론 단계가 한 번에 처리하는 최대 프레임 수 (밀리면 오래된 프레임부터 버림)
+READ_SIZE = 8192
+STATS_WINDOW = 2048     # 지연 통계를 계산하는 최근 샘플 수
+REPORT_INTERVAL = 2.0   # 단계별 지연 리포트 주기 (초)
+REPLAY_RATE_HZ = 100.0  # 세션에 timestamp 가 없을 때 재생 속도
+REPLAY_CHUNK = 64       # 최고 속도(speed=0) 재생 시 한 번에 보내는 프레임 수
+
+
+class DropOldestQueue:
+    """
+    크기 제한이 있는 스레드 간 큐. 가득 차면 가장 오래된 항목을 버리고 새 항목을 넣습니다.
+    (생산자가 막히지 않고, 소비자가 늦어도 큐에 쌓인 지연이 QUEUE_SIZE 배치를 넘지 않음)
+    get_all() 은 쌓인 항목을 한 번에 모두 꺼내 배치 처리할 수 있게 합니다. maxsize=None 이면 제한 없음 (버리지 않음).
+    """
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get_all(self, timeout=None):
+        """쌓인 항목을 모두 꺼냅니다. 비어 있으면 timeout 동안 기다리고, 닫힌 뒤 비어 있으면 None 을 반환합니다."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None if self.closed else []
+            items = list(self._items)
+            self._items.clear()
+            return items
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """단계별 처리 시간/지연 샘플(초)의 최근 STATS_WINDOW 개로 p50/p95/최대값을 계산합니다."""
+    def __init__(self, window=STATS_WINDOW):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def extend(self, seconds):
+        self._samples.extend(seconds)
+        self.count += len(seconds)
+
+    def summary(self):
+        if not self._samples:
+            return None
+        ms = np.asarray(self._samples) * 1e3
+        return np.percentile(ms, 50), np.percentile(ms, 95), ms.max()
+
+
+# --- 입력 소스 ---
+class SerialSource:
+    """시리얼 포트에서 쌓인 바이트를 그대로 읽어 (수신 시각, 바이트) 로 다음 단계에 넘깁니다."""
+    def __init__(self, ser, frame_mode='ascii'):
+        self.ser = ser
+        self.frame_mode = frame_mode
+
+    def run(self, out_q, stop_event):
+        if self.frame_mode == 'binary':
+            self.ser.write(BINARY_MODE_COMMAND)
+        while not stop_event.is_set():
+            try:
+                data = self.ser.read(min(max(self.ser.in_waiting, 1), READ_SIZE))
+            except (OSError, TypeError):
+                break
+            if data:
+                out_q.put((time.perf_counter(), data))
+
+
+def load_replay_frames(path):
+    """
+    재생용 (timestamps (N,), 센서 값 (N, 72)) 을 읽습니다.
+    .mags 세션 파일, training_data CSV, session_recorder 디렉토리를 지원합니다. timestamp 가 없으면 None.
+    """
+    if os.path.isdir(path):
+        manifest, rows = load_recorder_session(path)
+        index = {name: j for j, name in enumerate(manifest['columns'])}
+        values = rows[:, [index[c] for c in SENSOR_COLUMN_NAMES]].astype(np.float32)
+        timestamps = rows[:, index['timestamp']] if 'timestamp' in index else None
+    elif path.endswith(SESSION_EXT):
+        session = load_session(path)
+        values = session.array(SENSOR_COLUMN_NAMES)
+        timestamps = np.asarray(session['timestamp'], dtype=np.float64) if 'timestamp' in session else None
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = SENSOR_COLUMN_NAMES + (['timestamp'] if 'timestamp' in header else [])
+        data = pd.read_csv(path, usecols=usecols)
+        values = data[SENSOR_COLUMN_NAMES].to_numpy(dtype=np.float32)
+        timestamps = data['timestamp'].to_numpy(dtype=np.float64) if 'timestamp' in data else None
+    return timestamps, values
+
+
+class SessionSource:
+    """
+    녹화된 세션을 하드웨어 대신 재생하는 소스.
+    프레임을 펌웨어와 같은 ASCII 라인(replay_serial.encode_ascii_frames)으로 인코딩해 기록 당시 간격(speed 배속)으로
+    내보내므로 파서 이후 단계는 실제 시리얼 입력과 똑같이 동작합니다. speed=0 이면 최대 속도로 재생.
+    (.mags 파일도 재생할 수 있다는 점 외에는 replay_serial.ReplaySerial 을 SerialSource 로 읽는 것과 같음)
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        timestamps, self.values = load_replay_frames(path)
+        if timestamps is None or len(timestamps) < 2:
+            timestamps = np.arange(len(self.values)) / REPLAY_RATE_HZ
+        self.offsets = timestamps - timestamps[0]
+
+    def _encode(self, start, stop):
+        return encode_ascii_frames(self.values[start:stop])
+
+    def run(self, out_q, stop_event):
+        while not stop_event.is_set():
+            t0 = time.perf_counter()
+            i, n = 0, len(self.values)
+            while i < n and not stop_event.is_set():
+                if self.speed:
+                    # 지금까지 도착했어야 할 프레임을 한 번에 보냄 (시리얼 수신 버퍼와 같은 방식)
+                    elapsed = (time.perf_counter() - t0) * self.speed
+                    j = int(np.searchsorted(self.offsets, elapsed, side='right'))
+                    if j == i:
+                        time.sleep(min((self.offsets[i] - elapsed) / self.speed, 0.01))
+                        continue
+                else:
+                    j = min(i + REPLAY_CHUNK, n)
+                out_q.put((time.perf_counter(), self._encode(i, j)))
+                i = j
+            if not self.loop:
+                break
+
+
+class LivePipeline:
+    """
+    소스 -> 파서 -> 추론(전처리 + 존재 판정 + 위치) -> 싱크 를 각각의 스레드로 파이프라인 처리합니다.
+
+    - 단계 사이는 DropOldestQueue: 뒤 단계가 밀리면 오래된 데이터를 버려 지연이 계속 커지지 않음.
+      단, 소스 -> 파서 큐는 제한 없음: ASCII 바이트 조각을 버리면 앞 프레임 앞부분과 뒤 프레임 뒷부분이 한 줄로
+      이어져 쉼표 개수가 맞는 가짜 프레임이 생기므로, 버리기는 파싱된 프레임 배치 (frame_q, result_q) 에서만 함
+    - 각 단계는 큐에 쌓인 것을 한 번에 꺼내 배치로 처리 (추론은 최근 MAX_BATCH 프레임만)
+    - 전처리(좌표 회전 + 스케일러)는 engine 의 첫 층에 흡수되어 있어 추론 단계 안에서 같이 계산됨
+    - 단계별 처리 시간과 프레임 수신 -> 위치 출력까지의 종단 지연을 stats 에 기록
+
+    engine: InferenceEngine 또는 inference_runtime 의 런타임 (predict(raw, gate=True), to_device_coords 필요)
+    sink(host_times, presence, positions): 결과 배치를 받는 함수. positions 는 지오메트리 원래 좌표계, 부재 시 NaN.
+    """
+    def __init__(self, engine, source, frame_mode='ascii', sink=None,
+                 queue_size=QUEUE_SIZE, max_batch=MAX_BATCH):
+        self.engine = engine
+        self.source = source
+        self.frame_mode = frame_mode
+        self.sink = sink or print_sink()
+        self.max_batch = max_batch
+        self.raw_q = DropOldestQueue(maxsize=None)
+        self.frame_q = DropOldestQueue(queue_size)
+        self.result_q = DropOldestQueue(queue_size)
+        self.stats = {name: StageStats() for name in ('parse', 'inference', 'sink', 'end_to_end')}
+        self.frames_dropped = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    # --- 단계 ---
+    def _parse_stage(self):
+        parser = FrameParser(fill_value=0.0)
+        decoder = FrameDecoder()
+        buffer = b''
+        while True:
+            items = self.raw_q.get_all(timeout=0.1)
+            if items is None:
+                break
+            if not items:
+                continue
+            t0 = time.perf_counter()
+            host_times, values = [], []
+            for t_recv, data in items:
+                if self.frame_mode == 'binary':
+                    frames = decoder.feed(data)
+                    batch = frames['values'].astype(np.float32)
+                    batch[np.repeat(frame_status(frames) != STATUS_OK, 3, axis=1)] = 0.0
+                else:
+                    buffer += data
+                    if b'\n' not in data:
+                        continue
+                    *raw_lines, buffer = buffer.split(b'\n')
+                    lines = [l.decode('utf-8', 'ignore').strip() for l in raw_lines]
+                    parsed, _ = parser.parse([l for l in lines if l])
+                    batch = parsed.reshape(len(parsed), len(SENSOR_COLUMN_NAMES))
+                if len(batch):
+                    values.append(batch)
+                    host_times.append(np.full(len(batch), t_recv))
+            if values:
+                self.frame_q.put((np.concatenate(host_times), np.concatenate(values)))
+            self.stats['parse'].add(time.perf_counter() - t0)
+        self.frame_q.close()
+
+    def _inference_stage(self):
+        while True:
+            items = self.frame_q.get_all(timeout=0.1)
+            if items is None:
+                break
+            if not items:
+                continue
+            t0 = time.perf_counter()
+            host_times = np.concatenate([t for t, _ in items])
+            values = np.concatenate([v for _, v in items])
+            if len(values) > self.max_batch:
+                # 밀린 경우 가장 최근 프레임만 추론 (오래된 위치는 의미가 없음)
+                self.frames_dropped += len(values) - self.max_batch
+                host_times, values = host_times[-self.max_batch:], values[-self.max_batch:]
+            presence, positions = self.engine.predict(values, gate=True)
+            self.result_q.put((host_times, presence, positions))
+            self.stats['inference'].add(time.perf_counter() - t0)
+        self.result_q.close()
+
+    def _sink_stage(self):
+        while True:
+            items = self.result_q.get_all(timeout=0.1)
+            if items is None:
+                break
+            for host_times, presence, positions in items:
+                t0 = time.perf_counter()
+                self.sink(host_times, presence, self.engine.to_device_coords(positions))
+                t1 = time.perf_counter()
+                self.stats['sink'].add(t1 - t0)
+                self.stats['end_to_end'].extend((t1 - host_times).tolist())
+
+    def _source_stage(self):
+        try:
+            self.source.run(self.raw_q, self._stop)
+        finally:
+            self.raw_q.close()
+
+    # --- 제어 ---
+    def start(self):
+        for target in (self._source_stage, self._parse_stage, self._inference_stage, self._sink_stage):
+            thread = threading.Thread(target=target, name=target.__name__.strip('_'), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def run(self, duration=None, report_interval=REPORT_INTERVAL):
+        """파이프라인을 실행하고 주기적으로 리포트를 출력합니다. 소스가 끝나거나 duration 초가 지나거나 Ctrl+C 로 종료."""
+        self.start()
+        t_start = last_report = time.perf_counter()
+        try:
+            while self.is_running():
+                time.sleep(0.1)
+                now = time.perf_counter()
+                if duration is not None and now - t_start >= duration:
+                    break
+                if now - last_report >= report_interval:
+                    self.report()
+                    last_report = now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        self.report()
+
+    def report(self):
+        parts = []
+        for name, stats in self.stats.items():
+            summary = stats.summary()
+            if summary is not None:
+                parts.append(f"{name} p50 {summary[0]:.2f} / p95 {summary[1]:.2f} / max {summary[2]:.2f} ms")
+        drops = self.frame_q.dropped + self.result_q.dropped
+        print(f"[latency] frames {self.stats['end_to_end'].count}, dropped batches {drops}, "
+              f"dropped frames {self.frames_dropped}")
+        for part in parts:
+            print(f"  {part}")
+
+
+def print_sink(interval=0.1):
+    """가장 최근 결과를 interval 초마다 한 번 출력하는 기본 싱크."""
+    last = [0.0]
+
+    def sink(host_times, presence, positions):
+        now = time.perf_counter()
+        if now - last[0] < interval:
+            return
+        last[0] = now
+        if not np.isnan(positions[-1]).any():
+            x, y, z = positions[-1]
+            print(f"[{time.strftime('%H:%M:%S')}] Predicted Position (Original Coords): "
+                  f"X={x:.3f}, Y={y:.3f}, Z={z:.3f} (p={presence[-1]:.2f})")
+        else:
+            print(f"[{time.strftime('%H:%M:%S')}] No presence detected. (p={presence[-1]:.2f})")
+    return sink
@@ -0,0 +1,210 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import Dataset, DataLoader, Sampler, BatchSampler, SubsetRandomSampler
+
+from session_store import SESSION_EXT, load_session
+
+# --- 설정 ---
+STORE_DIR_NAME = '.train_store'
+STORE_VERSION = 1
+CSV_CHUNK_ROWS = 50000
+
+
+def read_columns(source_path):
+    """전처리 결과 파일(CSV 또는 .mags)의 컬럼 목록만 읽습니다."""
+    if source_path.endswith(SESSION_EXT):
+        return load_session(source_path).columns
+    return list(pd.read_csv(source_path, nrows=0).columns)
+
+
+def _count_rows(source_path):
+    if source_path.endswith(SESSION_EXT):
+        return len(load_session(source_path))
+    # 헤더 제외한 줄 수 (마지막 줄에 개행이 없어도 셈)
+    count = 0
+    last = b'\n'
+    with open(source_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            count += block.count(b'\n')
+            last = block[-1:]
+    return count - 1 + (last != b'\n')
+
+
+def _iter_source_chunks(source_path, columns):
+    if source_path.endswith(SESSION_EXT):
+        session = load_session(source_path)
+        for start in range(0, len(session), CSV_CHUNK_ROWS):
+            yield pd.DataFrame({c: session[c][start:start + CSV_CHUNK_ROWS] for c in columns})
+    else:
+        yield from pd.read_csv(source_path, usecols=columns, chunksize=CSV_CHUNK_ROWS)
+
+
+def _store_key(source_path, feature_columns, target_columns, index_filters):
+    spec = {
+        'version': STORE_VERSION,
+        'features': list(feature_columns),
+        'targets': list(target_columns),
+        'filters': {k: list(v) for k, v in sorted((index_filters or {}).items())},
+    }
+    stat = os.stat(source_path)
+    # 파일 크기 + 수정 시각으로 원본 변경 여부를 판단 (내용 해시는 데이터 크기에 비례해 시작이 느려짐)
+    source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    return spec, source
+
+
+class TrainingStore:
+    """
+    전처리 결과를 행 우선 float32 .npy 파일(features, targets)로 변환해 둔 학습용 저장소.
+    배열은 처음 접근할 때 np.memmap 으로 열리며, 워커 프로세스로 넘길 때는 경로만 전달됩니다.
+    index(name) 은 빌드 시 미리 계산해 둔 필터 결과(행 번호 배열)입니다.
+    """
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.feature_columns = self.meta['spec']['features']
+        self.target_columns = self.meta['spec']['targets']
+        self.n_rows = self.meta['n_rows']
+        self._features = None
+        self._targets = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_features'] = state['_targets'] = None  # memmap 내용을 피클링하지 않도록
+        return state
+
+    @property
+    def features(self):
+        if self._features is None:
+            self._features = np.load(os.path.join(self.store_dir, 'features.npy'), mmap_mode='r')
+        return self._features
+
+    @property
+    def targets(self):
+        if self._targets is None:
+            self._targets = np.load(os.path.join(self.store_dir, 'targets.npy'), mmap_mode='r')
+        return self._targets
+
+    def index(self, name):
+        return np.load(os.path.join(self.store_dir, f'index_{name}.npy'))
+
+
+def build_training_store(source_path, store_dir, feature_columns, target_columns, index_filters=None):
+    """
+    CSV/.mags 를 청크 단위로 읽어 features.npy (N, F), targets.npy (N, T) float32 memmap 에 채웁니다.
+    index_filters: {이름: (컬럼, 값)} -> 해당 컬럼 == 값 인 행 번호를 index_<이름>.npy 로 저장
+    """
+    index_filters = index_filters or {}
+    spec, source = _store_key(source_path, feature_columns, target_columns, index_filters)
+    os.makedirs(store_dir, exist_ok=True)
+    n_rows = _count_rows(source_path)
+
+    features = np.lib.format.open_memmap(os.path.join(store_dir, 'features.npy.tmp'), mode='w+',
+                                         dtype=np.float32, shape=(n_rows, len(feature_columns)))
+    targets = np.lib.format.open_memmap(os.path.join(store_dir, 'targets.npy.tmp'), mode='w+',
+                                        dtype=np.float32, shape=(n_rows, len(target_columns)))
+    filter_columns = [col for col, _ in index_filters.values()]
+    usecols = list(dict.fromkeys(list(feature_columns) + list(target_columns) + filter_columns))
+    hits = {name: [] for name in index_filters}
+
+    start = 0
+    for chunk in _iter_source_chunks(source_path, usecols):
+        end = start + len(chunk)
+        features[start:end] = chunk[feature_columns].to_numpy(dtype=np.float32)
+        targets[start:end] = chunk[target_columns].to_numpy(dtype=np.float32)
+        for name, (col, value) in index_filters.items():
+            hits[name].append(start + np.flatnonzero(chunk[col].to_numpy() == value))
+        start = end
+    features.flush()
+    targets.flush()
+    del features, targets
+
+    for name in index_filters:
+        idx = np.concatenate(hits[name]) if hits[name] else np.empty(0, dtype=np.int64)
+        np.save(os.path.join(store_dir, f'index_{name}.npy'), idx.astype(np.int64))
+    for name in ('features', 'targets'):
+        os.replace(os.path.join(store_dir, f'{name}.npy.tmp'), os.path.join(store_dir, f'{name}.npy'))
+    # meta.json 을 마지막에 써서, 중간에 중단되면 다음 실행 때 다시 빌드되도록 함
+    with open(os.path.join(store_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'spec': spec, 'source': source, 'source_path': os.path.abspath(source_path),
+                   'n_rows': start}, f, ensure_ascii=False, indent=2)
+    return TrainingStore(store_dir)
+
+
+def open_training_store(source_path, feature_columns, target_columns, index_filters=None, store_dir=None):
+    """
+    원본이 바뀌지 않았고 컬럼/필터 구성이 같으면 기존 저장소를 그대로 열고, 아니면 새로 빌드합니다.
+    두 번째 실행부터는 데이터 크기와 무관하게 메타 파일만 읽고 바로 시작합니다.
+    """
+    if store_dir is None:
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        store_dir = os.path.join(os.path.dirname(source_path), STORE_DIR_NAME, stem)
+    spec, source = _store_key(source_path, feature_columns, target_columns, index_filters)
+    meta_path = os.path.join(store_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['spec'] == json.loads(json.dumps(spec)) and meta['source'] == source:
+            return TrainingStore(store_dir)
+        os.remove(meta_path)
+    print(f"Building memory-mapped training store for '{source_path}'...")
+    return build_training_store(source_path, store_dir, feature_columns, target_columns, index_filters)
+
+
+class MemmapDataset(Dataset):
+    """
+    TrainingStore 위의 Dataset. 데이터는 복사하지 않고 행 번호로만 부분집합을 다룹니다.
+    __getitem__ 에 행 번호 리스트를 주면 배치 전체를 한 번에 모아 (X, y) 텐서로 반환합니다.
+    (make_loader 가 BatchSampler 로 배치 단위 인덱스를 넘겨줌)
+    """
+    def __init__(self, store, indices=None):
+        self.store = store
+        self.indices = np.arange(store.n_rows) if indices is None else np.asarray(indices, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, idx):
+        rows = self.indices[idx]
+        if np.ndim(rows):
+            rows = np.sort(rows)  # memmap 을 앞에서부터 읽도록 정렬 (배치 안의 순서는 학습에 영향 없음)
+        return (torch.from_numpy(np.ascontiguousarray(self.store.features[rows])),
+                torch.from_numpy(np.ascontiguousarray(self.store.targets[rows])))
+
+    def tensors(self, positions=None):
+        """positions (이 Dataset 기준 위치) 에 해당하는 행 전체를 (X, y) 텐서로 모읍니다. 시각화/평가용."""
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions)
+        rows = self.indices[positions]
+        return torch.from_numpy(self.store.features[rows]), torch.from_numpy(self.store.targets[rows])
+
+
+def make_loader(dataset, positions, batch_size, shuffle, pin_memory=None, num_workers=0, generator=None):
+    """
+    dataset 안의 positions 만 배치로 읽는 DataLoader. 분할은 위치 배열만 나누므로 데이터 복사가 없습니다.
+    pin_memory 기본값은 CUDA 사용 가능 여부를 따릅니다.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if shuffle:
+        sampler = SubsetRandomSampler(positions.tolist(), generator=generator)
+    else:
+        sampler = _PositionSampler(positions)
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False),
+                      batch_size=None, pin_memory=pin_memory, num_workers=num_workers,
+                      persistent_workers=num_workers > 0)
+
+
+class _PositionSampler(Sampler):
+    """positions 를 주어진 순서대로 돌려주는 샘플러 (검증용, 셔플 없음)."""
+    def __init__(self, positions):
+        self.positions = positions
+
+    def __iter__(self):
+        return iter(self.positions.tolist())
+
+    def __len__(self):
+        return len(self.positions)
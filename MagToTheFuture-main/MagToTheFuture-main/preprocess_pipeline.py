@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import hashlib
+import inspect
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.preprocessing import StandardScaler
+
+# --- 설정 ---
+CACHE_DIR_NAME = '.preprocess_cache'
+CACHE_VERSION = 3          # 캐시 파일 구조가 바뀌면 올려서 기존 캐시를 무효화
+HASH_BLOCK = 1 << 20
+MAX_WORKERS = None         # None 이면 os.cpu_count()
+OUTPUT_CHUNK_ROWS = 50000  # 스케일링된 결과를 CSV 로 쓸 때 한 번에 처리하는 행 수
+
+
+def file_digest(path):
+    """파일 내용의 SHA-1 해시 (파일명/수정시각이 아니라 내용 기준)."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def code_digest(process_fn):
+    """
+    process_fn 이 정의된 모듈 파일과, 그 모듈이 쓰는 같은 폴더의 로컬 모듈(coord_transform 등) 파일 내용의 해시.
+    process_pair 본문이나 모듈 수준 설정, 헬퍼 함수를 고치면 CACHE_VERSION 을 올리지 않아도 캐시가 무효화됩니다.
+    이 모듈(캐시 관리 코드)은 제외합니다.
+    """
+    module = sys.modules.get(process_fn.__module__)
+    module_file = getattr(module, '__file__', None)
+    if not module_file:
+        # 대화형 세션 등 파일이 없는 모듈은 함수 소스만 사용
+        return hashlib.sha1(inspect.getsource(process_fn).encode()).hexdigest()
+    root = os.path.dirname(os.path.abspath(module_file))
+    paths = {os.path.abspath(module_file)}
+    for value in vars(module).values():
+        dependency = value if inspect.ismodule(value) else sys.modules.get(getattr(value, '__module__', None) or '')
+        path = getattr(dependency, '__file__', None)
+        if path and dependency.__name__ != __name__ and os.path.dirname(os.path.abspath(path)) == root:
+            paths.add(os.path.abspath(path))
+    h = hashlib.sha1()
+    for path in sorted(paths):
+        h.update(os.path.basename(path).encode())
+        h.update(file_digest(path).encode())
+    return h.hexdigest()
+
+
+def pair_cache_key(data_dir, geometry_filename, data_filename, process_fn, params, code=None):
+    """지오메트리/데이터 파일 내용 + 처리 함수(와 그 코드) + 변환 파라미터로 캐시 키를 만듭니다."""
+    h = hashlib.sha1()
+    h.update(f'v{CACHE_VERSION}:{process_fn.__module__}.{process_fn.__qualname__}'.encode())
+    h.update((code or code_digest(process_fn)).encode())
+    h.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    h.update(data_filename.encode())  # 파일명으로 라벨을 정하는 처리(patch_count 등)가 있으므로 포함
+    for filename in (geometry_filename, data_filename):
+        if filename:
+            h.update(file_digest(os.path.join(data_dir, filename)).encode())
+    return h.hexdigest()
+
+
+def column_stats(df, prefix):
+    """
+    prefix 로 시작하는 컬럼별 (유효 개수, 평균, 편차 제곱합 M2) 를 계산합니다.
+    NaN 은 StandardScaler.fit 과 동일하게 제외합니다.
+    """
+    columns = [c for c in df.columns if c.startswith(prefix)]
+    values = df[columns].to_numpy(dtype=np.float64)
+    count = np.sum(~np.isnan(values), axis=0).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, np.nansum(values, axis=0) / count, 0.0)
+        m2 = np.nansum((values - mean) ** 2, axis=0)
+    return {'columns': columns, 'count': count, 'mean': mean, 'm2': m2}
+
+
+def merge_stats(stats_list):
+    """
+    세션별 통계를 컬럼 이름 기준으로 병합합니다 (Chan et al. 병렬 분산 공식).
+    sum/sum-of-squares 를 그대로 더하는 방식보다 큰 값에서 수치적으로 안정적입니다.
+    """
+    merged = {}
+    for stats in stats_list:
+        for name, n_b, mean_b, m2_b in zip(stats['columns'], stats['count'], stats['mean'], stats['m2']):
+            if name not in merged:
+                merged[name] = [n_b, mean_b, m2_b]
+                continue
+            n_a, mean_a, m2_a = merged[name]
+            n = n_a + n_b
+            if n == 0:
+                continue
+            delta = mean_b - mean_a
+            merged[name] = [n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n]
+    return merged
+
+
+def scaler_from_stats(merged, columns):
+    """병합된 통계로 fit 이 끝난 StandardScaler 를 만듭니다. (fit 결과와 같은 속성 구성)"""
+    count = np.array([merged[c][0] for c in columns], dtype=np.float64)
+    mean = np.array([merged[c][1] for c in columns], dtype=np.float64)
+    var = np.array([merged[c][2] for c in columns], dtype=np.float64) / np.maximum(count, 1)
+    scale = np.sqrt(var)
+    scale[scale < 10 * np.finfo(np.float64).eps] = 1.0  # sklearn 과 동일하게 분산 0 인 컬럼은 1 로
+
+    scaler = StandardScaler()
+    scaler.mean_ = mean
+    scaler.var_ = var
+    scaler.scale_ = scale
+    # sklearn 도 NaN 이 없어 모든 컬럼의 개수가 같으면 int, 아니면 컬럼별 배열로 둠
+    n_seen = count.astype(np.int64)
+    scaler.n_samples_seen_ = int(n_seen[0]) if len(n_seen) and (n_seen == n_seen[0]).all() else n_seen
+    scaler.n_features_in_ = len(columns)
+    scaler.feature_names_in_ = np.array(columns, dtype=object)
+    return scaler
+
+
+def _stats_path(cache_path):
+    return cache_path[:-len('.pkl')] + '.stats.pkl'
+
+
+def _write_pickle_atomic(obj, path):
+    tmp = path + '.tmp'
+    pd.to_pickle(obj, tmp)
+    os.replace(tmp, path)
+
+
+def _process_and_cache(process_fn, data_dir, geometry_filename, data_filename, params, cache_path, scale_prefix):
+    """
+    워커 프로세스에서 실행: 한 쌍을 처리하고 결과와 통계를 캐시에 저장합니다.
+    통계는 별도 파일로 저장해서 스케일러 fit 시 데이터 본체를 읽지 않도록 합니다.
+    (데이터 파일을 마지막에 쓰므로, 데이터 파일이 있으면 통계 파일도 있음)
+    """
+    processed = process_fn(data_dir, geometry_filename, data_filename, **(params or {}))
+    _write_pickle_atomic({'columns': list(processed.columns), 'stats': column_stats(processed, scale_prefix),
+                          'pair': (geometry_filename, data_filename)},
+                         _stats_path(cache_path))
+    _write_pickle_atomic(processed, cache_path)
+    return cache_path
+
+
+def prepare_pairs(data_dir, data_pairs, process_fn, params=None, scale_prefix='S_',
+                  cache_dir=None, max_workers=MAX_WORKERS):
+    """
+    (geometry_file, data_file) 쌍들을 전처리해서 캐시에 준비하고, 성공한 쌍의 캐시 경로를 입력 순서대로 반환합니다.
+
+    - 각 쌍의 결과는 파일 내용 해시 + 처리 함수와 그 모듈 코드 + params 로 키를 만든 캐시에 저장
+      -> 바뀌거나 새로 추가된 쌍만 다시 처리 (나머지는 캐시에서 바로 읽음)
+    - 캐시에 없는 쌍은 프로세스 풀에서 병렬 처리
+    process_fn(data_dir, geometry_filename, data_filename, **params) -> DataFrame 은
+    워커 프로세스에서 import 가능한 모듈 수준 함수여야 합니다.
+    """
+    cache_dir = cache_dir or os.path.join(data_dir, CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    cache_paths = {}
+    pending = []
+    code = code_digest(process_fn)
+    for pair in data_pairs:
+        geometry_filename, data_filename = pair
+        try:
+            key = pair_cache_key(data_dir, geometry_filename, data_filename, process_fn, params, code)
+        except OSError as e:
+            print(f"  -> Skipped {data_filename}: {e}")
+            continue
+        cache_paths[pair] = os.path.join(cache_dir, f'{key}.pkl')
+        if os.path.exists(cache_paths[pair]) and os.path.exists(_stats_path(cache_paths[pair])):
+            print(f"[Cached]     {data_filename}")
+        else:
+            pending.append(pair)
+
+    failed = set()
+    if len(pending) == 1:
+        # 한 쌍이면 프로세스 풀을 띄우는 비용이 더 큼
+        geometry_filename, data_filename = pending[0]
+        try:
+            print(f"[Processing] {data_filename}")
+            _process_and_cache(process_fn, data_dir, geometry_filename, data_filename, params,
+                               cache_paths[pending[0]], scale_prefix)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  -> Error ({data_filename}): {e}")
+            failed.add(pending[0])
+    elif pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_process_and_cache, process_fn, data_dir, geometry_filename, data_filename,
+                            params, cache_paths[(geometry_filename, data_filename)], scale_prefix):
+                (geometry_filename, data_filename)
+                for geometry_filename, data_filename in pending
+            }
+            for future in as_completed(futures):
+                pair = futures[future]
+                try:
+                    future.result()
+                    print(f"[Processing] {pair[1]} done")
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"  -> Error ({pair[1]}): {e}")
+                    failed.add(pair)
+
+    ready = [cache_paths[pair] for pair in data_pairs if pair in cache_paths and pair not in failed]
+    if not ready:
+        raise RuntimeError("No processed data. Please check the input files.")
+    return ready
+
+
+def cached_pair(cache_path):
+    """캐시 경로가 어느 (geometry_file, data_file) 쌍의 결과인지 통계 파일에서 읽습니다."""
+    return tuple(pd.read_pickle(_stats_path(cache_path))['pair'])
+
+
+def fit_scaler(cache_paths, scale_prefix='S_'):
+    """
+    세션별 통계 파일만 읽어서 스케일러를 만듭니다 (데이터 본체는 읽지 않음).
+    반환: (스케일러, 병합 결과 컬럼 순서, 스케일 대상 컬럼 목록)
+    컬럼 순서는 세션들의 컬럼을 처음 나온 순서대로 합친 것입니다 (모든 세션의 컬럼이 같으면 pd.concat 과 동일).
+    """
+    columns = []
+    seen = set()
+    stats_list = []
+    for path in cache_paths:
+        cached = pd.read_pickle(_stats_path(path))
+        stats_list.append(cached['stats'])
+        for c in cached['columns']:
+            if c not in seen:
+                seen.add(c)
+                columns.append(c)
+    scale_columns = [c for c in columns if c.startswith(scale_prefix)]
+    return scaler_from_stats(merge_stats(stats_list), scale_columns), columns, scale_columns
+
+
+def iter_chunks(cache_paths, columns=None, chunk_rows=OUTPUT_CHUNK_ROWS):
+    """캐시된 세션을 하나씩 읽어 chunk_rows 행 단위 DataFrame 으로 순회합니다. (메모리에는 세션 하나만 올라감)"""
+    for path in cache_paths:
+        data = pd.read_pickle(path)
+        if columns is not None and list(data.columns) != list(columns):
+            data = data.reindex(columns=columns)
+        for start in range(0, len(data), chunk_rows):
+            yield data.iloc[start:start + chunk_rows]
+        del data
+
+
+def write_scaled_csv(cache_paths, scaler, columns, scale_columns, output_csv, chunk_rows=OUTPUT_CHUNK_ROWS):
+    """
+    캐시된 세션들을 청크 단위로 스케일링해서 하나의 CSV 로 이어 씁니다.
+    전체 병합 DataFrame 을 만들지 않으므로 최대 메모리는 세션 하나 + 청크 하나 분량입니다.
+    반환: 기록한 행 수
+    """
+    total = 0
+    header = True
+    with open(output_csv, 'w', newline='') as f:
+        for chunk in iter_chunks(cache_paths, columns, chunk_rows):
+            chunk = apply_scaler(chunk.copy(), scaler, scale_columns)
+            chunk.to_csv(f, header=header, index=False)
+            header = False
+            total += len(chunk)
+    return total
+
+
+def run_pipeline(data_dir, data_pairs, process_fn, params=None, scale_prefix='S_',
+                 cache_dir=None, max_workers=MAX_WORKERS):
+    """
+    메모리에 다 올려서 쓰는 경우용: prepare_pairs + fit_scaler 후 병합 DataFrame 을 만듭니다.
+    반환: (스케일링 전 병합 DataFrame, 스케일러, 스케일 대상 컬럼 목록)
+    """
+    cache_paths = prepare_pairs(data_dir, data_pairs, process_fn, params, scale_prefix, cache_dir, max_workers)
+    scaler, columns, scale_columns = fit_scaler(cache_paths, scale_prefix)
+    final_data = pd.concat([pd.read_pickle(path) for path in cache_paths], ignore_index=True)
+    return final_data, scaler, scale_columns
+
+
+def apply_scaler(df, scaler, columns):
+    """스케일러를 한 번의 벡터 연산으로 적용합니다 (scaler.transform 과 같은 계산). df 를 직접 수정합니다."""
+    values = df[columns].to_numpy(dtype=np.float64)
+    df[columns] = (values - scaler.mean_) / scaler.scale_
+    return df
@@ -1,10 +1,11 @@
-import pandas as pd
 import numpy as np
 from datetime import datetime
-from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 import joblib
-import os
+
+from session_store import load_pair, load_geometry
+from coord_transform import build_axes_3d
+from preprocess_pipeline import prepare_pairs, cached_pair, fit_scaler, write_scaled_csv
 
 data_dir = r'C:\Users\HCIS\Desktop\박정주\MagToTheFuture'
 model_dir = r'C:\Users\HCIS\Desktop\박정주\MagToTheFuture\models'
@@ -16,44 +17,20 @@ data_pairs = [
     ('area_multi_device_geometry_20250808_214316.csv', 'area_multi_training_data_20250808_214316.csv')
 ]
 
-processed_data_list = []
-
-for geometry_filename, data_filename in data_pairs:
-    print(f"Processing: {data_filename} using {geometry_filename}")
-    
+def index_geometry(device_geometry, geometry_filename):
     try:
-        device_geometry_path = os.path.join(data_dir, geometry_filename)
-        training_data_path = os.path.join(data_dir, data_filename)
-        
-        device_geometry = pd.read_csv(device_geometry_path)
-        training_data = pd.read_csv(training_data_path)
-
-    except FileNotFoundError as e:
-        print(f"오류: 파일을 찾을 수 없습니다. '{e.filename}'")
-        print("data 폴더에 파일이 정확히 있는지 확인해주세요.")
-        continue
-    except Exception as e:
-        print(f"파일을 읽는 중 오류가 발생했습니다: {e}")
-        continue
-
-    try:
-        geometry = device_geometry.set_index('label')
+        return device_geometry.set_index('label')
     except KeyError:
         print(f"오류: '{geometry_filename}' 파일에 'label' 컬럼이 없습니다.")
         print("CSV 파일의 첫 번째 열 헤더를 'label'로 수정해주세요.")
-        continue
-        
-    origin = geometry.loc['Corner_2']
-    corner1 = geometry.loc['Corner_1']
-    corner3 = geometry.loc['Corner_3']
+        raise
 
-    vec_x_raw = corner1[['pos_x', 'pos_y', 'pos_z']] - origin[['pos_x', 'pos_y', 'pos_z']]
-    vec_z_raw = corner3[['pos_x', 'pos_y', 'pos_z']] - origin[['pos_x', 'pos_y', 'pos_z']]
-
-    u_x = vec_x_raw / np.linalg.norm(vec_x_raw)
-    vec_y_raw = np.cross(vec_z_raw, vec_x_raw)
-    u_y = vec_y_raw / np.linalg.norm(vec_y_raw)
-    u_z = np.cross(u_x, u_y)
+def process_pair(data_dir, geometry_filename, data_filename):
+    """한 (geometry, data) 쌍을 장치 좌표계로 변환합니다. (preprocess_pipeline 워커에서 실행)"""
+    print(f"Processing: {data_filename} using {geometry_filename}")
+    device_geometry, training_data = load_pair(data_dir, geometry_filename, data_filename)
+    geometry = index_geometry(device_geometry, geometry_filename)
+    origin, u_x, u_y, u_z = build_axes_3d(geometry)
 
     processed_data = training_data.copy()
 
@@ -79,53 +56,64 @@ for geometry_filename, data_filename in data_pairs:
 
     is_tracker = 0 if 'no_tracker' in data_filename else 1
     processed_data['is_tracker'] = is_tracker
-    processed_data_list.append(processed_data)
+    return processed_data
+
+if __name__ == '__main__':
+    # 바뀌거나 새로 추가된 쌍만 병렬로 처리하고, 나머지는 캐시 사용
+    try:
+        cache_paths = prepare_pairs(data_dir, data_pairs, process_pair)
+    except RuntimeError as e:
+        print(f"오류: {e}")
+        print("data 폴더에 파일이 정확히 있는지 확인해주세요.")
+        exit()
 
-final_data = pd.concat(processed_data_list, ignore_index=True)
+    # 세션별 통계를 병합한 스케일러 (전체 데이터를 메모리에 합치지 않음)
+    scaler, columns, sensor_columns_to_scale = fit_scaler(cache_paths)
 
-scaler = StandardScaler()
-sensor_columns_to_scale = [col for col in final_data.columns if col.startswith('S_')]
-if sensor_columns_to_scale:
-    final_data[sensor_columns_to_scale] = scaler.fit_transform(final_data[sensor_columns_to_scale])
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_csv = f'{data_dir}/processed_training_data_{timestamp}.csv'
+    output_scaler = f'{model_dir}/sensor_scaler_{timestamp}.joblib'
+    output_plot_file = f'{data_dir}/coordinate_system_{timestamp}.png'
 
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-output_csv = f'{data_dir}/processed_training_data_{timestamp}.csv'
-output_scaler = f'{model_dir}/sensor_scaler_{timestamp}.joblib'
-output_plot_file = f'{data_dir}/coordinate_system_{timestamp}.png'
+    # 세션을 하나씩 읽어 청크 단위로 스케일링하면서 CSV 에 이어 씀
+    write_scaled_csv(cache_paths, scaler, columns, sensor_columns_to_scale, output_csv)
+    joblib.dump(scaler, output_scaler)
 
-final_data.to_csv(output_csv, index=False)
-joblib.dump(scaler, output_scaler)
+    print(f"All merged and processed data saved to: {output_csv}")
+    print(f"Scaler saved to: {output_scaler}")
 
-print(f"All merged and processed data saved to: {output_csv}")
-print(f"Scaler saved to: {output_scaler}")
+    # 시각화는 처리에 성공한 마지막 쌍의 좌표계 기준 (지오메트리 파일만 읽음)
+    last_pair = cached_pair(cache_paths[-1])
+    geometry = index_geometry(load_geometry(data_dir, *last_pair), last_pair[0])
+    origin, u_x, u_y, u_z = build_axes_3d(geometry)
 
-print("Starting 3D coordinate system visualization.")
-fig = plt.figure(figsize=(10, 10))
-ax = fig.add_subplot(111, projection='3d')
+    print("Starting 3D coordinate system visualization.")
+    fig = plt.figure(figsize=(10, 10))
+    ax = fig.add_subplot(111, projection='3d')
 
-for label in ['Corner_1', 'Corner_2', 'Corner_3', 'Corner_4']:
-    if label in geometry.index:
-        point_orig = geometry.loc[label]
-        translated = point_orig - origin
+    for label in ['Corner_1', 'Corner_2', 'Corner_3', 'Corner_4']:
+        if label in geometry.index:
+            point_orig = geometry.loc[label]
+            translated = point_orig - origin
         
-        new_x = np.dot(translated, u_x)
-        new_y = np.dot(translated, u_y)
-        new_z = np.dot(translated, u_z)
+            new_x = np.dot(translated, u_x)
+            new_y = np.dot(translated, u_y)
+            new_z = np.dot(translated, u_z)
         
-        ax.scatter(new_x, new_y, new_z, c='red', s=100, label=f'Transformed {label}' if label == 'Corner_1' else "")
-        ax.text(new_x, new_y, new_z, label, fontsize=12)
-
-axis_length = 0.5
-ax.quiver(0, 0, 0, u_x[0]*axis_length, u_x[1]*axis_length, u_x[2]*axis_length, color='blue', label='New X-axis')
-ax.quiver(0, 0, 0, u_y[0]*axis_length, u_y[1]*axis_length, u_y[2]*axis_length, color='green', label='New Y-axis')
-ax.quiver(0, 0, 0, u_z[0]*axis_length, u_z[1]*axis_length, u_z[2]*axis_length, color='purple', label='New Z-axis')
-
-ax.set_title('Transformed New 3D Coordinate System', fontsize=16)
-ax.set_xlabel('New X-axis', fontsize=12)
-ax.set_ylabel('New Y-axis', fontsize=12)
-ax.set_zlabel('New Z-axis', fontsize=12)
-ax.legend()
-ax.grid(True)
-
-plt.savefig(output_plot_file)
-print(f"3D coordinate system image has been saved to '{output_plot_file}' file.")
\ No newline at end of file
+            ax.scatter(new_x, new_y, new_z, c='red', s=100, label=f'Transformed {label}' if label == 'Corner_1' else "")
+            ax.text(new_x, new_y, new_z, label, fontsize=12)
+
+    axis_length = 0.5
+    ax.quiver(0, 0, 0, u_x[0]*axis_length, u_x[1]*axis_length, u_x[2]*axis_length, color='blue', label='New X-axis')
+    ax.quiver(0, 0, 0, u_y[0]*axis_length, u_y[1]*axis_length, u_y[2]*axis_length, color='green', label='New Y-axis')
+    ax.quiver(0, 0, 0, u_z[0]*axis_length, u_z[1]*axis_length, u_z[2]*axis_length, color='purple', label='New Z-axis')
+
+    ax.set_title('Transformed New 3D Coordinate System', fontsize=16)
+    ax.set_xlabel('New X-axis', fontsize=12)
+    ax.set_ylabel('New Y-axis', fontsize=12)
+    ax.set_zlabel('New Z-axis', fontsize=12)
+    ax.legend()
+    ax.grid(True)
+
+    plt.savefig(output_plot_file)
+    print(f"3D coordinate system image has been saved to '{output_plot_file}' file.")
\ No newline at end of file
@@ -1,11 +1,13 @@
 import os
-import pandas as pd
 import numpy as np
 from datetime import datetime
-from sklearn.preprocessing import StandardScaler
 import joblib
 import matplotlib.pyplot as plt
 
+from session_store import load_pair
+from coord_transform import build_orthonormal_axes_2d, proj_xz, transform_xz, sensor_xz_columns
+from preprocess_pipeline import prepare_pairs, fit_scaler, write_scaled_csv
+
 data_dir = './data'
 model_dir = './models'
 os.makedirs(data_dir, exist_ok=True)
@@ -21,73 +23,24 @@ data_pairs = [
 # 시각화 저장 여부(코너 좌표 정합 확인용)
 PLOT_PER_PAIR = True   # True이면 각 쌍별 플롯 저장
 
-def build_orthonormal_axes_2d(geometry_df, origin_label='Corner_2',
-                              xref_label='Corner_1', zref_label='Corner_3'):
-    """
-    geometry_df: columns ['label','pos_x','pos_y','pos_z'] 가정
-    반환: (origin(dict-like), u_x(np.array[2]), u_z(np.array[2]), Lx(float), Lz(float))
-    """
-    geo = geometry_df.set_index('label')
-
-    origin  = geo.loc[origin_label]
-    corner1 = geo.loc[xref_label]
-    corner3 = geo.loc[zref_label]
-
-    v_x = np.array([corner1['pos_x'] - origin['pos_x'],
-                    corner1['pos_z'] - origin['pos_z']], dtype=float)
-    v_z = np.array([corner3['pos_x'] - origin['pos_x'],
-                    corner3['pos_z'] - origin['pos_z']], dtype=float)
-
-    if np.linalg.norm(v_x) == 0 or np.linalg.norm(v_z) == 0:
-        raise ValueError("The length of the Corner vector is 0. Please check the geometry CSV.")
-
-    u_x = v_x / np.linalg.norm(v_x)
-    v_z_orth = v_z - (v_z @ u_x) * u_x
-    if np.linalg.norm(v_z_orth) == 0:
-        raise ValueError("The x-axis and z-axis vectors are parallel. Please select a different corner.")
-    u_z = v_z_orth / np.linalg.norm(v_z_orth)
-
-    Lx = v_x @ u_x
-    Lz = v_z @ u_z
-    if Lx < 0:
-        u_x = -u_x; Lx = -Lx
-    if Lz < 0:
-        u_z = -u_z; Lz = -Lz
-
-    return origin, u_x, u_z, float(Lx), float(Lz)
-
-def proj_xz(x, z, origin, u_x, u_z):
-    tx = x - origin['pos_x']
-    tz = z - origin['pos_z']
-    new_x = tx * u_x[0] + tz * u_x[1]
-    new_z = tx * u_z[0] + tz * u_z[1]
-    return new_x, new_z
-
 def transform_tracker(df, origin, u_x, u_z):
-    new_x, new_z = zip(*[
-        proj_xz(x, z, origin, u_x, u_z)
-        for x, z in zip(df['tracker_pos_x'].to_numpy(),
-                        df['tracker_pos_z'].to_numpy())
-    ])
     df_out = df.copy()
-    df_out['tracker_pos_x'] = np.array(new_x)
-    df_out['tracker_pos_z'] = np.array(new_z)
+    new_xz = transform_xz(df[['tracker_pos_x', 'tracker_pos_z']].to_numpy(dtype=float), origin, u_x, u_z)
+    df_out['tracker_pos_x'] = new_xz[:, 0]
+    df_out['tracker_pos_z'] = new_xz[:, 1]
     df_out['tracker_pos_y'] = df['tracker_pos_y'] - origin['pos_y']
     return df_out
 
 def transform_sensors(df, origin, u_x, u_z):
-    sensor_cols = [c for c in df.columns if c.startswith('S_')]
-    bases = sorted(set(['_'.join(c.split('_')[:-1]) for c in sensor_cols]))
+    # 모든 센서의 (x, z) 쌍을 (N, 센서 수, 2) 로 묶어 한 번에 변환
+    xcols, zcols = sensor_xz_columns(df.columns)
     out = df.copy()
-    for base in bases:
-        xcol = f'{base}_x'
-        zcol = f'{base}_z'
-        if xcol in out.columns and zcol in out.columns:
-            X = out[xcol].to_numpy()
-            Z = out[zcol].to_numpy()
-            new = np.array([proj_xz(x, z, origin, u_x, u_z) for x, z in zip(X, Z)])
-            out[xcol] = new[:, 0]
-            out[zcol] = new[:, 1]
+    if not xcols:
+        return out
+    xz = np.stack([df[xcols].to_numpy(dtype=float), df[zcols].to_numpy(dtype=float)], axis=-1)
+    new_xz = transform_xz(xz, origin, u_x, u_z)
+    out[xcols] = new_xz[:, :, 0]
+    out[zcols] = new_xz[:, :, 1]
     return out
 
 def plot_corners_2d(origin, u_x, u_z, geometry_df, save_path):
@@ -120,61 +73,37 @@ def get_patch_label(filename: str) -> int:
     if '_triple' in fname:  return 3
     raise ValueError(f"Cannot parse the patch count from the filename (_single/_multi/_triple): {filename}")
 
+def process_pair(data_dir, geometry_filename, data_filename):
+    """한 (geometry, data) 쌍을 패치 좌표계로 변환하고 patch_count 라벨을 붙입니다. (preprocess_pipeline 워커에서 실행)"""
+    device_geometry, training_data = load_pair(data_dir, geometry_filename, data_filename)
+    origin, u_x, u_z, Lx, Lz = build_orthonormal_axes_2d(device_geometry)
+
+    processed = transform_tracker(training_data, origin, u_x, u_z)
+    processed = transform_sensors(processed, origin, u_x, u_z)
+
+    # 패치 개수 라벨 추가 (파일명 기준)
+    processed['patch_count'] = get_patch_label(data_filename)
+
+    if PLOT_PER_PAIR:
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        plot_path = os.path.join(data_dir, f'coord_system_{os.path.splitext(data_filename)[0]}_{ts}.png')
+        plot_corners_2d(origin, u_x, u_z, device_geometry, plot_path)
+        print(f"  -> Saved coord plot: {plot_path}")
+    return processed
+
 if __name__ == "__main__":
-    processed_data_list = []
-
-    for geometry_filename, data_filename in data_pairs:
-        print(f"[Processing] data={data_filename}  geom={geometry_filename}")
-        geom_path = os.path.join(data_dir, geometry_filename)
-        data_path = os.path.join(data_dir, data_filename)
-
-        try:
-            device_geometry = pd.read_csv(geom_path)
-            training_data = pd.read_csv(data_path)
-        except FileNotFoundError as e:
-            print(f"  -> Error: {e}")
-            continue
-
-        try:
-            origin, u_x, u_z, Lx, Lz = build_orthonormal_axes_2d(device_geometry)
-        except ValueError as e:
-            print(f"  -> Geometry error: {e}")
-            continue
-
-        processed = transform_tracker(training_data, origin, u_x, u_z)
-        processed = transform_sensors(processed, origin, u_x, u_z)
-
-        # 패치 개수 라벨 추가 (파일명 기준)
-        try:
-            processed['patch_count'] = get_patch_label(data_filename)
-        except ValueError as e:
-            print(f"  -> Label error: {e}")
-            continue
-
-        processed_data_list.append(processed)
-
-        if PLOT_PER_PAIR:
-            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-            plot_path = os.path.join(data_dir, f'coord_system_{os.path.splitext(data_filename)[0]}_{ts}.png')
-            plot_corners_2d(origin, u_x, u_z, device_geometry, plot_path)
-            print(f"  -> Saved coord plot: {plot_path}")
-
-    if not processed_data_list:
-        raise RuntimeError("No processed data. Please check the input files.")
-
-    final_data = pd.concat(processed_data_list, ignore_index=True)
-
-    # 센서만 표준화
-    scaler = StandardScaler()
-    sensor_columns = [c for c in final_data.columns if c.startswith('S_')]
-    final_data[sensor_columns] = scaler.fit_transform(final_data[sensor_columns])
+    # 바뀌거나 새로 추가된 쌍만 병렬로 처리하고, 나머지는 캐시 사용
+    cache_paths = prepare_pairs(data_dir, data_pairs, process_pair)
+
+    # 센서만 표준화: 세션별 통계를 병합해 스케일러를 만들고, 전체를 메모리에 합치지 않고 청크 단위로 스케일링해서 저장
+    scaler, columns, sensor_columns = fit_scaler(cache_paths)
 
     # 저장
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_csv    = os.path.join(data_dir,  f'processed_training_data_{timestamp}.csv')
     output_scaler = os.path.join(model_dir, f'sensor_scaler_{timestamp}.joblib')
 
-    final_data.to_csv(output_csv, index=False)
+    write_scaled_csv(cache_paths, scaler, columns, sensor_columns, output_csv)
     joblib.dump(scaler, output_scaler)
 
     print(f"[Done] Merged & processed data: {output_csv}")
@@ -0,0 +1,167 @@
+import os
+import copy
+import time
+import argparse
+import platform
+import numpy as np
+import joblib
+import torch
+import torch.nn as nn
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_absolute_error
+from torch.ao.quantization import quantize_dynamic, get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+from inference_engine import InferenceEngine, INPUT_SIZE, build_input_affine
+from inference_runtime import EXPORT_INT8_DYNAMIC, EXPORT_INT8_STATIC
+from memmap_dataset import read_columns, open_training_store, MemmapDataset
+
+# --- 설정 ---
+data_dir = './data'
+model_dir = './models'
+time_stamp = '20250727_224824'
+INPUT_CSV_PATH = f'{data_dir}/processed_training_data_all.csv'
+TEST_SPLIT_RATIO = 0.2     # train.py 와 같은 분할 (random_state=42) -> 같은 검증 세트로 Val MAE 비교
+CALIBRATION_ROWS = 2048    # 정적 양자화 보정에 쓰는 학습 분할의 앞부분 (검증 세트와 겹치지 않음)
+EVAL_BATCH = 4096
+# 1 Mbaud 에서 바이너리 프레임(308 B, 10 bit/byte) 기준 링크가 낼 수 있는 최대 프레임 수
+SENSOR_RATE_HZ = 1000000 / 10 / 308
+# 저전력 ARM 보드는 qnnpack, x86 은 x86(fbgemm) 커널
+QUANT_ENGINE = 'qnnpack' if platform.machine().lower().startswith(('arm', 'aarch')) else 'x86'
+
+
+def select_quant_engine(name=QUANT_ENGINE):
+    supported = torch.backends.quantized.supported_engines
+    if name not in supported:
+        name = 'fbgemm' if 'fbgemm' in supported else supported[-1]
+    torch.backends.quantized.engine = name
+    return name
+
+
+def load_eval_data(engine, scaler, input_csv=INPUT_CSV_PATH, calibration_rows=CALIBRATION_ROWS):
+    """
+    train.py 와 같은 (is_tracker == 1, test_size 0.2, random_state 42) 검증 세트와 보정용 학습 슬라이스를 읽습니다.
+    전처리된(스케일링된) 특징을 엔진 입력(원시 센서 값)으로 되돌려서, 전처리가 흡수된 실제 배포 모델을 그대로 평가합니다.
+    엔진의 지오메트리는 processing.py 가 그 세션을 변환할 때 쓴 것과 같아야 합니다.
+    반환: (보정용 원시 입력, 검증 원시 입력, 검증 라벨)
+    """
+    columns = read_columns(input_csv)
+    exclude = ('tracker_pos', 'timestamp', 'tracker_rot_', 'is_tracker')
+    feature_cols = [c for c in columns if not c.startswith(exclude)]
+    target_cols = ['tracker_pos_x', 'tracker_pos_y', 'tracker_pos_z']
+    store = open_training_store(input_csv, feature_cols, target_cols,
+                                index_filters={'is_tracker': ('is_tracker', 1)})
+    dataset = MemmapDataset(store, store.index('is_tracker'))
+    train_idx, val_idx = train_test_split(np.arange(len(dataset)), test_size=TEST_SPLIT_RATIO, random_state=42)
+
+    # processing.py 센서 회전 + 스케일러 (엔진 첫 층에 흡수된 것과 같은 변환) 의 역변환
+    A, c = build_input_affine(engine.u_x, engine.u_z, scaler)
+    A_inv = np.linalg.inv(A)
+
+    def to_raw(features):
+        return ((features.numpy().astype(np.float64) - c) @ A_inv.T).astype(np.float32)
+
+    calib_x, _ = dataset.tensors(np.sort(train_idx[:calibration_rows]))
+    val_x, val_y = dataset.tensors(val_idx)
+    return to_raw(calib_x), to_raw(val_x), val_y.numpy()
+
+
+def quantize_dynamic_int8(model):
+    """Linear 가중치만 int8, 활성값은 호출마다 동적으로 양자화."""
+    return quantize_dynamic(copy.deepcopy(model).eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static_int8(model, calibration_x, batch=EVAL_BATCH):
+    """FX 그래프 모드 정적 양자화: 보정 데이터로 활성값 범위를 관측한 뒤 가중치/활성값 모두 int8 로 변환."""
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    example = (torch.from_numpy(calibration_x[:1]),)
+    prepared = prepare_fx(copy.deepcopy(model).eval(), qconfig_mapping, example)
+    with torch.inference_mode():
+        for start in range(0, len(calibration_x), batch):
+            prepared(torch.from_numpy(calibration_x[start:start + batch]))
+    return convert_fx(prepared)
+
+
+def run_model(model, raw, batch=EVAL_BATCH):
+    presence, positions = [], []
+    with torch.inference_mode():
+        for start in range(0, len(raw), batch):
+            p, pos = model(torch.from_numpy(raw[start:start + batch]))
+            presence.append(p[:, 0].numpy())
+            positions.append(pos.numpy())
+    return np.concatenate(presence), np.concatenate(positions)
+
+
+def measure_latency(model, batch, repeats=500):
+    x = torch.randn(batch, INPUT_SIZE)
+    with torch.inference_mode():
+        for _ in range(20):
+            model(x)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            model(x)
+    return (time.perf_counter() - t0) / repeats
+
+
+def compare(models, val_x, val_y, sensor_rate=SENSOR_RATE_HZ):
+    """
+    모델별 Val MAE(train.py 와 같은 단위), float32 대비 존재 판정 일치율, 단일 코어 지연/처리량을 출력합니다.
+    headroom = B=1 처리 가능 프레임 수 / 센서 프레임 수 (1 이상이면 한 코어로 전체 센서 속도 추론 가능)
+    """
+    reference_presence = None
+    rows = []
+    for name, model in models.items():
+        presence, positions = run_model(model, val_x)
+        if reference_presence is None:
+            reference_presence = presence
+        mae = mean_absolute_error(val_y, positions)
+        agreement = np.mean((presence > 0.5) == (reference_presence > 0.5))
+        single = measure_latency(model, 1)
+        batched = measure_latency(model, 64, repeats=200)
+        rows.append((name, mae, agreement, single * 1e6, 64 / batched, 1 / single / sensor_rate))
+
+    print(f"\nSensor rate: {sensor_rate:.0f} frames/s, torch threads: {torch.get_num_threads()}, "
+          f"quantized engine: {torch.backends.quantized.engine}")
+    print(f"{'model':<14}{'Val MAE':>12}{'dMAE':>12}{'presence':>10}{'us/frame':>10}{'fps@B64':>12}{'headroom':>10}")
+    base_mae = rows[0][1]
+    for name, mae, agreement, us, fps, headroom in rows:
+        print(f"{name:<14}{mae:>12.6f}{mae - base_mae:>+12.6f}{agreement:>10.4f}{us:>10.1f}{fps:>12.0f}{headroom:>9.1f}x")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Post-training int8 quantization of the fused inference model.")
+    parser.add_argument('--geometry', default=f'{data_dir}/device_geometry_no_tracker.csv')
+    parser.add_argument('--scaler', default=f'{model_dir}/sensor_scaler_{time_stamp}.joblib')
+    parser.add_argument('--position-model', default=f'{model_dir}/hall_sensor_model_{time_stamp}.pth')
+    parser.add_argument('--presence-model', default=f'{model_dir}/presence_detector_{time_stamp}.pth')
+    parser.add_argument('--data', default=INPUT_CSV_PATH)
+    parser.add_argument('-o', '--out', default=f'{model_dir}/export_{time_stamp}',
+                        help="export directory (same as export_model.py) for the int8 TorchScript files")
+    parser.add_argument('--sensor-rate', type=float, default=SENSOR_RATE_HZ)
+    args = parser.parse_args(argv)
+
+    torch.set_num_threads(1)  # 저전력 보드의 단일 코어 기준으로 측정
+    engine_name = select_quant_engine()
+    print(f"Quantized engine: {engine_name}")
+
+    engine = InferenceEngine.from_files(args.geometry, args.scaler, args.position_model, args.presence_model)
+    calib_x, val_x, val_y = load_eval_data(engine, joblib.load(args.scaler), args.data)
+    print(f"Calibration rows: {len(calib_x)}, validation rows: {len(val_x)}")
+
+    models = {
+        'float32': engine.model,
+        'int8-dynamic': quantize_dynamic_int8(engine.model),
+        'int8-static': quantize_static_int8(engine.model, calib_x),
+    }
+    compare(models, val_x, val_y, args.sensor_rate)
+
+    os.makedirs(args.out, exist_ok=True)
+    for name, filename in (('int8-dynamic', EXPORT_INT8_DYNAMIC), ('int8-static', EXPORT_INT8_STATIC)):
+        path = os.path.join(args.out, filename)
+        torch.jit.save(torch.jit.script(models[name]), path)
+        print(f"Saved: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# --- 세션 파일 포맷 (.mags) ---
+# [magic 8B][schema_version u32][header_len u32][JSON 헤더 (64B 정렬 패딩)][컬럼 블록 ...]
+# - 컬럼 블록은 각각 64바이트 정렬된 연속 배열이라 np.memmap 으로 복사 없이 바로 열 수 있음
+# - JSON 헤더: 행 수, 컬럼별 (name, dtype, offset), device_geometry 테이블, 원본 파일 등 메타데이터
+SESSION_EXT = '.mags'
+MAGIC = b'MAGSESS\x00'
+SCHEMA_VERSION = 1
+ALIGN = 64
+PREAMBLE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('header_len', '<u4')])
+
+# timestamp 는 epoch 초라 float32 로는 정밀도가 부족함 (약 128초 단위) -> float64 유지
+FLOAT64_COLUMNS = ('timestamp',)
+# 문자열 컬럼(예: 'Patch' o/x 라벨)은 int16 코드 + 헤더의 categories 목록으로 저장 (결측값은 -1)
+CATEGORY_DTYPE = np.dtype('<i2')
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _encode_column(name, values):
+    """컬럼 하나를 (저장용 배열, 헤더 항목) 으로 변환합니다."""
+    if name in FLOAT64_COLUMNS:
+        return values.astype('<f8', copy=False), {'name': name, 'dtype': '<f8'}
+    if np.issubdtype(values.dtype, np.number) or values.dtype == bool:
+        return values.astype('<f4', copy=False), {'name': name, 'dtype': '<f4'}
+    categorical = pd.Categorical(values)
+    if len(categorical.categories) > np.iinfo(CATEGORY_DTYPE).max:
+        raise TypeError(f"Column '{name}' has too many distinct values to store as a category.")
+    entry = {'name': name, 'dtype': CATEGORY_DTYPE.str, 'categories': [str(c) for c in categorical.categories]}
+    return categorical.codes.astype(CATEGORY_DTYPE), entry
+
+
+def _geometry_to_json(geometry):
+    if geometry is None:
+        return None
+    geometry = pd.DataFrame(geometry)
+    return {
+        'columns': [str(c) for c in geometry.columns],
+        'rows': json.loads(geometry.to_json(orient='values')),
+    }
+
+
+def write_session(path, data, geometry=None, meta=None):
+    """
+    컬럼형 세션 파일을 기록합니다.
+    data: DataFrame 또는 {컬럼명: 1차원 배열} (모든 컬럼 길이 동일)
+    geometry: device_geometry 테이블 (DataFrame 또는 레코드 리스트), 세션 안에 그대로 포함됨
+    meta: 추가로 보관할 JSON 직렬화 가능한 dict (원본 파일명, 수집 조건 등)
+    """
+    if isinstance(data, pd.DataFrame):
+        names = [str(c) for c in data.columns]
+        arrays = [data[c].to_numpy() for c in data.columns]
+    else:
+        names = list(data.keys())
+        arrays = [np.asarray(v) for v in data.values()]
+    n_rows = len(arrays[0]) if arrays else 0
+    if any(len(a) != n_rows for a in arrays):
+        raise ValueError("All columns must have the same length.")
+
+    columns = []
+    encoded = []
+    offset = 0
+    for name, values in zip(names, arrays):
+        values, entry = _encode_column(name, values)
+        entry['offset'] = offset
+        columns.append(entry)
+        encoded.append(values)
+        offset = _align(offset + values.nbytes)
+
+    header = {
+        'schema_version': SCHEMA_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'n_rows': n_rows,
+        'columns': columns,
+        'geometry': _geometry_to_json(geometry),
+        'meta': meta or {},
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _align(PREAMBLE.itemsize + len(header_bytes))
+    header_bytes += b' ' * (data_start - PREAMBLE.itemsize - len(header_bytes))
+
+    preamble = np.array([(MAGIC, SCHEMA_VERSION, len(header_bytes))], dtype=PREAMBLE)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(preamble.tobytes())
+        f.write(header_bytes)
+        for col, values in zip(columns, encoded):
+            f.seek(data_start + col['offset'])
+            f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+    return path
+
+
+class Session:
+    """
+    memmap 으로 연 세션 파일. 컬럼 접근은 복사 없는 읽기 전용 뷰를 반환합니다.
+
+    - session['S_70_0_x'] -> (n_rows,) 배열 (문자열 컬럼은 int16 코드, session.categories(name) 로 라벨 확인)
+    - session.array(columns) -> (n_rows, len(columns)) float32 배열 (모델 입력용)
+    - session.geometry -> device_geometry DataFrame (없으면 None)
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            raw = f.read(PREAMBLE.itemsize)
+            if len(raw) < PREAMBLE.itemsize or raw[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"'{path}' is not a session file.")
+            preamble = np.frombuffer(raw, dtype=PREAMBLE)[0]
+            version = int(preamble['version'])
+            if version > SCHEMA_VERSION:
+                raise ValueError(f"'{path}' uses schema version {version} (supported up to {SCHEMA_VERSION}).")
+            header_len = int(preamble['header_len'])
+            self.header = json.loads(f.read(header_len).decode('utf-8'))
+        self.schema_version = version
+        self.n_rows = self.header['n_rows']
+        self.meta = self.header['meta']
+        self._columns = {c['name']: c for c in self.header['columns']}
+        self._data_start = PREAMBLE.itemsize + header_len
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r') if self.n_rows else None
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        col = self._columns[name]
+        dtype = np.dtype(col['dtype'])
+        if self._mm is None:
+            return np.empty(0, dtype=dtype)
+        start = self._data_start + col['offset']
+        return self._mm[start:start + self.n_rows * dtype.itemsize].view(dtype)
+
+    def categories(self, name):
+        """문자열 컬럼의 라벨 목록 (숫자 컬럼이면 None)."""
+        return self._columns[name].get('categories')
+
+    def array(self, columns=None, dtype=np.float32):
+        """지정한 컬럼들을 (n_rows, len(columns)) 배열로 쌓아 반환합니다."""
+        columns = self.columns if columns is None else list(columns)
+        out = np.empty((self.n_rows, len(columns)), dtype=dtype)
+        for j, name in enumerate(columns):
+            out[:, j] = self[name]
+        return out
+
+    @property
+    def geometry(self):
+        geometry = self.header['geometry']
+        if geometry is None:
+            return None
+        return pd.DataFrame(geometry['rows'], columns=geometry['columns'])
+
+    def to_dataframe(self, columns=None):
+        """pandas 로 처리하는 기존 코드용. 지정한 컬럼을 원래 순서대로 DataFrame 으로 만듭니다."""
+        columns = self.columns if columns is None else list(columns)
+        data = {}
+        for name in columns:
+            categories = self.categories(name)
+            if categories is None:
+                data[name] = self[name]
+            else:
+                labels = np.array(categories + [np.nan], dtype=object)
+                data[name] = labels[self[name]]  # 코드 -1 -> 마지막 항목(NaN)
+        return pd.DataFrame(data, columns=columns)
+
+
+def load_session(path):
+    return Session(path)
+
+
+def load_pair(data_dir, geometry_filename, data_filename):
+    """
+    (device_geometry, training_data) DataFrame 쌍을 읽습니다.
+    data_filename 이 세션 파일이면 내장된 지오메트리를 쓰고(geometry_filename 은 무시), CSV 이면 기존처럼 둘 다 읽습니다.
+    """
+    data_path = os.path.join(data_dir, data_filename)
+    if data_filename.endswith(SESSION_EXT):
+        session = load_session(data_path)
+        if session.geometry is None:
+            raise FileNotFoundError(2, "Session has no embedded geometry", data_path)
+        return session.geometry, session.to_dataframe()
+    device_geometry = pd.read_csv(os.path.join(data_dir, geometry_filename))
+    training_data = pd.read_csv(data_path)
+    return device_geometry, training_data
+
+
+def load_geometry(data_dir, geometry_filename, data_filename):
+    """load_pair 와 같은 규칙으로 device_geometry 만 읽습니다. (학습 데이터 본체는 읽지 않음)"""
+    data_path = os.path.join(data_dir, data_filename)
+    if data_filename.endswith(SESSION_EXT):
+        geometry = load_session(data_path).geometry
+        if geometry is None:
+            raise FileNotFoundError(2, "Session has no embedded geometry", data_path)
+        return geometry
+    return pd.read_csv(os.path.join(data_dir, geometry_filename))
+
+
+# --- 기존 데이터 변환 ---
+_STAMP_RE = re.compile(r'(\d{8}_\d{6}|DualPatchData_\d+)$')
+
+
+def find_geometry_file(data_path):
+    """
+    training_data CSV 와 짝이 되는 device_geometry CSV 를 같은 폴더에서 찾습니다.
+    파일명 끝의 타임스탬프(또는 DualPatchData_N)가 같은 지오메트리 파일 중,
+    'training_data' 앞의 접두어(rot_, area_multi_ 등)까지 같은 것을 우선합니다.
+    """
+    folder, fname = os.path.split(data_path)
+    stem = os.path.splitext(fname)[0]
+    match = _STAMP_RE.search(stem)
+    if 'training_data' not in stem or not match:
+        return None
+    stamp = match.group(1)
+    prefix = stem.split('training_data')[0].rstrip('_')
+    candidates = [f for f in os.listdir(folder or '.')
+                  if 'geometry' in f and f.endswith(f'_{stamp}.csv')]
+    preferred = [f for f in candidates if f.startswith(prefix)] if prefix else []
+    if len(preferred) == 1:
+        return os.path.join(folder, preferred[0])
+    if len(candidates) == 1:
+        return os.path.join(folder, candidates[0])
+    exact = [f for f in candidates if f == f'{prefix}device_geometry_{stamp}.csv' or f == f'device_geometry_{stamp}.csv']
+    return os.path.join(folder, exact[0]) if exact else None
+
+
+def convert_csv(data_path, out_path=None, geometry_path=None):
+    """training_data CSV (+ 짝이 되는 device_geometry CSV) 하나를 세션 파일로 변환합니다."""
+    if out_path is None:
+        out_path = os.path.splitext(data_path)[0] + SESSION_EXT
+    if geometry_path is None:
+        geometry_path = find_geometry_file(data_path)
+    data = pd.read_csv(data_path)
+    geometry = pd.read_csv(geometry_path) if geometry_path else None
+    meta = {
+        'source': os.path.basename(data_path),
+        'geometry_source': os.path.basename(geometry_path) if geometry_path else None,
+    }
+    return write_session(out_path, data, geometry, meta)
+
+
+def load_recorder_session(session_dir):
+    """
+    수집 스크립트의 session_recorder 출력(manifest.json + seg_*.npy)을 (매니페스트, (N, 컬럼 수) 배열) 로 읽습니다.
+    비정상 종료된 세션도 매니페스트에 기록된 행까지 읽습니다.
+    """
+    with open(os.path.join(session_dir, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    segments = [np.load(os.path.join(session_dir, s['file']), mmap_mode='r')[:s['rows']]
+                for s in manifest['segments']]
+    rows = np.concatenate(segments) if segments else np.empty((0, len(manifest['columns'])))
+    return manifest, rows
+
+
+def convert_recorder_session(session_dir, out_path=None):
+    """session_recorder 출력 디렉토리를 세션 파일로 변환합니다."""
+    session_dir = session_dir.rstrip('/\\')
+    manifest, rows = load_recorder_session(session_dir)
+    data = {name: rows[:, j] for j, name in enumerate(manifest['columns'])}
+
+    geometry = None
+    if manifest.get('geometry'):
+        geometry_path = os.path.join(session_dir, manifest['geometry'])
+        if os.path.exists(geometry_path):
+            geometry = pd.read_csv(geometry_path)
+    meta = {
+        'source': os.path.basename(session_dir),
+        'geometry_source': os.path.basename(manifest['geometry']) if manifest.get('geometry') else None,
+        'recorder_status': manifest.get('status'),
+        'recorded': manifest.get('created'),
+    }
+    if out_path is None:
+        out_path = session_dir + SESSION_EXT
+    return write_session(out_path, data, geometry, meta)
+
+
+def _collect_inputs(paths):
+    """인자로 받은 파일/폴더에서 변환 대상(training_data CSV, 레코더 세션 폴더)을 모읍니다."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path) and os.path.exists(os.path.join(path, 'manifest.json')):
+            inputs.append(path)
+        elif os.path.isdir(path):
+            inputs.extend(sorted(glob.glob(os.path.join(path, '*training_data*.csv'))))
+            inputs.extend(sorted(os.path.dirname(m) for m in glob.glob(os.path.join(path, '*', 'manifest.json'))))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert training_data CSV / recorder sessions to .mags session files.')
+    parser.add_argument('paths', nargs='+', help='training_data CSV files, data folders or recorder session folders')
+    parser.add_argument('-o', '--out-dir', default=None, help='output folder (default: next to each input)')
+    args = parser.parse_args(argv)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    total_in = total_out = 0
+    for src in _collect_inputs(args.paths):
+        name = os.path.splitext(os.path.basename(src.rstrip('/\\')))[0] + SESSION_EXT
+        out_path = os.path.join(args.out_dir, name) if args.out_dir else None
+        try:
+            if os.path.isdir(src):
+                out = convert_recorder_session(src, out_path)
+                size_in = sum(os.path.getsize(p) for p in glob.glob(os.path.join(src, '*')))
+            else:
+                out = convert_csv(src, out_path)
+                size_in = os.path.getsize(src)
+        except (ValueError, TypeError, OSError, pd.errors.ParserError) as e:
+            print(f"  -> Skipped {src}: {e}")
+            continue
+        size_out = os.path.getsize(out)
+        total_in += size_in
+        total_out += size_out
+        geometry = 'with geometry' if Session(out).geometry is not None else 'no geometry'
+        print(f"[Converted] {src} -> {out}  ({size_in / 1e6:.2f} MB -> {size_out / 1e6:.2f} MB, {geometry})")
+    if total_out:
+        print(f"[Done] {total_in / 1e6:.2f} MB -> {total_out / 1e6:.2f} MB ({total_in / total_out:.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,15 +1,14 @@
-import pandas as pd
 import numpy as np
 
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import TensorDataset, DataLoader
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
 import matplotlib.pyplot as plt
 
 from models import MLP
+from memmap_dataset import read_columns, open_training_store, MemmapDataset, make_loader
 
 data_dir = './data'
 model_dir = './models'
@@ -33,30 +32,28 @@ print(f"Using device: {device}")
 
 print("Loading and preprocessing data...")
 try:
-    data = pd.read_csv(INPUT_CSV_PATH)
-    data = data[data['is_tracker'] == 1]
+    columns = read_columns(INPUT_CSV_PATH)
 except FileNotFoundError:
     print(f"Error: '{INPUT_CSV_PATH}' not found. Please run the preprocessing script first.")
     exit()
 
-exclude_cols = [col for col in data.columns if col.startswith(('tracker_pos', 'timestamp', 'tracker_rot_', 'is_tracker'))]
-X = data.drop(columns=exclude_cols)
-y = data[['tracker_pos_x', 'tracker_pos_y', 'tracker_pos_z']]
+exclude_cols = [col for col in columns if col.startswith(('tracker_pos', 'timestamp', 'tracker_rot_', 'is_tracker'))]
+feature_cols = [col for col in columns if col not in exclude_cols]
+target_cols = ['tracker_pos_x', 'tracker_pos_y', 'tracker_pos_z']
 
-X_tensor = torch.tensor(X.values, dtype=torch.float32)
-y_tensor = torch.tensor(y.values, dtype=torch.float32)
+# 처음 한 번만 CSV 를 float32 memmap 저장소로 변환하고, 이후에는 바로 엽니다.
+# is_tracker == 1 필터와 train/val 분할은 모두 행 번호 배열로만 처리 (데이터 복사 없음)
+store = open_training_store(INPUT_CSV_PATH, feature_cols, target_cols,
+                            index_filters={'is_tracker': ('is_tracker', 1)})
+dataset = MemmapDataset(store, store.index('is_tracker'))
 
-X_train, X_val, y_train, y_val = train_test_split(
-    X_tensor, y_tensor, test_size=TEST_SPLIT_RATIO, random_state=42
-)
+# 기존과 같은 random_state 로 위치 배열을 나누므로 분할 결과도 기존과 동일
+train_idx, val_idx = train_test_split(np.arange(len(dataset)), test_size=TEST_SPLIT_RATIO, random_state=42)
 
-train_dataset = TensorDataset(X_train, y_train)
-train_loader = DataLoader(dataset=train_dataset, batch_size=BATCH_SIZE, shuffle=True)
+train_loader = make_loader(dataset, train_idx, BATCH_SIZE, shuffle=True)
+val_loader = make_loader(dataset, val_idx, BATCH_SIZE, shuffle=False)
 
-val_dataset = TensorDataset(X_val, y_val)
-val_loader = DataLoader(dataset=val_dataset, batch_size=BATCH_SIZE, shuffle=False)
-
-print(f"Data loaded. Training samples: {len(X_train)}, Validation samples: {len(X_val)}")
+print(f"Data loaded. Training samples: {len(train_idx)}, Validation samples: {len(val_idx)}")
 
 
 model = MLP(input_size=INPUT_SIZE, output_size=OUTPUT_SIZE).to(device)
@@ -72,7 +69,7 @@ for epoch in range(EPOCHS):
     model.train()
     train_loss = 0.0
     for inputs, labels in train_loader:
-        inputs, labels = inputs.to(device), labels.to(device)
+        inputs, labels = inputs.to(device, non_blocking=True), labels.to(device, non_blocking=True)
         outputs = model(inputs)
         loss = criterion(outputs, labels)
         optimizer.zero_grad()
@@ -133,6 +130,7 @@ best_model = MLP(input_size=INPUT_SIZE, output_size=OUTPUT_SIZE).to(device)
 best_model.load_state_dict(torch.load(MODEL_SAVE_PATH))
 best_model.eval()
 
+X_val, y_val = dataset.tensors(val_idx)
 with torch.no_grad():
     val_predictions = best_model(X_val.to(device)).cpu()
 
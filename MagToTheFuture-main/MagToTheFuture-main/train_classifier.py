@@ -1,28 +1,28 @@
-import pandas as pd
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader, TensorDataset, random_split
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
+from torch.utils.data import random_split
 from sklearn.metrics import accuracy_score
-import joblib
 import os
 
-df = pd.read_csv('./data/processed_training_data_all.csv')
+from memmap_dataset import STORE_DIR_NAME, read_columns, open_training_store, MemmapDataset, make_loader
 
-X = df.drop(columns=['is_tracker', 'timestamp', 'tracker_rot_roll', 'tracker_rot_pitch', 'tracker_rot_yaw', 'tracker_pos_x', 'tracker_pos_y', 'tracker_pos_z'], errors='ignore')
-y = df['is_tracker']
+INPUT_CSV_PATH = './data/processed_training_data_all.csv'
 
-X_tensor = torch.tensor(X.values, dtype=torch.float32)
-y_tensor = torch.tensor(y.values, dtype=torch.float32).view(-1, 1)
+columns = read_columns(INPUT_CSV_PATH)
+drop_cols = ['is_tracker', 'timestamp', 'tracker_rot_roll', 'tracker_rot_pitch', 'tracker_rot_yaw', 'tracker_pos_x', 'tracker_pos_y', 'tracker_pos_z']
+feature_cols = [col for col in columns if col not in drop_cols]
+
+# train.py 와 같은 memmap 저장소 방식 (컬럼 구성이 달라 저장소 디렉토리는 따로 둠)
+store = open_training_store(INPUT_CSV_PATH, feature_cols, ['is_tracker'],
+                            store_dir=os.path.join(os.path.dirname(INPUT_CSV_PATH), STORE_DIR_NAME, 'presence'))
+dataset = MemmapDataset(store)
 
-dataset = TensorDataset(X_tensor, y_tensor)
 train_size = int(0.8 * len(dataset))
 val_size = len(dataset) - train_size
-train_ds, val_ds = random_split(dataset, [train_size, val_size])
+train_idx, val_idx = random_split(range(len(dataset)), [train_size, val_size])
 
-train_loader = DataLoader(train_ds, batch_size=64, shuffle=True)
-val_loader = DataLoader(val_ds, batch_size=64)
+train_loader = make_loader(dataset, train_idx.indices, 64, shuffle=True)
+val_loader = make_loader(dataset, val_idx.indices, 64, shuffle=False)
 
 class PresenceDetector(nn.Module):
     def __init__(self, input_size):
@@ -36,7 +36,7 @@ class PresenceDetector(nn.Module):
     def forward(self, x):
         return self.layers(x)
 
-model = PresenceDetector(input_size=X_tensor.shape[1])
+model = PresenceDetector(input_size=len(feature_cols))
 
 criterion = nn.BCELoss()
 optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
@@ -53,7 +53,7 @@ for epoch in range(epochs):
         optimizer.step()
         train_loss += loss.item() * xb.size(0)
     
-    train_loss /= len(train_loader.dataset)
+    train_loss /= train_size
 
     model.eval()
     val_preds = []
@@ -1,5 +1,4 @@
 import serial
-import numpy as np
 import openvr
 import pandas as pd
 from datetime import datetime
@@ -8,11 +7,15 @@ import os
 import threading
 import queue
 import msvcrt
+from frame_parser import SENSOR_INDEX, parse_sensor_lines
+from session_recorder import SessionRecorder, export_csv
+from pose_math import get_euler_angles_from_matrix, get_quaternion_from_matrix
 
 # --- 설정 ---
 ARDUINO_PORT = 'COM9' # Teensy COM port
 BAUD_RATE = 1000000
-MAX_RECORDS = 100000 # 미리 할당할 데이터 행의 최대 개수
+EXPORT_CSV_ON_EXIT = True # 종료 시 세션 세그먼트를 training_data_*.csv 로 내보냄 (processing.py 입력 형식)
+TARGET_SENSOR = 'S_71_2' # 기록할 센서 (센서 하나당 한 줄 출력 펌웨어 기준)
 
 # --- 스레드 간 데이터 공유 및 제어 ---
 data_queue = queue.Queue()
@@ -33,10 +36,13 @@ def serial_reader_optimized(ser, q, stop_event):
         try:
             if ser.in_waiting > 0:
                 buffer += ser.read(ser.in_waiting)
-                while b'\n' in buffer:
-                    line, buffer = buffer.split(b'\n', 1)
-                    if line:
-                        q.put(line.decode('utf-8', 'ignore').strip())
+                if b'\n' in buffer:
+                    *raw_lines, buffer = buffer.split(b'\n')
+                    lines = [l.decode('utf-8', 'ignore').strip() for l in raw_lines]
+                    # 쌓인 라인을 한 번에 파싱해 (센서 인덱스, xyz) 로 전달. FAIL 값은 0 으로 기록
+                    sensor_idx, values, _ = parse_sensor_lines(lines, fill_value=0.0)
+                    for idx, xyz in zip(sensor_idx.tolist(), values.tolist()):
+                        q.put((idx, xyz))
         except (serial.SerialException, TypeError):
             break
         
@@ -71,43 +77,6 @@ def get_tracker_pose():
         return pos, matrix
     return None, None
 
-def get_euler_angles_from_matrix(m):
-    """회전 행렬에서 Roll, Pitch, Yaw 오일러 각도를 계산합니다."""
-    yaw = np.degrees(np.arctan2(m[1][0], m[0][0]))
-    pitch = np.degrees(np.arctan2(-m[2][0], np.sqrt(m[2][1]**2 + m[2][2]**2)))
-    roll = np.degrees(np.arctan2(m[2][1], m[2][2]))
-    return roll, pitch, yaw
-    
-def get_quaternion_from_matrix(m):
-    """회전 행렬에서 쿼터니언(x, y, z, w)을 계산합니다."""
-    trace = m[0][0] + m[1][1] + m[2][2]
-    if trace > 0:
-        s = 0.5 / np.sqrt(trace + 1.0)
-        w = 0.25 / s
-        x = (m[2][1] - m[1][2]) * s
-        y = (m[0][2] - m[2][0]) * s
-        z = (m[1][0] - m[0][1]) * s
-    else:
-        if m[0][0] > m[1][1] and m[0][0] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[0][0] - m[1][1] - m[2][2])
-            w = (m[2][1] - m[1][2]) / s
-            x = 0.25 * s
-            y = (m[0][1] + m[1][0]) / s
-            z = (m[0][2] + m[2][0]) / s
-        elif m[1][1] > m[2][2]:
-            s = 2.0 * np.sqrt(1.0 + m[1][1] - m[0][0] - m[2][2])
-            w = (m[0][2] - m[2][0]) / s
-            x = (m[0][1] + m[1][0]) / s
-            y = 0.25 * s
-            z = (m[1][2] + m[2][1]) / s
-        else:
-            s = 2.0 * np.sqrt(1.0 + m[2][2] - m[0][0] - m[1][1])
-            w = (m[1][0] - m[0][1]) / s
-            x = (m[0][2] + m[2][0]) / s
-            y = (m[1][2] + m[2][1]) / s
-            z = 0.25 * s
-    return [x, y, z, w]
-
 def record_area_points(tracker_id, area_label, geom_data_list):
     """지정된 트래커를 사용하여 에리어의 꼭짓점 위치를 기록합니다."""
     print(f"\n>>> 트래커 {tracker_id}를 사용하여 '{area_label}'의 꼭짓점을 기록합니다.")
@@ -128,21 +97,24 @@ def record_area_points(tracker_id, area_label, geom_data_list):
             print("      - 오류: 트래커 위치를 읽을 수 없습니다. 건너뜁니다.")
     print(f"\n--- '{area_label}' 기록 완료! ---")
 
-def save_to_csv(data_array, col_order, num_records, geom_data):
-    """수집된 데이터를 CSV 파일로 저장합니다."""
+def save_session(recorder, session_stamp, geom_data):
+    """고정 좌표를 저장해 세션에 연결하고, 세션을 닫은 뒤 (설정 시) CSV 로 내보냅니다."""
     if len(geom_data) > 0:
         print("\n고정 좌표(geometry) 데이터 저장 중...")
         df_geom = pd.DataFrame(geom_data)
-        geom_filename = f"device_geometry_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        geom_filename = f"device_geometry_{session_stamp}.csv"
         df_geom.to_csv(geom_filename, index=False)
+        recorder.set_geometry(geom_filename)
         print(f"'{geom_filename}' 파일이 저장되었습니다.")
 
-    if num_records > 0:
-        print("\n실시간 수집 데이터 저장 중...")
-        df_ts = pd.DataFrame(data_array[:num_records], columns=col_order)
-        ts_filename = f"training_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        df_ts.to_csv(ts_filename, index=False)
-        print(f"'{ts_filename}' 파일에 총 {num_records}개의 시간대 데이터가 저장되었습니다.")
+    # 시계열 데이터는 수집 중에 이미 세그먼트로 기록됨 -> 마지막 세그먼트 정리 후 매니페스트 완료 처리
+    manifest_path = recorder.close()
+    print(f"\n총 {recorder.rows}개의 시간대 데이터가 세션 '{manifest_path}'에 기록되었습니다.")
+
+    if EXPORT_CSV_ON_EXIT and recorder.rows > 0:
+        ts_filename = f"training_data_{session_stamp}.csv"
+        export_csv(recorder.session_dir, ts_filename)
+        print(f"'{ts_filename}' 파일로 내보냈습니다.")
 
 # --- OpenVR 및 시리얼 포트 초기화 ---
 try:
@@ -169,8 +141,8 @@ column_order = [
     'sensor_x', 'sensor_y', 'sensor_z'
 ]
 
-time_series_data_array = np.zeros((MAX_RECORDS, len(column_order)))
-record_index = 0
+session_stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+recorder = SessionRecorder(f"session_{session_stamp}", column_order)
 
 # --- 메인 실행 로직 ---
 reader_thread = None
@@ -203,35 +175,18 @@ try:
             time.sleep(0.1)
             continue
             
-        if record_index >= MAX_RECORDS:
-            print("\n최대 기록 개수에 도달하여 수집을 중단합니다.")
-            stop_thread.set()
-            break
-        
         try:
-            line = data_queue.get_nowait()
+            sensor_idx, (sensor_x, sensor_y, sensor_z) = data_queue.get_nowait()
         except queue.Empty:
             time.sleep(0.001)
             continue
 
-        if not line.startswith("S_71_2"):
-            continue
-            
-        parts = line.split(',')
-        if len(parts) != 4: 
+        if sensor_idx != SENSOR_INDEX[TARGET_SENSOR]:
             continue
 
-        sensor_id, cx_str, cy_str, cz_str = parts
-        try:
-            sensor_x = float(cx_str)
-            sensor_y = float(cy_str)
-            sensor_z = float(cz_str)
-        except ValueError:
-            sensor_x, sensor_y, sensor_z = 0.0, 0.0, 0.0
-
         pos, matrix = get_tracker_pose()
         
-        status_line = f"데이터 수집 중... [{record_index + 1}/{MAX_RECORDS}] | 트래커: {'OK' if pos else 'N/A'}"
+        status_line = f"데이터 수집 중... [{recorder.rows + 1}] | 트래커: {'OK' if pos else 'N/A'}"
         print(status_line, end='\r')
         
         if pos:
@@ -246,8 +201,7 @@ try:
                 sensor_x, sensor_y, sensor_z
             ]
             
-            time_series_data_array[record_index] = row_data
-            record_index += 1
+            recorder.append(row_data)
     
 except KeyboardInterrupt:
     print("\n\n프로그램이 사용자에 의해 강제 중단되었습니다.")
@@ -258,7 +212,7 @@ finally:
     if input_thread:
         input_thread.join()
     
-    save_to_csv(time_series_data_array, column_order, record_index, geometry_data)
+    save_session(recorder, session_stamp, geometry_data)
     
     ser.close()
     if 'vr_system' in locals() and vr_system is not None:
@@ -1,13 +1,17 @@
 import serial
-import os
 import time
+import numpy as np
 from collections import deque
+from frame_parser import SENSOR_IDS, parse_sensor_lines
+from frame_protocol import STATUS_OK
+from grid_peaks import SensorGrid
+from replay_serial import open_serial
+from terminal_heatmap import HeatmapRenderer
 
 # --- 설정 및 변수 선언 (이전과 동일) ---
-SERIAL_PORT = 'COM9'
+SERIAL_PORT = 'COM9'  # 'replay:<training_data CSV>' 로 지정하면 녹화 세션을 재생
 BAUD_RATE = 1000000
-NUM_ROWS = 4
-NUM_COLS = 6
+REFRESH_HZ = 20  # 화면 갱신 주기 (수신과 별도 스레드)
 # ... (이하 모든 설정 및 변수 선언은 이전 코드와 동일) ...
 sensor_layout = [
     ['S_72_7', 'S_72_3', 'S_71_7', 'S_71_3', 'S_70_7', 'S_70_3'],
@@ -15,23 +19,19 @@ sensor_layout = [
     ['S_72_5', 'S_72_1', 'S_71_5', 'S_71_1', 'S_70_5', 'S_70_1'],
     ['S_72_4', 'S_72_0', 'S_71_4', 'S_71_0', 'S_70_4', 'S_70_0']
 ]
-sensor_ids_ordered = []
-for mux_addr in [0x70, 0x71, 0x72]:
-    for i in range(8):
-        sensor_ids_ordered.append(f"S_{hex(mux_addr)[2:]}_{i}")
-latest_z_values = {sensor_id: 0.0 for sensor_id in sensor_ids_ordered}
-
-def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+sensor_ids_ordered = SENSOR_IDS
+# 센서마다 마지막으로 받은 x, y, z 값과 상태 (센서 한 줄씩 들어오므로 받은 센서만 갱신)
+latest_values = np.zeros((len(sensor_ids_ordered), 3), dtype=np.float32)
+latest_status = np.full(len(sensor_ids_ordered), STATUS_OK, dtype=np.int8)
 # --------------------------------------------------
 
 # --- 시리얼 포트 연결 ---
 try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
+    ser = open_serial(SERIAL_PORT, BAUD_RATE, timeout=1)
     ser.flushInput()
     time.sleep(2) 
     print(f"성공: {SERIAL_PORT} 포트에 연결되었습니다.")
-except serial.SerialException as e:
+except (serial.SerialException, OSError) as e:
     print(f"오류: {SERIAL_PORT} 포트를 열 수 없습니다. 포트 번호를 확인하거나 다른 프로그램이 사용 중인지 확인하세요.")
     print(e)
     exit()
@@ -53,42 +53,33 @@ while True:
 # --------------------------------------------------
 
 
-# --- 메인 루프 (이전과 동일) ---
+# --- 메인 루프 ---
+# 수신 루프는 최신 값만 넘기고, 화면은 렌더러 스레드가 REFRESH_HZ 로 제자리에 다시 그림 (프레임마다 화면 지우기 없음)
+renderer = HeatmapRenderer(SensorGrid(sensor_layout, sensor_ids_ordered), title="24-Channel Real-time Sensor Values",
+                           refresh_hz=REFRESH_HZ)
+renderer.start()
 try:
     while True:
         try:
-            line = ser.readline().decode('utf-8').strip()
-            if line:
-                parts = line.split(',')
-                if len(parts) == 4 and parts[0] in sensor_ids_ordered:
-                    sensor_id, _, _, z_val = parts # Z값만 사용
-                    latest_z_values[sensor_id] = float(z_val)
+            # 한 줄씩 읽는 대신 쌓여 있는 라인을 모두 읽어 배치로 파싱
+            raw = ser.read(max(ser.in_waiting, 1)) + ser.readline()
+            lines = raw.decode('utf-8').split('\n')
+            sensor_idx, values, status = parse_sensor_lines([l.strip() for l in lines])
+            latest_values[sensor_idx] = values
+            latest_status[sensor_idx] = status
+            # 센서 한 줄이 프레임의 1/24 이므로 받은 줄 수를 프레임 단위로 환산해서 넘김
+            renderer.update(latest_values, latest_status, len(sensor_idx) / len(sensor_ids_ordered),
+                            lines=[f"업데이트 시간: {time.strftime('%Y-%m-%d %H:%M:%S')}", "종료하려면 Ctrl+C를 누르세요."])
         except (UnicodeDecodeError):
             print("데이터 수신 오류 발생. 건너뜁니다.")
             continue
         except Exception as e:
             print(f"알 수 없는 오류 발생: {e}")
             continue
-
-        clear_screen()
-        
-        print("--- 24-Channel Real-time Sensor Values (Z-axis) ---")
-        print(f"업데이트 시간: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        print("----------------------------------------------------")
-        
-        for r in range(NUM_ROWS):
-            row_str = ""
-            for c in range(NUM_COLS):
-                sensor_id = sensor_layout[r][c]
-                z_value = latest_z_values[sensor_id]
-                row_str += f"{z_value:10.2f}"
-            print(row_str)
-        
-        print("----------------------------------------------------")
-        print("종료하려면 Ctrl+C를 누르세요.")
         
 except KeyboardInterrupt:
     print("\n프로그램을 종료합니다.")
 finally:
+    renderer.stop()
     ser.close()
     print(f"{SERIAL_PORT} 포트를 닫았습니다.")
\ No newline at end of file
@@ -0,0 +1,36 @@
+import time
+import numpy as np
+
+from bench_frame_protocol import make_ascii_lines, parse_ascii_like_collection
+from frame_parser import FrameParser, TOTAL_SENSORS
+
+# --- 설정 ---
+NUM_FRAMES = 20000
+BATCH_SIZES = [1, 4, 16, 64, 256, 1024]
+
+
+def bench_parser(lines, batch_size):
+    parser = FrameParser(fill_value=0.0)
+    out = np.empty((batch_size, TOTAL_SENSORS, 3), dtype=np.float32)
+    status = np.empty((batch_size, TOTAL_SENSORS), dtype=np.int8)
+    t0 = time.perf_counter()
+    for i in range(0, len(lines), batch_size):
+        parser.parse(lines[i:i + batch_size], out=out, status_out=status)
+    return time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    values = (rng.standard_normal((NUM_FRAMES, TOTAL_SENSORS * 3)) * 200).astype(np.float32)
+    lines = make_ascii_lines(values)
+
+    t0 = time.perf_counter()
+    parse_ascii_like_collection(lines)
+    t_loop = time.perf_counter() - t0
+
+    print(f"{'parser':<24}{'us/frame':>10}{'frames/s':>12}{'speedup':>9}")
+    print(f"{'per-line loop (기존)':<24}{t_loop / NUM_FRAMES * 1e6:>10.2f}{NUM_FRAMES / t_loop:>12.0f}{1:>9.1f}")
+    for batch_size in BATCH_SIZES:
+        t = bench_parser(lines, batch_size)
+        label = f"FrameParser batch={batch_size}"
+        print(f"{label:<24}{t / NUM_FRAMES * 1e6:>10.2f}{NUM_FRAMES / t:>12.0f}{t_loop / t:>9.1f}")
@@ -0,0 +1,79 @@
+import time
+import numpy as np
+
+from frame_protocol import FRAME_SIZE, FrameDecoder, encode_frames
+
+# --- 설정 ---
+NUM_FRAMES = 20000
+BAUD_RATE = 1000000       # UART 기준 1 바이트 = 10 비트 (8N1)
+READ_SIZE = 4096          # 리더 스레드가 한 번에 읽는 바이트 수를 흉내냄
+TOTAL_SENSORS = 24
+
+sensor_ids_ordered = [f"S_{0x70 + i // 8:x}_{i % 8}" for i in range(TOTAL_SENSORS)]
+
+
+def make_ascii_lines(values):
+    """Mux.ino 의 ASCII 출력과 같은 형식의 라인을 만듭니다."""
+    lines = []
+    for row in values:
+        parts = []
+        for i, sid in enumerate(sensor_ids_ordered):
+            x, y, z = row[i * 3:i * 3 + 3]
+            parts.append(f"{sid},{x:.2f},{y:.2f},{z:.2f}")
+        lines.append(','.join(parts))
+    return lines
+
+
+def parse_ascii_like_collection(lines):
+    """DataCollection.py 의 기존 라인 단위 파싱 루프 (비교 기준)."""
+    rows = []
+    for line in lines:
+        parts = line.split(',')
+        if len(parts) != TOTAL_SENSORS * 4:
+            continue
+        temp_sensor_readings = {}
+        for i in range(0, len(parts), 4):
+            sensor_id, cx, cy, cz = parts[i:i+4]
+            try:
+                temp_sensor_readings[sensor_id] = {'x': float(cx), 'y': float(cy), 'z': float(cz)}
+            except ValueError:
+                temp_sensor_readings[sensor_id] = {'x': 0, 'y': 0, 'z': 0}
+        sensor_values = []
+        for sid in sensor_ids_ordered:
+            sensor_data = temp_sensor_readings.get(sid, {'x': 0, 'y': 0, 'z': 0})
+            sensor_values.extend([sensor_data['x'], sensor_data['y'], sensor_data['z']])
+        rows.append(sensor_values)
+    return rows
+
+
+def decode_binary_stream(stream):
+    decoder = FrameDecoder()
+    n = 0
+    for i in range(0, len(stream), READ_SIZE):
+        n += len(decoder.feed(stream[i:i + READ_SIZE]))
+    return n
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    values = (rng.standard_normal((NUM_FRAMES, TOTAL_SENSORS * 3)) * 200).astype(np.float32)
+
+    lines = make_ascii_lines(values)
+    ascii_bytes = sum(len(l) + 2 for l in lines) / NUM_FRAMES  # println 의 \r\n 포함
+    stream = encode_frames(np.arange(NUM_FRAMES), np.arange(NUM_FRAMES) * 1000, values)
+
+    t0 = time.perf_counter()
+    parse_ascii_like_collection(lines)
+    t_ascii = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    n = decode_binary_stream(stream)
+    t_bin = time.perf_counter() - t0
+    assert n == NUM_FRAMES
+
+    link_bytes_per_sec = BAUD_RATE / 10
+    print(f"{'mode':<8}{'bytes/frame':>12}{'link max fps':>14}{'host us/frame':>15}{'host fps':>12}")
+    print(f"{'ascii':<8}{ascii_bytes:>12.0f}{link_bytes_per_sec / ascii_bytes:>14.0f}"
+          f"{t_ascii / NUM_FRAMES * 1e6:>15.2f}{NUM_FRAMES / t_ascii:>12.0f}")
+    print(f"{'binary':<8}{FRAME_SIZE:>12d}{link_bytes_per_sec / FRAME_SIZE:>14.0f}"
+          f"{t_bin / NUM_FRAMES * 1e6:>15.2f}{NUM_FRAMES / t_bin:>12.0f}")
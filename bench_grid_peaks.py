@@ -0,0 +1,64 @@
+import time
+import numpy as np
+
+from frame_protocol import STATUS_OK
+from grid_peaks import SensorGrid
+from sensor_simulator import HallArraySimulator, sensor_ids, sensor_layout
+
+# --- 설정 ---
+NUM_FRAMES = 5000
+NUM_PEAKS = 3
+ARRAYS = [(3, 8), (6, 8), (12, 8)]  # (MUX 수, MUX 당 센서 수) -> 24, 48, 96 센서
+
+
+def find_strongest_sensors(sensor_z_values, num_peaks, layout):
+    """position.py 의 기존 dict 기반 피크 탐색 (비교 기준)."""
+    if not sensor_z_values:
+        return []
+    peaks = []
+    search_space = sensor_z_values.copy()
+    for _ in range(num_peaks):
+        if not search_space:
+            break
+        strongest_id = max(search_space, key=lambda k: abs(search_space[k]))
+        peaks.append(strongest_id)
+        peak_r, peak_c = -1, -1
+        for r, row_data in enumerate(layout):
+            if strongest_id in row_data:
+                peak_r, peak_c = r, row_data.index(strongest_id)
+                break
+        if peak_r != -1:
+            for r_offset in range(-1, 2):
+                for c_offset in range(-1, 2):
+                    r_idx, c_idx = peak_r + r_offset, peak_c + c_offset
+                    if 0 <= r_idx < len(layout) and 0 <= c_idx < len(layout[0]):
+                        sensor_to_remove = layout[r_idx][c_idx]
+                        if sensor_to_remove in search_space:
+                            del search_space[sensor_to_remove]
+    return peaks
+
+
+if __name__ == '__main__':
+    print(f"{'sensors':>8}{'legacy us/frame':>17}{'batch us/frame':>16}{'speedup':>9}{'match':>7}")
+    for num_muxes, per_mux in ARRAYS:
+        sim = HallArraySimulator(num_patches=NUM_PEAKS, num_muxes=num_muxes, sensors_per_mux=per_mux,
+                                 fail_rate=0.05, r_fail_rate=0.01, seed=0)
+        values, status = sim.generate(np.arange(NUM_FRAMES) * sim.frame_period(binary=False))
+        ids, layout = sensor_ids(num_muxes, per_mux), sensor_layout(num_muxes, per_mux)
+        z = values[:, 2::3]
+
+        t0 = time.perf_counter()
+        legacy = []
+        for row, st in zip(z, status):
+            readings = {sid: float(v) for sid, v, s in zip(ids, row, st) if s == STATUS_OK}
+            legacy.append(find_strongest_sensors(readings, NUM_PEAKS, layout))
+        t_legacy = time.perf_counter() - t0
+
+        grid = SensorGrid(layout, ids)
+        t0 = time.perf_counter()
+        peaks = grid.detect_peaks(z, status, NUM_PEAKS)
+        t_batch = time.perf_counter() - t0
+
+        match = all([ids[p] for p in row if p >= 0] == ref for row, ref in zip(peaks, legacy))
+        print(f"{len(ids):>8}{t_legacy / NUM_FRAMES * 1e6:>17.2f}{t_batch / NUM_FRAMES * 1e6:>16.2f}"
+              f"{t_legacy / t_batch:>9.1f}{str(match):>7}")
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+
+from frame_protocol import STATUS_OK, BINARY_MODE_COMMAND
+from frame_parser import SENSOR_IDS
+from replay_serial import open_serial
+from serial_stream import make_frame_ring, serial_reader
+
+# --- 설정 ---
+CALIBRATION_FILE = 'calibration.json'  # 세션 디렉토리에 저장하는 (드리프트까지 반영된) 보정 프로필
+PROFILE_VERSION = 1
+BASELINE_FRAMES = 200          # 시작 시 자석 없이 측정하는 프레임 수 (100 Hz 기준 2 초)
+PRESENCE_THRESHOLD_UT = 30.0   # 어느 센서든 기준선에서 이만큼 벗어나면 자석이 있는 프레임으로 봄 (잡음 ~1.5 uT)
+PRESENCE_SIGMA = 8.0           # 잡음이 큰 센서는 잡음 표준편차의 이 배수를 문턱으로 사용
+DRIFT_ALPHA = 1e-3             # 자석이 없는 프레임마다 기준선이 따라가는 비율 (100 Hz 에서 시상수 약 10 s)
+DRAIN_TIMEOUT_S = 1.0          # 기준선 측정 뒤 보정 전 프레임을 링에서 비우며 기다리는 최대 시간 (s)
+
+
+class SensorCalibration:
+    """
+    센서별 배경장 (지자기 + 센서 오프셋) 기준선과 느린 온도 드리프트 보정.
+
+    - capture(): 자석 없이 받은 프레임의 센서별 중앙값을 기준선, 표준편차를 잡음으로 사용
+      (기준선 없이 만든 객체를 리더에 먼저 넘기고 나중에 측정해도 됨. 그 전까지 apply() 는 값을 그대로 둠)
+    - apply(): 배치 (N, S, 3) 에서 기준선을 제자리 빼기 (STATUS_OK 센서만). FrameParser / serial_reader 가 호출
+    - 어느 센서도 문턱을 넘지 않은 (자석이 없는) 프레임으로만 기준선을 지수 이동 평균으로 갱신
+      -> 패치가 올라와 있는 동안에는 기준선이 고정되어 자석 신호를 흡수하지 않음
+    - save()/load(): 센서 ID 별 JSON 프로필. 다른 세션에서 불러와 시작 측정 없이 재사용
+    apply() 는 한 스레드 (시리얼 리더) 에서만 호출하고, 다른 스레드는 snapshot()/save() 로 읽기만 합니다.
+    """
+    def __init__(self, sensor_ids, baseline=None, noise=None, alpha=DRIFT_ALPHA, threshold=PRESENCE_THRESHOLD_UT,
+                 frames=0, created=None):
+        self.sensor_ids = list(sensor_ids)
+        self.alpha = float(alpha)
+        self.min_threshold = threshold
+        self.quiet_frames = 0
+        self.present_frames = 0
+        self.baseline = None  # None 이면 아직 측정 전 (apply() 가 값을 그대로 둠)
+        if baseline is not None:
+            self._set(baseline, noise, frames, created)
+
+    def _set(self, baseline, noise, frames, created=None):
+        shape = (len(self.sensor_ids), 3)
+        self.noise = np.zeros(shape, dtype=np.float32) if noise is None else \
+            np.array(noise, dtype=np.float32).reshape(shape)
+        # 센서별 존재 감지 문턱 (기준선에서 벗어난 벡터 크기, uT)
+        self.threshold = np.maximum(self.min_threshold, PRESENCE_SIGMA * np.linalg.norm(self.noise, axis=1))
+        self.frames = int(frames)
+        self.created = created or datetime.now().isoformat(timespec='seconds')
+        self.baseline = np.array(baseline, dtype=np.float32).reshape(shape)  # 마지막에 설정 (리더 스레드가 보는 시점)
+
+    def capture(self, values, status):
+        """
+        자석 없이 받은 프레임 values (N, S, 3) 또는 (N, S * 3), status (N, S) 의 센서별 중앙값을 기준선으로,
+        표준편차를 잡음으로 설정합니다. OK 값이 없는 센서의 기준선은 0. 리더 스레드가 이미 쓰는 객체에도 호출할 수 있습니다.
+        """
+        n = len(self.sensor_ids)
+        values = np.asarray(values, dtype=np.float64).reshape(len(values), n, 3)
+        ok = np.asarray(status) == STATUS_OK
+        masked = np.where(ok[..., None], values, np.nan)
+        measured = ok.any(axis=0)
+        baseline = np.zeros((n, 3))
+        noise = np.zeros((n, 3))
+        baseline[measured] = np.nanmedian(masked[:, measured], axis=0)
+        noise[measured] = np.nanstd(masked[:, measured], axis=0)
+        self._set(baseline, noise, len(values))
+        return self
+
+    @classmethod
+    def from_frames(cls, sensor_ids, values, status, **kwargs):
+        return cls(sensor_ids, **kwargs).capture(values, status)
+
+    @classmethod
+    def load(cls, path, sensor_ids=SENSOR_IDS, **kwargs):
+        """save() 한 프로필을 sensor_ids 순서로 불러옵니다. 프로필에 없는 센서의 기준선은 0."""
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        index = {sid: k for k, sid in enumerate(profile['sensor_ids'])}
+        baseline = np.zeros((len(sensor_ids), 3))
+        noise = np.zeros((len(sensor_ids), 3))
+        for k, sid in enumerate(sensor_ids):
+            if sid in index:
+                baseline[k] = profile['baseline_ut'][index[sid]]
+                noise[k] = profile['noise_ut'][index[sid]]
+        return cls(sensor_ids, baseline, noise, frames=profile.get('frames', 0), created=profile.get('created'),
+                   **kwargs)
+
+    def snapshot(self):
+        """현재 기준선 (드리프트 반영) 을 JSON 으로 쓸 수 있는 프로필 dict 로 반환합니다. 측정 전이면 None."""
+        if self.baseline is None:
+            return None
+        return {
+            'version': PROFILE_VERSION,
+            'sensor_ids': self.sensor_ids,
+            'baseline_ut': np.round(self.baseline.astype(np.float64), 3).tolist(),
+            'noise_ut': np.round(self.noise.astype(np.float64), 3).tolist(),
+            'frames': self.frames,
+            'created': self.created,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'quiet_frames': self.quiet_frames,
+            'present_frames': self.present_frames,
+        }
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        return path
+
+    def apply(self, values, status):
+        """
+        배치 values (N, S, 3) float32 에서 기준선을 제자리로 빼고 (STATUS_OK 센서만), 자석이 없는 프레임으로 드리프트를 갱신합니다.
+        반환: 프레임별 자석 존재 여부 (N,) bool
+        """
+        if self.baseline is None or not len(values):
+            return np.zeros(len(values), dtype=bool)
+        ok = status == STATUS_OK
+        np.subtract(values, self.baseline, out=values, where=ok[..., None])
+        deviation = np.sqrt(np.einsum('nsa,nsa->ns', values, values))
+        present = np.any(ok & (deviation > self.threshold), axis=1)
+        quiet = ~present
+        self.present_frames += int(present.sum())
+        self.quiet_frames += int(quiet.sum())
+        if self.alpha and quiet.any():
+            self._track_drift(values[quiet], ok[quiet])
+        return present
+
+    def _track_drift(self, residual, ok):
+        """
+        조용한 프레임의 잔차 (M, S, 3) 로 기준선 EMA 를 배치 한 번에 갱신합니다.
+        프레임마다 b += alpha * (x - b) 를 순서대로 적용한 것과 같고, OK 가 아닌 센서 값은 건너뜁니다.
+        """
+        decay = 1.0 - self.alpha
+        # 각 프레임 뒤에 같은 센서의 유효 프레임이 몇 개 남았는지 -> 그 프레임 기여분이 감쇠되는 횟수
+        later = np.cumsum(ok[::-1], axis=0)[::-1] - ok
+        weight = np.where(ok, self.alpha * decay ** later, 0.0)            # (M, S)
+        # 잔차는 기존 기준선 기준이므로 갱신량 = sum(w * 잔차)
+        residual = np.where(ok[..., None], residual, 0.0)                 # FAIL 센서 값 (NaN/0) 제외
+        self.baseline = self.baseline + np.einsum('ms,msa->sa', weight, residual).astype(np.float32)
+
+
+def capture_from_ring(ring, calibration, num_frames=BASELINE_FRAMES, timeout=10.0):
+    """
+    시리얼 리더 링 버퍼에서 프레임 num_frames 개를 모아 calibration 의 기준선을 측정합니다. (모인 프레임은 수집에 쓰지 않음)
+    timeout 안에 다 모이지 않으면 그때까지 받은 프레임으로 만들고, 하나도 없으면 측정하지 않고 False.
+    측정 뒤에는 기준선 설정 전에 리더가 읽어 원시값 그대로 링에 들어간 프레임을 버리므로, 반환 뒤 링에서 읽는
+    프레임은 모두 보정된 값입니다.
+    """
+    values, status = [], []
+    count = 0
+    deadline = time.perf_counter() + timeout
+    while count < num_frames and time.perf_counter() < deadline:
+        frames = ring.read(timeout=0.1)
+        if len(frames):
+            values.append(frames['values'])
+            status.append(frames['status'])
+            count += len(frames)
+    if not count:
+        return False
+    calibration.capture(np.concatenate(values)[:num_frames], np.concatenate(status)[:num_frames])
+    # 리더는 수신 시각 (host_time) 을 찍은 뒤에 보정하므로, 설정 시각 뒤에 수신된 배치가 보일 때까지 링을 비움
+    applied = time.time()
+    deadline = time.perf_counter() + DRAIN_TIMEOUT_S
+    while time.perf_counter() < deadline:
+        frames = ring.read(timeout=0.1)
+        if len(frames) and frames['host_time'][-1] > applied:
+            break
+    return True
+
+
+def open_calibration(source, sensor_ids=SENSOR_IDS):
+    """
+    수집/실시간 스크립트의 CALIBRATION 설정 해석: None -> 보정 없음, 'capture' -> 빈 보정 (리더 시작 후
+    capture_from_ring() 으로 측정), 그 밖의 문자열 -> 저장된 프로필 경로.
+    """
+    if not source:
+        return None
+    if source == 'capture':
+        return SensorCalibration(sensor_ids)
+    return SensorCalibration.load(source, sensor_ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture a no-magnet background baseline and save it as a calibration profile.")
+    parser.add_argument('port', help="serial port, 'replay:<session>' or 'sim:?patches=0'")
+    parser.add_argument('--out', default=CALIBRATION_FILE)
+    parser.add_argument('--frames', type=int, default=BASELINE_FRAMES)
+    parser.add_argument('--mode', default='binary', choices=('ascii', 'binary'))
+    parser.add_argument('--baud', type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    ser = open_serial(args.port, args.baud, timeout=1)
+    while ser.readline().decode('utf-8', 'ignore').strip() != 'START':
+        pass
+    if args.mode == 'binary':
+        ser.write(BINARY_MODE_COMMAND)
+    ring = make_frame_ring()
+    stop = threading.Event()
+    reader = threading.Thread(target=serial_reader, args=(ser, ring, stop, args.mode))
+    reader.start()
+    calibration = SensorCalibration(SENSOR_IDS)
+    try:
+        captured = capture_from_ring(ring, calibration, args.frames)
+    finally:
+        stop.set()
+        reader.join()
+        ser.close()
+    if not captured:
+        print("No frames received.")
+        return
+
+    noise = np.linalg.norm(calibration.noise, axis=1)
+    print(f"{calibration.frames} frames, baseline |B| {np.linalg.norm(calibration.baseline, axis=1).mean():.1f} uT "
+          f"(mean over sensors), noise {noise.mean():.2f} uT (max {noise.max():.2f} uT)")
+    if noise.max() > PRESENCE_THRESHOLD_UT:
+        print("Warning: some sensors varied more than the presence threshold - was a magnet near the array?")
+    print(f"Saved to {calibration.save(args.out)}")
+
+
+if __name__ == '__main__':
+    main()
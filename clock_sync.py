@@ -0,0 +1,208 @@
+import time
+import argparse
+import threading
+from collections import deque
+import numpy as np
+
+from frame_protocol import BINARY_MODE_COMMAND, ASCII_CLOCK_COMMAND
+from replay_serial import open_serial
+from serial_stream import make_frame_ring, serial_reader
+
+# --- 설정 ---
+COUNTER_WRAP = 1 << 32    # 펌웨어 micros() 는 uint32 -> 약 71.6 분마다 0 으로 돌아감
+MIN_FIT_SPAN = 1.0        # 드리프트(기울기) 추정을 시작하는 최소 장치 시간 구간 (s). 그 전에는 드리프트 0 으로 봄
+ENVELOPE_WINDOW = 256     # 오프셋 하한(최소 지연) 추정에 쓰는 최근 수신 배치 수
+MONITOR_SECONDS = 10.0
+
+
+def unwrap_counter(raw, last=None, wraps=0, modulus=COUNTER_WRAP):
+    """
+    uint32 카운터 (N,) 를 단조 증가하는 int64 로 풉니다. (값이 줄어든 지점을 랩어라운드로 봄)
+    last: 직전 배치의 마지막 원시 값, wraps: 지금까지의 랩 수. 반환: (풀린 값, 누적 랩 수)
+    """
+    raw = np.asarray(raw, dtype=np.int64)
+    if not len(raw):
+        return raw, wraps
+    prev = np.concatenate([[raw[0] if last is None else last], raw[:-1]])
+    count = wraps + np.cumsum(raw < prev)
+    return raw + count * modulus, int(count[-1])
+
+
+class ClockSync:
+    """
+    프레임의 장치 시각(Teensy micros)을 호스트 시각(time.time())으로 바꾸는 온라인 클럭 동기화.
+
+    - 시리얼 리더는 read() 한 번에 받은 프레임 전체에 같은 host_time 을 찍으므로, 수신 배치마다
+      마지막 프레임(수신 직후라 큐/버퍼 지연이 가장 작음)의 (장치 시각, host_time) 한 점만 회귀에 사용
+    - host = offset + rate * device 를 누적 최소제곱으로 추정 (배치당 O(1), rate - 1 이 수정 발진자 드리프트)
+    - 수신 지연은 항상 양수이므로 최근 ENVELOPE_WINDOW 점의 잔차 최솟값만큼 오프셋을 내려 하한 포락선에 맞춤
+      -> 변환된 시각 = 센서 스캔 시작 시각 + 최소 전송 지연 (큐 지연과 배치 단위 타임스탬프의 지터가 빠짐)
+    - seq 간격으로 누락 프레임, 장치 프레임 간격으로 샘플링 주기 지터, 포락선 위 잔차로 수신 지연을 집계
+    - seq 가 줄어들면 (Teensy 재시작) 회귀를 처음부터 다시 시작
+    타임스탬프가 없는 프레임 (seq = -1, 예전 ASCII 펌웨어) 은 host_time 을 그대로 씁니다.
+    """
+    def __init__(self, window=ENVELOPE_WINDOW):
+        self.window = window
+        self.frames = 0
+        self.untimed = 0
+        self.dropped = 0      # seq 간격으로 추정한 누락 프레임 수
+        self.gaps = 0         # 누락이 발생한 구간 수
+        self.resets = 0
+        self._intervals = np.array([0.0, 0.0, 0.0, np.inf, 0.0])  # 개수, 합, 제곱합, 최소, 최대 (s)
+        self._latency = np.array([0.0, 0.0, 0.0, 0.0])            # 개수, 합, 제곱합, 최대 (s)
+        self._last_aligned = -np.inf
+        self._start_stream()
+
+    def _start_stream(self):
+        self._last_seq = None
+        self._last_micros = None
+        self._prev_device = None
+        self._wraps = 0
+        self._origin = None   # (첫 프레임 micros 풀린 값, 첫 배치 host_time): 회귀 좌표를 작게 유지
+        self._sums = np.zeros(5)  # n, sx, sy, sxx, sxy
+        self._points = deque(maxlen=self.window)
+        self.rate = 1.0
+        self.intercept = 0.0
+        self.lower = 0.0
+
+    def update(self, frames):
+        """serial_stream.FRAME_ROW_DTYPE 배치 (N,) 의 정렬된 시각 (N,) float64 를 반환합니다. (메인 루프 전용)"""
+        host = frames['host_time'].astype(np.float64)
+        aligned = host.copy()
+        self.frames += len(frames)
+        timed = np.flatnonzero(frames['seq'] >= 0)
+        self.untimed += len(frames) - len(timed)
+        if not len(timed):
+            return aligned
+
+        seq = frames['seq'][timed]
+        # Teensy 재시작으로 seq 가 줄어든 지점마다 구간을 나눠 처리
+        last = seq[0] if self._last_seq is None else self._last_seq
+        resets = np.flatnonzero(np.diff(np.concatenate([[last], seq])) < 0)
+        bounds = np.concatenate([[0], resets, [len(seq)]])
+        for k in range(len(bounds) - 1):
+            if k:
+                self.resets += 1
+                self._start_stream()
+            idx = timed[bounds[k]:bounds[k + 1]]
+            if len(idx):
+                aligned[idx] = self._align(frames['seq'][idx], frames['micros'][idx], host[idx])
+
+        # 변환 시각은 수신 시각보다 늦을 수 없고, 회귀가 갱신되어도 뒤로 가지 않게 유지 (pose_sampler.join 은 단조 증가 시각을 가정)
+        aligned = np.maximum.accumulate(np.maximum(np.minimum(aligned, host), self._last_aligned))
+        self._last_aligned = aligned[-1]
+        return aligned
+
+    def _align(self, seq, micros, host):
+        micros, self._wraps = unwrap_counter(micros, self._last_micros, self._wraps)
+        if self._origin is None:
+            self._origin = (int(micros[0]), float(host[0]))
+        device = (micros - self._origin[0]) * 1e-6
+        y = host - self._origin[1]
+
+        # seq 간격 -> 누락, 연속 프레임 간격 -> 샘플링 주기 통계
+        first = self._last_seq is None
+        step = np.diff(np.concatenate([[seq[0] if first else self._last_seq], seq]))
+        self.dropped += int(np.sum(step[step > 1] - 1))
+        self.gaps += int(np.count_nonzero(step > 1))
+        dt = np.diff(np.concatenate([[device[0] if first else self._prev_device], device]))[step == 1]
+        if len(dt):
+            self._intervals += [len(dt), dt.sum(), np.dot(dt, dt), 0.0, 0.0]
+            self._intervals[3] = min(self._intervals[3], dt.min())
+            self._intervals[4] = max(self._intervals[4], dt.max())
+        self._last_seq = int(seq[-1])
+        self._last_micros = int(micros[-1] % COUNTER_WRAP)
+        self._prev_device = device[-1]
+
+        # 수신 배치마다 마지막 프레임 한 점으로 회귀 갱신
+        ends = np.append(np.flatnonzero(host[1:] != host[:-1]), len(host) - 1)
+        x, yy = device[ends], y[ends]
+        self._sums += [len(x), x.sum(), yy.sum(), np.dot(x, x), np.dot(x, yy)]
+        self._points.extend(zip(x.tolist(), yy.tolist()))
+        self._fit()
+
+        residual = yy - (self.intercept + self.lower + self.rate * x)
+        self._latency += [len(residual), residual.sum(), np.dot(residual, residual), 0.0]
+        self._latency[3] = max(self._latency[3], residual.max())
+        return self._origin[1] + self.intercept + self.lower + self.rate * device
+
+    def _fit(self):
+        n, sx, sy, sxx, sxy = self._sums
+        points = np.array(self._points)
+        var = sxx - sx * sx / n
+        if n >= 2 and points[-1, 0] >= MIN_FIT_SPAN and var > 0:
+            self.rate = (sxy - sx * sy / n) / var
+        else:
+            self.rate = 1.0
+        self.intercept = (sy - self.rate * sx) / n
+        self.lower = float(np.min(points[:, 1] - self.intercept - self.rate * points[:, 0]))
+
+    def stats(self):
+        """세션 단위 통계: 누락 프레임, 드리프트(ppm), 장치 프레임 간격/지터(us), 최소 지연 대비 수신 지연(ms)."""
+        n, total, sq, lo, hi = self._intervals.tolist()
+        mean = total / n if n else 0.0
+        lat_n, lat_sum, lat_sq, lat_max = self._latency.tolist()
+        lat_mean = lat_sum / lat_n if lat_n else 0.0
+        offset = (self._origin[1] + self.intercept + self.lower - self._origin[0] * 1e-6) if self._origin else None
+        return {
+            'frames': self.frames, 'untimed': self.untimed,
+            'dropped': self.dropped, 'gaps': self.gaps, 'resets': self.resets,
+            'drift_ppm': round((float(self.rate) - 1.0) * 1e6, 2),
+            'offset_s': None if offset is None else float(offset),
+            'rate_hz': round(1.0 / mean, 2) if mean else None,
+            'interval_mean_us': round(mean * 1e6, 1),
+            'interval_jitter_us': round(max(sq / n - mean * mean, 0.0) ** 0.5 * 1e6, 1) if n else 0.0,
+            'interval_min_us': round(lo * 1e6, 1) if n else None,
+            'interval_max_us': round(hi * 1e6, 1) if n else None,
+            'latency_mean_ms': round(lat_mean * 1e3, 3),
+            'latency_jitter_ms': round(max(lat_sq / lat_n - lat_mean ** 2, 0.0) ** 0.5 * 1e3, 3) if lat_n else 0.0,
+            'latency_max_ms': round(lat_max * 1e3, 3),
+        }
+
+
+def start_clock_stream(ser, frame_mode):
+    """Teensy 에 장치 시각이 붙는 출력 모드를 요청합니다. (바이너리: 프레임에 항상 포함, ASCII: 'T' 타임스탬프 모드)"""
+    ser.write(BINARY_MODE_COMMAND if frame_mode == 'binary' else ASCII_CLOCK_COMMAND)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Teensy clock drift, dropped frames and timing jitter.")
+    parser.add_argument('port', help="serial port or 'replay:<session>[?speed=..&mode=..]'")
+    parser.add_argument('--mode', default='binary', choices=('ascii', 'binary'))
+    parser.add_argument('--seconds', type=float, default=MONITOR_SECONDS)
+    parser.add_argument('--baud', type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    ser = open_serial(args.port, args.baud, timeout=1)
+    while ser.readline().decode('utf-8', 'ignore').strip() != 'START':
+        pass
+    start_clock_stream(ser, args.mode)
+    ring = make_frame_ring()
+    stop = threading.Event()
+    reader = threading.Thread(target=serial_reader, args=(ser, ring, stop, args.mode))
+    reader.start()
+
+    clock = ClockSync()
+    spread = []
+    deadline = time.perf_counter() + args.seconds
+    try:
+        while time.perf_counter() < deadline:
+            frames = ring.read(timeout=0.1)
+            if len(frames):
+                spread.append(np.abs(clock.update(frames) - frames['host_time']))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        reader.join()
+        ser.close()
+
+    for key, value in clock.stats().items():
+        print(f"{key:>20}: {value}")
+    if spread:
+        shift = np.concatenate(spread) * 1e3
+        print(f"{'host_time shift_ms':>20}: median {np.median(shift):.3f}, p99 {np.percentile(shift, 99):.3f}")
+
+
+if __name__ == '__main__':
+    main()
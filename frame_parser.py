@@ -0,0 +1,217 @@
+import io
+import numpy as np
+
+from frame_protocol import STATUS_OK, STATUS_FAIL, STATUS_R_FAIL, ASCII_CLOCK_PREFIX
+
+# --- 센서 ID 정의 (Mux.ino 출력 순서: MUX 0x70~0x72, 채널 0~7) ---
+TOTAL_SENSORS = 24
+SENSOR_IDS = [f"S_{0x70 + i // 8:x}_{i % 8}" for i in range(TOTAL_SENSORS)]
+SENSOR_INDEX = {sid: i for i, sid in enumerate(SENSOR_IDS)}
+SENSOR_COLUMN_NAMES = [f'{sid}_{axis}' for sid in SENSOR_IDS for axis in 'xyz']
+
+# 이 개수 이하의 배치는 np.loadtxt 호출 오버헤드보다 split 경로가 빠름
+# (작은 배치에서 순서가 다른 펌웨어 출력은 라인별 경로로 처리)
+SMALL_BATCH = 8
+
+
+def _encode_failures(text):
+    """FAIL/R_FAIL 토큰을 숫자로 파싱 가능한 센티널(+inf/-inf)로 치환합니다."""
+    return text.replace('R_FAIL', '-inf').replace('FAIL', 'inf')
+
+
+def _split_clock(lines):
+    """
+    Mux.ino 타임스탬프 모드의 "#seq,micros," 접두사를 떼어 (본문 라인 목록, (N, 2) int64 [seq, micros]) 로 나눕니다.
+    접두사가 하나도 없으면 (lines, None). 접두사가 없는 라인의 seq/micros 는 -1, 접두사가 깨진 라인은 본문을 비워 버림.
+    """
+    if not any(l.startswith(ASCII_CLOCK_PREFIX) for l in lines):
+        return lines, None
+    bodies = []
+    clock = np.full((len(lines), 2), -1, dtype=np.int64)
+    for i, line in enumerate(lines):
+        if not line.startswith(ASCII_CLOCK_PREFIX):
+            bodies.append(line)
+            continue
+        parts = line[1:].split(',', 2)
+        try:
+            clock[i] = int(parts[0]), int(parts[1])
+            bodies.append(parts[2])
+        except (ValueError, IndexError):
+            bodies.append('')
+    return bodies, clock
+
+
+class FrameParser:
+    """
+    "S_70_0,x,y,z,S_70_1,..." 형식의 ASCII 프레임 라인을 배치 단위로 파싱합니다.
+
+    - 결과는 (N, 센서 수, 3) float32 값 배열과 (N, 센서 수) int8 상태 배열
+      (STATUS_OK / STATUS_FAIL / STATUS_R_FAIL, frame_protocol 과 동일한 코드)
+    - FAIL/R_FAIL 센서의 값은 fill_value (기본 NaN) 로 채움
+    - 프레임마다 dict 를 만들지 않고, 센서 ID -> 열 인덱스 맵으로 한 번에 배치
+    - calibration (calibration.SensorCalibration, 같은 센서 순서) 을 주면 배치마다 배경 기준선을 빼서 반환
+    """
+    def __init__(self, sensor_ids=SENSOR_IDS, fill_value=np.nan, calibration=None):
+        self.sensor_ids = list(sensor_ids)
+        self.calibration = calibration
+        self.sensor_index = {sid: i for i, sid in enumerate(self.sensor_ids)}
+        self.num_sensors = len(self.sensor_ids)
+        self.fill_value = fill_value
+        self._num_commas = self.num_sensors * 4 - 1
+        self._value_cols = [i for i in range(self.num_sensors * 4) if i % 4]
+        self.frames_parsed = 0
+        self.lines_rejected = 0
+        self._kept = None  # _parse_per_line 이 남긴 라인 인덱스 (접두사 정렬용)
+
+    def parse(self, lines, out=None, status_out=None):
+        """
+        라인 목록을 파싱합니다. 길이가 맞지 않거나 숫자가 깨진 라인은 건너뛰고 lines_rejected 에 집계합니다.
+        out/status_out 을 주면 해당 배열의 앞부분에 결과를 채우고 그 뷰를 반환합니다.
+        타임스탬프 접두사("#seq,micros,")가 붙은 라인도 받으며, 접두사 값이 필요하면 parse_timed() 를 사용합니다.
+        """
+        values, status, _ = self._parse(lines, out, status_out)
+        return values, status
+
+    def parse_timed(self, lines, out=None, status_out=None):
+        """parse() 와 같고, 파싱된 프레임마다의 장치 seq, micros (N,) int64 를 함께 반환합니다. (접두사 없는 라인은 -1)"""
+        values, status, clock = self._parse(lines, out, status_out)
+        if clock is None:
+            clock = np.full((len(values), 2), -1, dtype=np.int64)
+        return values, status, clock[:, 0], clock[:, 1]
+
+    def _parse(self, lines, out, status_out):
+        bodies, clock = _split_clock(lines)
+        if clock is None:
+            good = [l for l in bodies if l.startswith('S_') and l.count(',') == self._num_commas]
+        else:
+            kept = [i for i, l in enumerate(bodies) if l.startswith('S_') and l.count(',') == self._num_commas]
+            good = [bodies[i] for i in kept]
+        if out is None:
+            out = np.empty((len(good), self.num_sensors, 3), dtype=np.float32)
+        if status_out is None:
+            status_out = np.empty((len(good), self.num_sensors), dtype=np.int8)
+
+        self._kept = None
+        n, has_failures = self._parse_into(good, out) if good else (0, False)
+        self.lines_rejected += len(lines) - n
+        self.frames_parsed += n
+        values, status = out[:n], status_out[:n]
+        if clock is not None:
+            kept = np.asarray(kept, dtype=np.int64)
+            # 라인별 경로에서 버린 라인이 있으면 남은 라인의 접두사만 고름
+            clock = clock[kept if self._kept is None else kept[self._kept]]
+
+        status[:] = STATUS_OK
+        if has_failures:
+            status[np.isposinf(values[:, :, 0])] = STATUS_FAIL
+            status[np.isneginf(values[:, :, 0])] = STATUS_R_FAIL
+            values[status != STATUS_OK] = self.fill_value
+        if self.calibration is not None:
+            self.calibration.apply(values, status)
+        return values, status, clock
+
+    def _parse_into(self, lines, values):
+        """
+        values 앞부분에 순서대로 채웁니다.
+        반환: (채운 프레임 수, FAIL/R_FAIL 토큰 포함 여부)
+        """
+        n = len(lines)
+        text = '\n'.join(lines)
+        has_failures = 'FAIL' in text
+        if has_failures:
+            text = _encode_failures(text)
+
+        if n <= SMALL_BATCH:
+            # 작은 배치: 한 번의 split 으로 ID 검사와 값 추출을 같이 처리
+            tokens = text.replace('\n', ',').split(',')
+            ids = tokens[0::4]
+            if ids != self.sensor_ids * n:
+                return self._parse_per_line(lines, values), True
+            del tokens[0::4]
+            try:
+                parsed = np.array(tokens, dtype=np.float32)
+            except ValueError:
+                return self._parse_per_line(lines, values), True
+            values[:n] = parsed.reshape(n, self.num_sensors, 3)
+            return n, has_failures
+
+        first_ids = lines[0].split(',', self._num_commas)[0::4]
+        last_ids = lines[-1].split(',', self._num_commas)[0::4]
+        if first_ids == self.sensor_ids and last_ids == self.sensor_ids:
+            order = None
+        elif first_ids == last_ids and sorted(first_ids) == sorted(self.sensor_ids):
+            # 펌웨어 출력 순서가 다른 경우: 미리 계산한 ID -> 열 인덱스 맵으로 재배열
+            order = [self.sensor_index[sid] for sid in first_ids]
+        else:
+            return self._parse_per_line(lines, values), True
+
+        try:
+            parsed = np.loadtxt(io.StringIO(text), delimiter=',', usecols=self._value_cols,
+                                dtype=np.float32, ndmin=2)
+        except ValueError:
+            return self._parse_per_line(lines, values), True
+
+        parsed = parsed.reshape(n, self.num_sensors, 3)
+        if order is None:
+            values[:n] = parsed
+        else:
+            values[:n, order] = parsed
+        return n, has_failures
+
+    def _parse_per_line(self, lines, values):
+        """깨진 라인이 섞인 배치를 위한 느린 경로: 라인별로 ID 를 매핑하고 실패한 라인만 버립니다."""
+        k = 0
+        kept = []
+        for i, line in enumerate(lines):
+            tokens = _encode_failures(line).split(',')
+            cols = [self.sensor_index.get(sid, -1) for sid in tokens[0::4]]
+            del tokens[0::4]
+            if -1 in cols or len(set(cols)) != self.num_sensors:
+                continue
+            try:
+                row = np.array(tokens, dtype=np.float32).reshape(self.num_sensors, 3)
+            except ValueError:
+                continue
+            values[k, cols] = row
+            kept.append(i)
+            k += 1
+        self._kept = kept
+        return k
+
+
+def parse_frames(lines, sensor_ids=SENSOR_IDS, fill_value=np.nan):
+    """한 번 쓰고 버리는 용도의 편의 함수. (values, status) 를 반환합니다."""
+    return FrameParser(sensor_ids, fill_value).parse(lines)
+
+
+def parse_sensor_lines(lines, sensor_ids=SENSOR_IDS, fill_value=np.nan):
+    """
+    센서 하나당 한 줄("S_71_2,x,y,z")로 출력하는 예전 펌웨어 형식을 배치로 파싱합니다.
+    반환: (sensor_idx (M,) int, values (M, 3) float32, status (M,) int8)
+    알 수 없는 ID 나 형식이 맞지 않는 라인은 제외됩니다.
+    """
+    sensor_index = {sid: i for i, sid in enumerate(sensor_ids)}
+    good = [l for l in lines if l.startswith('S_') and l.count(',') == 3]
+    tokens = _encode_failures(','.join(good)).split(',') if good else []
+    idx = np.array([sensor_index.get(sid, -1) for sid in tokens[0::4]], dtype=np.int64)
+    del tokens[0::4]
+    try:
+        values = np.array(tokens, dtype=np.float32).reshape(-1, 3)
+    except ValueError:
+        rows = []
+        for t in zip(tokens[0::3], tokens[1::3], tokens[2::3]):
+            try:
+                rows.append([float(v) for v in t])
+            except ValueError:
+                rows.append([np.nan] * 3)
+                idx[len(rows) - 1] = -1
+        values = np.array(rows, dtype=np.float32).reshape(-1, 3)
+
+    keep = idx >= 0
+    idx, values = idx[keep], values[keep]
+    status = np.full(len(idx), STATUS_OK, dtype=np.int8)
+    status[np.isposinf(values[:, 0])] = STATUS_FAIL
+    status[np.isneginf(values[:, 0])] = STATUS_R_FAIL
+    values[status != STATUS_OK] = fill_value
+    return idx, values, status
+
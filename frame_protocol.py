@@ -0,0 +1,200 @@
+import numpy as np
+
+# --- 바이너리 프레임 프로토콜 (Arduino/Mux/Mux.ino 의 BinaryFrame 구조체와 1:1 대응) ---
+# [sync u16][seq u32][micros u32][fail_mask u32][r_fail_mask u32][values f32 x 72][crc u16]
+# 모든 필드는 little-endian (Teensy 4.x 기본 바이트 순서)
+TOTAL_SENSORS = 24
+VALUES_PER_FRAME = TOTAL_SENSORS * 3
+SYNC_WORD = 0x5AA5
+SYNC_BYTES = bytes([SYNC_WORD & 0xFF, SYNC_WORD >> 8])  # b'\xa5\x5a'
+
+# 호스트 -> Teensy 출력 모드 전환 명령 (한 글자)
+BINARY_MODE_COMMAND = b'B'
+ASCII_MODE_COMMAND = b'A'
+ASCII_CLOCK_COMMAND = b'T'  # ASCII 라인 앞에 "#seq,micros," 를 붙임 (바이너리 프레임의 seq/micros 와 같은 값)
+ASCII_CLOCK_PREFIX = '#'
+
+# 센서 상태 코드 (fail/r_fail 비트마스크를 센서별로 풀어낸 값)
+STATUS_OK = 0
+STATUS_FAIL = 1     # 센서 미연결 (ASCII 의 "FAIL")
+STATUS_R_FAIL = 2   # 읽기 실패 (ASCII 의 "R_FAIL")
+
+FRAME_DTYPE = np.dtype([
+    ('sync', '<u2'),
+    ('seq', '<u4'),
+    ('micros', '<u4'),
+    ('fail_mask', '<u4'),
+    ('r_fail_mask', '<u4'),
+    ('values', '<f4', (VALUES_PER_FRAME,)),
+    ('crc', '<u2'),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize  # 308 바이트 (ASCII 모드는 약 900 바이트)
+
+
+def _build_crc16_table():
+    """CRC-16/CCITT-FALSE (poly 0x1021) 바이트 단위 룩업 테이블을 생성합니다."""
+    table = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xFFFF
+    return table
+
+_CRC16_TABLE = _build_crc16_table()
+
+
+def crc16_ccitt(data, crc=0xFFFF):
+    """단일 바이트열의 CRC-16/CCITT-FALSE 값을 계산합니다. (펌웨어와 동일한 알고리즘)"""
+    for b in bytes(data):
+        crc = ((crc << 8) & 0xFFFF) ^ int(_CRC16_TABLE[((crc >> 8) ^ b) & 0xFF])
+    return crc
+
+
+_CRC16_POSITION_TABLES = {}
+
+
+def _crc16_position_table(length):
+    """
+    고정 길이 메시지용 위치별 CRC 기여도 테이블 (length, 256) 과 초기값 기여도를 반환합니다.
+    CRC-16/CCITT-FALSE 는 GF(2) 위에서 선형이므로
+    crc(msg) = crc(0xFFFF, 0...0) ^ XOR_j T[j][msg[j]] 가 성립합니다.
+    """
+    if length not in _CRC16_POSITION_TABLES:
+        table = np.empty((length, 256), dtype=np.uint16)
+        table[length - 1] = _CRC16_TABLE
+        for j in range(length - 2, -1, -1):
+            prev = table[j + 1]
+            # 0 바이트 하나를 더 통과시킨 효과
+            table[j] = (prev << 8) ^ _CRC16_TABLE[prev >> 8]
+        _CRC16_POSITION_TABLES[length] = (table, crc16_ccitt(bytes(length)))
+    return _CRC16_POSITION_TABLES[length]
+
+
+def crc16_ccitt_batch(rows):
+    """
+    (N, L) uint8 배열의 각 행에 대해 CRC를 한 번에 계산합니다.
+    위치별 룩업 + XOR 리덕션만 사용하므로 프레임 수와 무관하게 파이썬 루프가 없습니다.
+    """
+    table, init = _crc16_position_table(rows.shape[1])
+    contrib = table[np.arange(rows.shape[1]), rows]
+    return np.bitwise_xor.reduce(contrib, axis=1) ^ np.uint16(init)
+
+
+def _find_sync(data, start):
+    """data[start:] 에서 첫 sync 워드의 위치를 찾습니다. 없으면 -1."""
+    if len(data) - start < 2:
+        return -1
+    window = data[start:]
+    hits = np.flatnonzero((window[:-1] == SYNC_BYTES[0]) & (window[1:] == SYNC_BYTES[1]))
+    return start + int(hits[0]) if hits.size else -1
+
+
+def decode_frames(buf):
+    """
+    바이트 버퍼에서 완전한 바이너리 프레임을 모두 디코딩합니다.
+
+    정렬된 구간은 np.frombuffer 로 복사 없이 구조화 배열 뷰를 만들고,
+    sync 불일치(바이트 유실) 구간에서만 다음 sync 워드를 찾아 재동기화합니다.
+    반환: (frames, consumed, crc_errors)
+      - frames: FRAME_DTYPE 구조화 배열 (CRC 검증 통과분)
+      - consumed: 처리한 바이트 수 (buf[consumed:] 는 다음 read 와 이어 붙여야 함)
+      - crc_errors: CRC 불일치로 버린 프레임 수
+    """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    chunks = []
+    crc_errors = 0
+    pos = 0
+
+    while True:
+        start = _find_sync(data, pos)
+        if start < 0:
+            # 마지막 바이트가 sync 의 앞부분일 수 있으므로 남겨둔다
+            pos = len(data) - 1 if len(data) and data[-1] == SYNC_BYTES[0] else len(data)
+            break
+
+        n = (len(data) - start) // FRAME_SIZE
+        if n == 0:
+            pos = start
+            break
+
+        block = data[start:start + n * FRAME_SIZE].reshape(n, FRAME_SIZE)
+        sync_ok = (block[:, 0] == SYNC_BYTES[0]) & (block[:, 1] == SYNC_BYTES[1])
+        run = n if sync_ok.all() else int(np.argmin(sync_ok))
+
+        frames = np.frombuffer(buf, dtype=FRAME_DTYPE, count=run, offset=start)
+        crc_ok = crc16_ccitt_batch(block[:run, 2:-2]) == frames['crc']
+        if not crc_ok[0]:
+            # 페이로드 안에 우연히 나타난 sync 패턴일 수 있음 -> 1바이트 밀어서 다시 탐색
+            crc_errors += 1
+            pos = start + 1
+            continue
+
+        if crc_ok.all():
+            chunks.append(frames)
+        else:
+            crc_errors += int(run - crc_ok.sum())
+            chunks.append(frames[crc_ok])
+
+        pos = start + run * FRAME_SIZE
+        if run == n:
+            break
+
+    if not chunks:
+        frames = np.empty(0, dtype=FRAME_DTYPE)
+    elif len(chunks) == 1:
+        frames = chunks[0]
+    else:
+        frames = np.concatenate(chunks)
+    return frames, pos, crc_errors
+
+
+def encode_frames(seq, micros, values, fail_mask=0, r_fail_mask=0):
+    """
+    (N, 72) 센서 값 배열을 펌웨어와 동일한 바이너리 프레임 바이트열로 인코딩합니다.
+    재생/시뮬레이션/벤치마크용이며, 스칼라 인자는 모든 프레임에 브로드캐스트됩니다.
+    """
+    values = np.asarray(values, dtype=np.float32).reshape(-1, VALUES_PER_FRAME)
+    frames = np.zeros(len(values), dtype=FRAME_DTYPE)
+    frames['sync'] = SYNC_WORD
+    frames['seq'] = seq
+    frames['micros'] = micros
+    frames['fail_mask'] = fail_mask
+    frames['r_fail_mask'] = r_fail_mask
+    frames['values'] = values
+    raw = frames.view(np.uint8).reshape(len(frames), FRAME_SIZE)
+    frames['crc'] = crc16_ccitt_batch(raw[:, 2:-2])
+    return frames.tobytes()
+
+
+def frame_status(frames):
+    """fail/r_fail 비트마스크를 (N, 24) int8 상태 코드 배열로 풀어냅니다."""
+    bits = np.uint32(1) << np.arange(TOTAL_SENSORS, dtype=np.uint32)
+    status = np.zeros((len(frames), TOTAL_SENSORS), dtype=np.int8)
+    status[(frames['r_fail_mask'][:, None] & bits) != 0] = STATUS_R_FAIL
+    status[(frames['fail_mask'][:, None] & bits) != 0] = STATUS_FAIL
+    return status
+
+
+class FrameDecoder:
+    """
+    연속된 시리얼 read 결과를 이어 받아 프레임 단위로 잘라주는 스트리밍 디코더.
+    프레임 경계에 걸친 나머지 바이트는 다음 feed() 호출까지 보관합니다.
+    """
+    def __init__(self):
+        self._pending = b''
+        self.frames_decoded = 0
+        self.crc_errors = 0
+        self.last_seq = None
+
+    def feed(self, data):
+        """새로 읽은 바이트를 넣고, 완성된 프레임들(FRAME_DTYPE 배열)을 반환합니다."""
+        buf = self._pending + data if self._pending else bytes(data)
+        frames, consumed, crc_errors = decode_frames(buf)
+        self._pending = buf[consumed:]
+        self.crc_errors += crc_errors
+        self.frames_decoded += len(frames)
+        if len(frames):
+            self.last_seq = int(frames['seq'][-1])
+        return frames
+
@@ -0,0 +1,88 @@
+import numpy as np
+
+from frame_protocol import STATUS_OK
+
+# --- 설정 ---
+NMS_RADIUS = 1         # 피크 주변 억제 반경 (격자 칸). 1 -> 기존 find_strongest_sensors 의 3x3 영역
+SENSOR_PITCH = 0.015   # 격자 센서 간격 (m). 보드 실측값이 없어 배치 도면 기준 추정치
+
+
+class SensorGrid:
+    """
+    센서 ID 격자 배치를 인덱스 배열로 미리 바꿔 둔 피크 검출 엔진. 격자 크기와 센서 수에 제한이 없습니다.
+
+    layout: 행 리스트 (위쪽 행부터, 빈 칸은 None), sensor_ids: 프레임 값 배열의 센서 순서 (FrameParser.sensor_ids)
+    - cell_index (R, C): 칸마다 sensor_ids 기준 센서 번호 (빈 칸이나 프레임에 없는 센서는 -1)
+    - rows, cols (S,): 센서 번호마다 격자 위치 (격자에 없는 센서는 -1)
+    - xy (S, 2): 센서 좌표 (mm). 왼쪽 아래 칸이 원점, x 는 열 방향, y 는 위쪽 행 방향
+    - suppress (S + 1, S): 피크 센서마다 NMS 로 지울 센서 마스크. 마지막 행은 '피크 없음' 용으로 아무것도 지우지 않음
+    - neighbours (S + 1, 9): 센서마다 3x3 이웃의 센서 번호 (행 우선, 가운데가 4 번, 격자 밖은 -1). 마지막 행은 모두 -1
+    """
+    def __init__(self, layout, sensor_ids, radius=NMS_RADIUS, pitch=SENSOR_PITCH):
+        self.sensor_ids = list(sensor_ids)
+        self.radius = radius
+        self.pitch_mm = pitch * 1e3
+        number = {sid: k for k, sid in enumerate(self.sensor_ids)}
+        width = max(len(row) for row in layout)
+        self.cell_index = np.full((len(layout), width), -1, dtype=np.intp)
+        for r, row in enumerate(layout):
+            for c, sid in enumerate(row):
+                self.cell_index[r, c] = number.get(sid, -1)
+
+        n = len(self.sensor_ids)
+        self.rows = np.full(n, -1, dtype=np.intp)
+        self.cols = np.full(n, -1, dtype=np.intp)
+        r, c = np.nonzero(self.cell_index >= 0)
+        self.rows[self.cell_index[r, c]] = r
+        self.cols[self.cell_index[r, c]] = c
+        self.xy = np.column_stack([self.cols, len(layout) - 1 - self.rows]) * self.pitch_mm
+
+        padded = np.pad(self.cell_index, 1, constant_values=-1)
+        self.neighbours = np.full((n + 1, 9), -1, dtype=np.intp)
+        sensors = self.cell_index[r, c]
+        for k, (dr, dc) in enumerate((dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)):
+            self.neighbours[sensors, k] = padded[r + 1 + dr, c + 1 + dc]
+
+        # 체비쇼프 거리 radius 이내 (같은 센서 포함). 격자에 없는 센서는 자기 자신만 지움
+        on_grid = self.rows >= 0
+        near = ((np.abs(self.rows[:, None] - self.rows[None, :]) <= radius)
+                & (np.abs(self.cols[:, None] - self.cols[None, :]) <= radius)
+                & on_grid[:, None] & on_grid[None, :])
+        self.suppress = np.vstack([near | np.eye(n, dtype=bool), np.zeros((1, n), dtype=bool)])
+
+    @property
+    def shape(self):
+        return self.cell_index.shape
+
+    def detect_peaks(self, z, status=None, num_peaks=1, min_strength=0.0):
+        """
+        프레임 배치 (N, S) (또는 한 프레임 (S,)) 의 |z| 피크를 num_peaks 개까지 찾습니다.
+        매 단계 배치 전체에 대해 argmax 한 번 -> 찾은 피크 주변 (radius) 을 마스크로 지우는 비최대 억제.
+        status 가 STATUS_OK 가 아닌 센서, NaN, |z| < min_strength 인 센서는 후보에서 빠집니다.
+        반환: (N, num_peaks) 센서 번호 (강한 순, 남은 후보가 없으면 -1). 입력이 한 프레임이면 (num_peaks,).
+        """
+        z = np.asarray(z)
+        single = z.ndim == 1
+        z = np.atleast_2d(z)
+        strength = np.abs(z)
+        keep = strength >= min_strength  # NaN 은 False
+        if status is not None:
+            keep &= np.atleast_2d(status) == STATUS_OK
+        score = np.where(keep, strength, -np.inf)
+
+        frames = np.arange(len(score))
+        peaks = np.full((len(score), num_peaks), -1, dtype=np.intp)
+        for k in range(num_peaks):
+            best = np.argmax(score, axis=1)
+            found = score[frames, best] > -np.inf
+            if not found.any():
+                break
+            peaks[found, k] = best[found]
+            score[self.suppress[np.where(found, best, -1)]] = -np.inf
+        return peaks[0] if single else peaks
+
+    def peak_cells(self, peaks):
+        """detect_peaks() 결과와 같은 모양의 격자 (행, 열). 피크가 없는 자리는 (-1, -1)."""
+        peaks = np.asarray(peaks)
+        found = peaks >= 0
+        return np.where(found, self.rows[peaks], -1), np.where(found, self.cols[peaks], -1)
@@ -0,0 +1,232 @@
+import sys
+import json
+import time
+import threading
+
+# --- 설정 ---
+REPORT_INTERVAL = 1.0          # 콘솔/파일 출력 주기 (초)
+METRICS_FILE = 'metrics.jsonl'  # 세션 디렉토리에 주기마다 한 줄(JSON)씩 추가
+HISTOGRAM_BUCKETS = 32         # log2 버킷 수 (버킷 b: [2^(b-1), 2^b) 단위, 마지막 버킷은 그 이상 전부)
+PERCENTILES = (50, 99)
+
+
+class Counter:
+    """누적 카운터. 이름마다 한 스레드에서만 add() 합니다. (GIL 하에서 락 없이 안전, 보고 스레드는 읽기만 함)"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, n=1):
+        self.value += n
+
+
+class Histogram:
+    """
+    log2 버킷 히스토그램. observe() 는 정수 변환 + bit_length 한 번이라 numpy 호출 없이 1 us 미만.
+    scale: 값을 버킷 단위로 바꾸는 배율 (초 단위 시간은 1e6 -> us 버킷, 개수/바이트는 1)
+    카운터와 마찬가지로 이름마다 한 스레드에서만 observe() 합니다.
+    """
+    __slots__ = ('scale', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, scale=1e6):
+        self.scale = scale
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[min(int(value * self.scale).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+
+class _Timer:
+    __slots__ = ('histogram', 't0')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0)
+
+
+def bucket_percentile(counts, q, scale):
+    """버킷 개수 목록에서 q 백분위가 속한 버킷의 상한을 원래 단위로 반환합니다. (비어 있으면 None)"""
+    total = sum(counts)
+    if not total:
+        return None
+    target = total * q / 100.0
+    cumulative = 0
+    for b, n in enumerate(counts):
+        cumulative += n
+        if cumulative >= target:
+            return (1 << b) / scale
+    return (1 << (len(counts) - 1)) / scale
+
+
+class Metrics:
+    """
+    수집 파이프라인 계측 레지스트리: 카운터, 히스토그램, 게이지(보고 시점에 읽는 함수).
+
+    - 핫 경로에서는 counter()/histogram() 으로 객체를 한 번 받아 두고 add()/observe() 만 호출
+      (딕셔너리 조회, 락, 문자열 포맷 없음)
+    - 집계와 출력은 MetricsReporter 스레드가 REPORT_INTERVAL 마다 snapshot() 으로 처리
+    """
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def counter(self, name):
+        if name not in self.counters:
+            self.counters[name] = Counter()
+        return self.counters[name]
+
+    def histogram(self, name, scale=1e6):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(scale)
+        return self.histograms[name]
+
+    def timer(self, name):
+        """
+        with metrics.timer('row_write'): ... -> 블록 실행 시간을 us 버킷 히스토그램에 기록.
+        반환된 타이머는 재사용할 수 있으므로 핫 루프에서는 한 번 만들어 두고 with 만 반복합니다.
+        """
+        return _Timer(self.histogram(name))
+
+    def gauge(self, name, fn):
+        """보고할 때마다 fn() 을 호출해 현재 값을 읽는 게이지 (링 버퍼 적재량, 누적 오버플로우 등)."""
+        self.gauges[name] = fn
+
+    def snapshot(self):
+        """현재 누적값 복사본. 다른 스레드가 갱신 중이어도 항목별로는 일관된 값."""
+        return {
+            'time': time.time(),
+            'counters': {name: c.value for name, c in list(self.counters.items())},
+            'histograms': {name: (list(h.counts), h.count, h.total, h.max, h.scale)
+                           for name, h in list(self.histograms.items())},
+            'gauges': {name: fn() for name, fn in list(self.gauges.items())},
+        }
+
+
+def _format_rate(rate):
+    return f"{rate / 1e6:.1f}M" if rate >= 1e6 else f"{rate / 1e3:.1f}k" if rate >= 1e3 else f"{rate:.0f}"
+
+
+def _format_value(value, scale):
+    if scale == 1e6:
+        return f"{value * 1e3:.2f}ms" if value >= 1e-3 else f"{value * 1e6:.0f}us"
+    return f"{value:g}"
+
+
+class MetricsReporter:
+    """
+    REPORT_INTERVAL 마다 직전 구간의 집계를 콘솔 한 줄(\\r 덮어쓰기)과 메트릭 파일(JSON Lines)로 내보내는 스레드.
+
+    - 카운터: 구간 증가량과 초당 속도 / 히스토그램: 구간 개수, 평균, p50/p99 (버킷 상한), 누적 최대
+    - status() 를 주면 그 문자열을 콘솔 줄 앞에 붙임 (메인 루프가 프레임마다 print 하던 상태 줄 대신)
+    - pause()/resume(): 사용자 입력을 받는 동안 콘솔 출력만 멈춤 (파일 기록은 계속)
+    - stop() 은 마지막 구간을 출력하고 세션 전체 누적값을 final 레코드로 기록
+    """
+    def __init__(self, metrics, path=None, interval=REPORT_INTERVAL, status=None, stream=sys.stdout):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.status = status
+        self.stream = stream
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+        self._last = metrics.snapshot()
+        self._first = self._last
+        self._stop = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self.paused = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def stop(self):
+        """스레드를 멈추고 마지막 구간과 세션 누적(final) 레코드를 기록합니다. 두 번 불러도 안전합니다."""
+        if self._stopped:
+            return None
+        self._stopped = True
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.paused = False
+        self.report()
+        self.stream.write('\n')
+        record = self._interval_record(self._first, self.metrics.snapshot())
+        record['final'] = True
+        self._write(record)
+        if self._file:
+            self._file.close()
+            self._file = None
+        return record
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.report()
+            except Exception as e:
+                print(f"\n메트릭 출력 실패: {e}")
+
+    def report(self):
+        now = self.metrics.snapshot()
+        record = self._interval_record(self._last, now)
+        self._last = now
+        self._write(record)
+        if not self.paused:
+            self.stream.write('\r' + self._console_line(record))
+            self.stream.flush()
+        return record
+
+    @staticmethod
+    def _interval_record(prev, now):
+        dt = max(now['time'] - prev['time'], 1e-9)
+        counters = {}
+        for name, value in now['counters'].items():
+            delta = value - prev['counters'].get(name, 0)
+            counters[name] = {'total': value, 'delta': delta, 'rate': delta / dt}
+        histograms = {}
+        for name, (counts, count, total, peak, scale) in now['histograms'].items():
+            old_counts, old_count, old_total, _, _ = prev['histograms'].get(name, ([0] * len(counts), 0, 0.0, 0.0, scale))
+            delta = [a - b for a, b in zip(counts, old_counts)]
+            n = count - old_count
+            entry = {'count': n, 'mean': (total - old_total) / n if n else None, 'max': peak}  # max 는 세션 누적
+            for q in PERCENTILES:
+                entry[f'p{q}'] = bucket_percentile(delta, q, scale)
+            entry['scale'] = scale
+            histograms[name] = entry
+        return {'time': now['time'], 'interval': dt, 'counters': counters,
+                'histograms': histograms, 'gauges': now['gauges']}
+
+    def _console_line(self, record):
+        parts = [self.status()] if self.status else []
+        parts += [f"{name} {_format_rate(c['rate'])}/s" for name, c in record['counters'].items()]
+        parts += [f"{name} {value}" for name, value in record['gauges'].items()]
+        for name, h in record['histograms'].items():
+            if h['count']:
+                parts.append(f"{name} p50<{_format_value(h['p50'], h['scale'])} p99<{_format_value(h['p99'], h['scale'])}")
+        return ' | '.join(parts) + '   '
+
+    def _write(self, record):
+        if self._file:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
@@ -0,0 +1,187 @@
+import time
+import argparse
+import numpy as np
+
+from frame_protocol import STATUS_OK
+from grid_peaks import SensorGrid
+
+# --- 설정 ---
+LOCALIZE_METHODS = ('cell', 'centroid', 'parabolic', 'dipole')
+INITIAL_HEIGHT_MM = 10.0   # 쌍극자 피팅 시작 높이 (센서 면 위, mm)
+DIPOLE_ITERATIONS = 4      # Levenberg-Marquardt 반복 횟수 (모든 피크를 한꺼번에 반복)
+DIPOLE_STEP_MM = 0.05      # 수치 야코비안 차분 간격 (mm)
+FIELD_SCALE = 1e8          # 쌍극자 장 (uT) = FIELD_SCALE * (3 r^ r^T - I) m / |r|^3, r 은 mm, m 은 A·m²
+EVAL_FRAMES = 2000
+
+
+def _gather(values, index):
+    """values (N, S, ...) 에서 프레임마다 index (N, ...) 센서를 모읍니다. index < 0 자리는 NaN."""
+    n = len(values)
+    frames = np.arange(n).reshape((n,) + (1,) * (index.ndim - 1))
+    out = values[frames, np.maximum(index, 0)].astype(np.float64)
+    out[index < 0] = np.nan
+    return out
+
+
+class PatchLocalizer:
+    """
+    grid_peaks 피크 주변 3x3 이웃으로 패치 위치를 센서 간격보다 세밀한 연속 좌표 (mm, SensorGrid.xy 기준) 로 추정합니다.
+    모든 방식이 (N 프레임, K 피크) 배치 전체를 한 번에 처리합니다.
+
+    - 'cell': 피크 센서 좌표 그대로 (기존 position.py 해상도, 비교용)
+    - 'centroid': 이웃의 |z| 에서 이웃 최솟값 (배경) 을 뺀 봉우리 높이를 가중치로 한 무게중심
+    - 'parabolic': 행/열 방향 세 점의 log(봉우리 높이 + 1) 에 포물선 (= 가우시안 봉우리) 을 맞춘 꼭짓점. 칸 ±0.5 로 제한
+    - 'dipole': 이웃의 3 축 값 전부에 자석 쌍극자 + 균일 배경장을 최소제곱으로 맞춤.
+      위치 (x, y, 높이) 만 Levenberg-Marquardt 로 찾고 모멘트/배경은 위치마다 선형 최소제곱으로 풂.
+      가장 정확하지만 가장 느림 (parabolic 결과에서 시작)
+    FAIL/R_FAIL 센서와 격자 밖 이웃은 모든 방식에서 빠집니다.
+    """
+    def __init__(self, grid, method='parabolic'):
+        if method not in LOCALIZE_METHODS:
+            raise ValueError(f"Unknown localization method '{method}' (use one of {LOCALIZE_METHODS}).")
+        self.grid = grid
+        self.method = method
+        self.xy = np.vstack([grid.xy, [np.nan, np.nan]])  # 마지막 행: 피크 없음 (-1)
+
+    def localize(self, values, status, peaks):
+        """
+        values (N, S, 3), status (N, S), peaks (N, K) (SensorGrid.detect_peaks) -> (N, K, 2) x/y (mm).
+        피크가 없는 자리는 NaN.
+        """
+        values = np.asarray(values)
+        if status is not None:
+            values = np.where((np.asarray(status) == STATUS_OK)[..., None], values, np.nan)
+        if self.method == 'dipole':
+            return self.fit_dipoles(values, peaks)[0][..., :2]
+        xy = self.xy[peaks]
+        if self.method == 'cell':
+            return xy
+        hood = self.grid.neighbours[peaks]                  # (N, K, 9)
+        z = np.abs(_gather(values[:, :, 2], hood))          # (N, K, 9), 없는 이웃은 NaN
+        # 이웃 최솟값을 배경으로 빼서 봉우리 높이만 사용 (없는 이웃은 0)
+        with np.errstate(invalid='ignore'):
+            height = np.nan_to_num(z - np.min(np.where(np.isnan(z), np.inf, z), axis=-1, keepdims=True),
+                                   nan=0.0, posinf=0.0)
+        if self.method == 'centroid':
+            total = height.sum(axis=-1, keepdims=True)
+            centroid = np.einsum('nki,nkic->nkc', height, np.nan_to_num(self.xy[hood])) / np.where(total > 0, total, 1.0)
+            return np.where(total > 0, centroid, xy)
+        log_z = np.log(height + 1.0)
+        dx = self._vertex(log_z[..., 3], log_z[..., 4], log_z[..., 5])   # 열 +1 -> x +
+        dy = self._vertex(log_z[..., 7], log_z[..., 4], log_z[..., 1])   # 행 -1 -> y +
+        return xy + np.stack([dx, dy], axis=-1) * self.grid.pitch_mm
+
+    @staticmethod
+    def _vertex(left, center, right):
+        """세 점 (-1, 0, +1) 포물선의 꼭짓점 위치 (칸 단위). 이웃이 없거나 볼록하지 않으면 0."""
+        curvature = left - 2 * center + right
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = 0.5 * (left - right) / curvature
+        return np.where(curvature < 0, np.clip(np.nan_to_num(offset), -0.5, 0.5), 0.0)
+
+    def fit_dipoles(self, values, peaks):
+        """
+        피크마다 쌍극자 피팅. values (N, S, 3) (무효 값은 NaN), peaks (N, K).
+        반환: 위치 (N, K, 3) mm (x, y, 센서 면 위 높이), 모멘트 (N, K, 3) A·m², 잔차 RMS (N, K) uT.
+        """
+        hood = self.grid.neighbours[peaks]                     # (N, K, 9)
+        field = _gather(values, hood)                          # (N, K, 9, 3)
+        valid = ~np.isnan(field).any(axis=-1)                  # (N, K, 9)
+        field = np.nan_to_num(field)
+        sensor_xy = self.xy[hood]                              # (N, K, 9, 2)
+
+        start = PatchLocalizer(self.grid, 'parabolic').localize(values, None, peaks)
+        found = peaks >= 0
+        pos = np.concatenate([np.nan_to_num(start), np.full(peaks.shape + (1,), INITIAL_HEIGHT_MM)], axis=-1)
+        damping = np.full(peaks.shape, 1e-2)
+        residual, cost, _ = self._solve(pos, sensor_xy, field, valid)
+        for _ in range(DIPOLE_ITERATIONS):
+            # 위치 3 개에 대한 수치 야코비안 (N, K, 27, 3)
+            jac = np.stack([(self._solve(pos + step, sensor_xy, field, valid)[0] - residual) / DIPOLE_STEP_MM
+                            for step in np.eye(3) * DIPOLE_STEP_MM], axis=-1)
+            jtj = np.einsum('nkri,nkrj->nkij', jac, jac)
+            jtr = np.einsum('nkri,nkr->nki', jac, residual)
+            diag = np.einsum('nkii->nki', jtj)
+            lhs = jtj + (damping[..., None] * (diag + 1e-9))[..., None] * np.eye(3)
+            delta = -np.linalg.solve(lhs, jtr[..., None])[..., 0]
+            trial = pos + delta
+            trial[..., 2] = np.abs(trial[..., 2])  # 자석은 센서 면 위쪽
+            trial_residual, trial_cost, _ = self._solve(trial, sensor_xy, field, valid)
+            better = trial_cost < cost
+            pos = np.where(better[..., None], trial, pos)
+            residual = np.where(better[..., None], trial_residual, residual)
+            cost = np.where(better, trial_cost, cost)
+            damping = np.where(better, damping / 3, damping * 3)
+
+        _, cost, moment = self._solve(pos, sensor_xy, field, valid)
+        count = np.maximum(valid.sum(axis=-1) * 3, 1)
+        pos[~found] = np.nan
+        moment[~found] = np.nan
+        return pos, moment, np.where(found, np.sqrt(cost / count), np.nan)
+
+    @staticmethod
+    def _solve(pos, sensor_xy, field, valid):
+        """
+        위치 고정 시 모멘트 3 + 배경 3 에 대한 선형 최소제곱.
+        반환: 잔차 (N, K, 27), 잔차 제곱합 (N, K), 모멘트 (N, K, 3)
+        """
+        height = np.broadcast_to(-pos[..., None, 2:], sensor_xy.shape[:-1] + (1,))
+        r = np.concatenate([sensor_xy - pos[..., None, :2], height], axis=-1)  # (N, K, 9, 3) 자석 -> 센서
+        dist = np.maximum(np.sqrt(np.nansum(r * r, axis=-1)), 1e-6)
+        r_hat = r / dist[..., None]
+        # 센서마다 3x3 쌍극자 응답 행렬 (uT per A·m²). 격자 밖 이웃 (NaN) 은 0
+        response = FIELD_SCALE * (3 * r_hat[..., :, None] * r_hat[..., None, :] - np.eye(3)) / dist[..., None, None] ** 3
+        response = np.nan_to_num(response)
+        design = np.concatenate([response, np.broadcast_to(np.eye(3), response.shape)], axis=-1)  # (N, K, 9, 3, 6)
+        design = design * valid[..., None, None]
+        shape = design.shape[:2]
+        design = design.reshape(shape + (-1, 6))
+        target = (field * valid[..., None]).reshape(shape + (-1,))
+        # 열 크기가 크게 다르므로 (쌍극자 ~1e4, 배경 1) 열을 정규화해서 정규방정식을 풂
+        norm = np.sqrt(np.einsum('nkri,nkri->nki', design, design)) + 1e-12
+        scaled = design / norm[..., None, :]
+        gram = np.einsum('nkri,nkrj->nkij', scaled, scaled) + 1e-9 * np.eye(6)
+        coef = np.linalg.solve(gram, np.einsum('nkri,nkr->nki', scaled, target)[..., None])[..., 0]
+        residual = np.einsum('nkri,nki->nkr', scaled, coef) - target
+        return residual, np.einsum('nkr,nkr->nk', residual, residual), (coef / norm)[..., :3]
+
+
+def evaluate(num_frames=EVAL_FRAMES, num_patches=1, seed=0):
+    """시뮬레이터 정답 위치와 비교한 방식별 오차 (mm) 와 프레임당 비용 (us) 을 출력합니다."""
+    from sensor_simulator import HallArraySimulator
+
+    sim = HallArraySimulator(num_patches=num_patches, seed=seed)
+    times = np.arange(num_frames) * sim.frame_period(binary=True)
+    flat, status = sim.generate(times)
+    values = flat.reshape(num_frames, -1, 3)
+    grid = SensorGrid(sim.layout, sim.sensor_ids)
+    peaks = grid.detect_peaks(values[:, :, 2], status, num_patches)
+    # 정답: 피크 센서 측정 시각의 자석 위치, 피크마다 가장 가까운 자석
+    truth = sim.patch_positions(times + sim.sample_offsets[peaks[:, 0]])[..., :2] * 1e3     # (N, P, 2)
+    # 격자 밖으로 나간 자석은 어느 방식으로도 찾을 수 없으므로 격자 범위 안의 프레임만 비교
+    inside = np.all((truth >= grid.xy.min(axis=0)) & (truth <= grid.xy.max(axis=0)), axis=(1, 2))
+
+    print(f"{num_frames} frames, {num_patches} patch(es), pitch {grid.pitch_mm:.1f} mm, "
+          f"{inside.mean() * 100:.0f}% of frames inside the grid")
+    print(f"{'method':<10}{'mean mm':>9}{'p95 mm':>9}{'us/frame':>10}")
+    for method in LOCALIZE_METHODS:
+        localizer = PatchLocalizer(grid, method)
+        t0 = time.perf_counter()
+        xy = localizer.localize(values, status, peaks)
+        elapsed = time.perf_counter() - t0
+        error = np.min(np.linalg.norm(xy[:, :, None, :] - truth[:, None, :, :], axis=-1), axis=-1)[inside]
+        error = error[~np.isnan(error)]
+        print(f"{method:<10}{error.mean():>9.2f}{np.percentile(error, 95):>9.2f}{elapsed / num_frames * 1e6:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare patch localization methods against the hall-array simulator.")
+    parser.add_argument('--frames', type=int, default=EVAL_FRAMES)
+    parser.add_argument('--patches', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    evaluate(args.frames, args.patches, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+import time
+import argparse
+import numpy as np
+
+from grid_peaks import SensorGrid
+from patch_localizer import PatchLocalizer
+
+# --- 설정 ---
+MAX_TRACKS = 8                 # 동시에 추적하는 최대 패치 수 (피크 검출 개수도 이만큼)
+DETECTION_THRESHOLD_UT = 300.0  # 이보다 약한 |z| 피크는 패치로 보지 않음 (배경 + 오프셋은 수십 uT)
+MEASUREMENT_NOISE_MM = 3.0     # 위치 측정 잡음 표준편차 (시뮬레이터 parabolic 오차 평균 약 3 mm, p99 약 10 mm)
+ACCEL_NOISE_MM = 50.0          # 등속 모델의 가속도 잡음 스펙트럼 밀도 (mm/s^2 / sqrt(Hz)). 크면 속도 추정이 튀어 예측이 흩어짐
+INITIAL_SPEED_MM = 200.0       # 새 트랙의 속도 불확실성 표준편차 (mm/s)
+GATE_MM = 30.0                 # 예측 위치와 이보다 먼 검출은 같은 패치로 보지 않음 (센서 간격 2 칸)
+CONFIRM_HITS = 3               # 연속으로 이만큼 검출되면 트랙 확정 (잡음 피크로 트랙이 생기는 것 방지)
+MAX_COAST_S = 0.2              # 확정 트랙이 검출 없이 예측만으로 버티는 최대 시간 (s)
+MAX_MERGE_S = 2.0              # 다른 트랙의 게이트 안에서 검출이 합쳐진 확정 트랙을 유지하는 최대 시간 (s)
+MERGE_PULL = 0.05              # 합쳐진 동안 프레임마다 확정 트랙 위치를 합친 트랙 쪽으로 당기는 비율
+EVAL_FRAMES = 3000
+
+
+def linear_sum_assignment(cost):
+    """
+    직사각형 비용 행렬 (R, C) 의 최소 비용 완전 매칭 (헝가리안 알고리즘, 포텐셜 방식 O(n^2 m)).
+    scipy.optimize.linear_sum_assignment 와 같은 (행 번호, 열 번호) 를 행 순서로 반환합니다.
+    트랙/검출이 수 개라서 numpy 호출 오버헤드를 피하려고 파이썬 리스트로 계산합니다. (8x8 에서 약 30 us)
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    a = cost.tolist()
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    match = [0] * (m + 1)  # 열 j 에 매칭된 행 (1 부터, 0 은 없음)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = [float('inf')] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            row, ui = a[i0 - 1], u[i0]
+            delta, j1 = float('inf'), 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = row[j - 1] - ui - v[j]
+                    if reduced < minv[j]:
+                        minv[j], way[j] = reduced, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    pairs = sorted((match[j] - 1, j - 1) for j in range(1, m + 1) if match[j])
+    rows = np.array([p[0] for p in pairs], dtype=np.intp)
+    cols = np.array([p[1] for p in pairs], dtype=np.intp)
+    if transposed:
+        rows, cols = cols, rows
+        order = np.argsort(rows)
+        rows, cols = rows[order], cols[order]
+    return rows, cols
+
+
+class PatchTracker:
+    """
+    패치별 등속 칼만 필터 + 헝가리안 할당으로 프레임마다 검출된 위치를 패치 ID 에 이어 붙이는 추적기.
+
+    - 상태 [x, y, vx, vy] (mm, mm/s), 트랙 전체를 (T, 4) / (T, 4, 4) 배열로 한꺼번에 예측/갱신
+    - 예측 위치와 검출 사이 거리를 비용으로 최소 비용 할당, GATE_MM 보다 먼 쌍은 버림
+    - 할당되지 않은 검출 -> 새 후보 트랙, CONFIRM_HITS 번 연속 검출되면 확정 (그 전에 놓치면 바로 삭제)
+    - 확정 트랙은 MAX_COAST_S 동안 검출이 없어도 예측으로 유지하다가 삭제
+    - 두 패치가 가까워 검출이 하나로 합쳐지면, 할당된 트랙의 게이트 안에 있는 확정 트랙은 합쳐진 것으로 보고
+      MAX_MERGE_S 까지 유지하면서 위치를 그 트랙 쪽으로 MERGE_PULL 만큼씩 당김 (속도는 그대로).
+      다시 갈라졌을 때 새 트랙이 생기지 않고 원래 ID 가 검출을 이어 받음
+    patch ID 는 트랙이 생길 때 붙는 번호라서 세기 순서가 바뀌거나 두 패치가 교차해도 유지됩니다.
+    """
+    def __init__(self, max_tracks=MAX_TRACKS, measurement_noise=MEASUREMENT_NOISE_MM, accel_noise=ACCEL_NOISE_MM,
+                 gate=GATE_MM, confirm_hits=CONFIRM_HITS, max_coast=MAX_COAST_S, max_merge=MAX_MERGE_S,
+                 merge_pull=MERGE_PULL):
+        self.max_tracks = max_tracks
+        self.r = measurement_noise ** 2
+        self.q = accel_noise ** 2
+        self.gate = gate
+        self.confirm_hits = confirm_hits
+        self.max_coast = max_coast
+        self.max_merge = max_merge
+        self.merge_pull = merge_pull
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.state = np.zeros((0, 4))
+        self.cov = np.zeros((0, 4, 4))
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.last_seen = np.zeros(0)
+        self.time = None
+        self.next_id = 1
+
+    @property
+    def confirmed(self):
+        return self.hits >= self.confirm_hits
+
+    def predict(self, t):
+        """모든 트랙을 시각 t 로 예측합니다."""
+        dt = 0.0 if self.time is None else max(t - self.time, 0.0)
+        self.time = t
+        if not dt or not len(self.ids):
+            return
+        f = np.eye(4)
+        f[0, 2] = f[1, 3] = dt
+        q = np.zeros((4, 4))
+        q[[0, 1], [0, 1]] = dt ** 3 / 3
+        q[[0, 1, 2, 3], [2, 3, 0, 1]] = dt ** 2 / 2
+        q[[2, 3], [2, 3]] = dt
+        self.state = self.state @ f.T
+        self.cov = f @ self.cov @ f.T + self.q * q
+
+    def update(self, t, detections):
+        """
+        시각 t (s) 의 검출 위치 (D, 2) (mm, NaN 행은 무시) 로 트랙을 갱신하고 확정 트랙의 (ID (M,), 상태 (M, 4)) 를 반환합니다.
+        """
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 2)
+        detections = detections[~np.isnan(detections).any(axis=1)]
+        self.predict(t)
+
+        assigned = np.zeros(len(self.ids), dtype=bool)
+        used = np.zeros(len(detections), dtype=bool)
+        if len(self.ids) and len(detections):
+            distance = np.linalg.norm(self.state[:, None, :2] - detections[None, :, :], axis=-1)
+            # 게이트 밖 쌍은 큰 비용으로 두어 다른 쌍을 우선 채우고, 할당 후에 버림
+            rows, cols = linear_sum_assignment(np.minimum(distance, self.gate * 10))
+            ok = distance[rows, cols] <= self.gate
+            rows, cols = rows[ok], cols[ok]
+            self._correct(rows, detections[cols])
+            assigned[rows] = True
+            used[cols] = True
+            self.hits[rows] += 1
+            self.last_seen[rows] = t
+
+        # 놓친 확정 트랙이 할당된 트랙의 게이트 안이면 검출이 합쳐진 것: 그 트랙 쪽으로 당기며 MAX_MERGE_S 까지 유지
+        merged = np.zeros(len(self.ids), dtype=bool)
+        missed = np.flatnonzero(~assigned & self.confirmed)
+        if len(missed) and assigned.any():
+            hosts = np.flatnonzero(assigned)
+            distance = np.linalg.norm(self.state[missed, None, :2] - self.state[None, hosts, :2], axis=-1)
+            inside = distance.min(axis=1) <= self.gate
+            rows, host = missed[inside], hosts[distance[inside].argmin(axis=1)]
+            self.state[rows, :2] += self.merge_pull * (self.state[host, :2] - self.state[rows, :2])
+            merged[rows] = True
+
+        # 놓친 트랙: 후보는 바로 삭제, 확정 트랙은 MAX_COAST_S (합쳐진 트랙은 MAX_MERGE_S) 까지 유지
+        missing = t - self.last_seen
+        alive = assigned | (self.confirmed & (missing <= self.max_coast)) | (merged & (missing <= self.max_merge))
+        self._keep(alive)
+        self._spawn(t, detections[~used])
+        confirmed = self.confirmed
+        return self.ids[confirmed], self.state[confirmed]
+
+    def _correct(self, rows, measured):
+        cov = self.cov[rows]
+        innovation = measured - self.state[rows, :2]
+        s = cov[:, :2, :2] + self.r * np.eye(2)
+        gain = cov[:, :, :2] @ np.linalg.inv(s)                  # (A, 4, 2)
+        self.state[rows] += np.einsum('aij,aj->ai', gain, innovation)
+        self.cov[rows] = cov - gain @ cov[:, :2, :]
+
+    def _keep(self, mask):
+        self.ids, self.state, self.cov = self.ids[mask], self.state[mask], self.cov[mask]
+        self.hits, self.last_seen = self.hits[mask], self.last_seen[mask]
+
+    def _spawn(self, t, detections):
+        detections = detections[:max(self.max_tracks - len(self.ids), 0)]
+        n = len(detections)
+        if not n:
+            return
+        state = np.zeros((n, 4))
+        state[:, :2] = detections
+        cov = np.zeros((n, 4, 4))
+        cov[:, [0, 1], [0, 1]] = self.r
+        cov[:, [2, 3], [2, 3]] = INITIAL_SPEED_MM ** 2
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + n)])
+        self.next_id += n
+        self.state = np.concatenate([self.state, state])
+        self.cov = np.concatenate([self.cov, cov])
+        self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(n, t)])
+
+
+def evaluate(num_frames=EVAL_FRAMES, num_patches=3, num_muxes=3, method='parabolic', seed=0):
+    """
+    시뮬레이터 궤적으로 검출 -> 위치 추정 -> 추적 전체를 돌려, 정답 패치별 ID 교체 횟수, 위치 오차,
+    프레임당 추적 비용을 프레임 주기와 비교해 출력합니다.
+    """
+    from sensor_simulator import HallArraySimulator
+
+    sim = HallArraySimulator(num_patches=num_patches, num_muxes=num_muxes, seed=seed)
+    period = sim.frame_period(binary=num_muxes * 8 == 24)
+    times = np.arange(num_frames) * period
+    flat, status = sim.generate(times)
+    values = flat.reshape(num_frames, -1, 3)
+    grid = SensorGrid(sim.layout, sim.sensor_ids)
+    peaks = grid.detect_peaks(values[:, :, 2], status, MAX_TRACKS, DETECTION_THRESHOLD_UT)
+    positions = PatchLocalizer(grid, method).localize(values, status, peaks)
+    truth = sim.patch_positions(times + sim.sample_offsets[len(sim.sensor_ids) // 2])[..., :2] * 1e3
+
+    # 두 자석이 GATE_MM 안으로 들어오면 검출이 하나로 합쳐질 수 있어 누가 누군지 정해지지 않으므로,
+    # ID 교체는 다른 자석과 떨어져 있는 프레임에서만 셈 (가까워진 횟수도 함께 출력)
+    gap = np.linalg.norm(truth[:, :, None] - truth[:, None], axis=-1)
+    gap[:, np.arange(num_patches), np.arange(num_patches)] = np.inf
+    isolated = gap.min(axis=2) > GATE_MM
+    encounters = int(np.sum(np.diff((gap < GATE_MM).astype(np.int8), axis=0) == 1) // 2)
+
+    tracker = PatchTracker()
+    owner = np.zeros(num_patches, dtype=np.int64)   # 정답 패치마다 마지막으로 짝이 된 트랙 ID
+    swaps, errors, cost = 0, [], []
+    for t, detections, true_xy, alone in zip(times, positions, truth, isolated):
+        t0 = time.perf_counter()
+        ids, state = tracker.update(t, detections)
+        cost.append(time.perf_counter() - t0)
+        if not len(ids):
+            continue
+        # 정답 패치와 확정 트랙을 최소 거리로 짝지어, 짝이 된 트랙 ID 가 바뀌면 교체로 셈
+        distance = np.linalg.norm(true_xy[:, None, :] - state[None, :, :2], axis=-1)
+        for p, k in zip(*linear_sum_assignment(distance)):
+            if distance[p, k] > GATE_MM:
+                continue
+            errors.append(distance[p, k])
+            if alone[p]:
+                if owner[p] and owner[p] != ids[k]:
+                    swaps += 1
+                owner[p] = ids[k]
+
+    cost = np.array(cost) * 1e6
+    print(f"{num_frames} frames, {num_patches} patch(es), {len(sim.sensor_ids)} sensors, "
+          f"frame period {period * 1e6:.0f} us, method '{method}'")
+    print(f"tracks created: {tracker.next_id - 1}, close encounters: {encounters}, identity swaps: {swaps}, "
+          f"error mean {np.mean(errors):.2f} mm, p95 {np.percentile(errors, 95):.2f} mm")
+    print(f"tracking cost: mean {cost.mean():.1f} us, p99 {np.percentile(cost, 99):.1f} us, max {cost.max():.1f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the multi-patch tracker on the hall-array simulator.")
+    parser.add_argument('--frames', type=int, default=EVAL_FRAMES)
+    parser.add_argument('--patches', type=int, default=3)
+    parser.add_argument('--muxes', type=int, default=3, help="simulated array size (8 sensors per mux)")
+    parser.add_argument('--method', default='parabolic', help="patch_localizer method")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    evaluate(args.frames, args.patches, args.muxes, args.method, args.seed)
+
+
+if __name__ == '__main__':
+    main()
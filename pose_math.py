@@ -0,0 +1,221 @@
+import numpy as np
+
+# --- 설정 ---
+SLERP_LINEAR_DOT = 0.9995   # 두 쿼터니언이 이보다 가까우면 slerp 대신 정규화 선형 보간 (sin θ ≈ 0 회피)
+
+
+def matrix_to_quaternion(m):
+    """
+    (..., 3, 3) 또는 (..., 3, 4) 회전 행렬 -> (..., 4) 쿼터니언 (x, y, z, w).
+    수집 스크립트의 get_quaternion_from_matrix 와 같은 분기(trace > 0, 대각 성분 최대)를 마스크로 계산하므로
+    부호 규약까지 같은 값을 냅니다.
+    """
+    m = np.asarray(m, dtype=np.float64)
+    shape = m.shape[:-2]
+    m = m.reshape(-1, 3, m.shape[-1])
+    m00, m01, m02 = m[:, 0, 0], m[:, 0, 1], m[:, 0, 2]
+    m10, m11, m12 = m[:, 1, 0], m[:, 1, 1], m[:, 1, 2]
+    m20, m21, m22 = m[:, 2, 0], m[:, 2, 1], m[:, 2, 2]
+    trace = m00 + m11 + m22
+    q = np.zeros((len(m), 4))
+
+    branches = [trace > 0]
+    branches.append(~branches[0] & (m00 > m11) & (m00 > m22))
+    branches.append(~branches[0] & ~branches[1] & (m11 > m22))
+    branches.append(~(branches[0] | branches[1] | branches[2]))
+
+    b = branches[0]
+    s = 0.5 / np.sqrt(trace[b] + 1.0)
+    q[b] = np.stack([(m21[b] - m12[b]) * s, (m02[b] - m20[b]) * s, (m10[b] - m01[b]) * s, 0.25 / s], axis=1)
+    b = branches[1]
+    s = 2.0 * np.sqrt(1.0 + m00[b] - m11[b] - m22[b])
+    q[b] = np.stack([0.25 * s, (m01[b] + m10[b]) / s, (m02[b] + m20[b]) / s, (m21[b] - m12[b]) / s], axis=1)
+    b = branches[2]
+    s = 2.0 * np.sqrt(1.0 + m11[b] - m00[b] - m22[b])
+    q[b] = np.stack([(m01[b] + m10[b]) / s, 0.25 * s, (m12[b] + m21[b]) / s, (m02[b] - m20[b]) / s], axis=1)
+    b = branches[3]
+    s = 2.0 * np.sqrt(1.0 + m22[b] - m00[b] - m11[b])
+    q[b] = np.stack([(m02[b] + m20[b]) / s, (m12[b] + m21[b]) / s, 0.25 * s, (m10[b] - m01[b]) / s], axis=1)
+    return q.reshape(shape + (4,))
+
+
+def quaternion_to_matrix(q):
+    """(..., 4) 쿼터니언 (x, y, z, w) -> (..., 3, 3) 회전 행렬. 0 쿼터니언은 0 행렬 (무효 포즈 표시용)."""
+    q = np.asarray(q, dtype=np.float64)
+    shape = q.shape[:-1]
+    q = q.reshape(-1, 4)
+    norm = np.einsum('ij,ij->i', q, q)
+    s = np.divide(2.0, norm, out=np.zeros_like(norm), where=norm > 0)
+    x, y, z, w = q.T
+    m = np.empty((len(q), 3, 3))
+    m[:, 0, 0] = 1 - s * (y * y + z * z)
+    m[:, 0, 1] = s * (x * y - z * w)
+    m[:, 0, 2] = s * (x * z + y * w)
+    m[:, 1, 0] = s * (x * y + z * w)
+    m[:, 1, 1] = 1 - s * (x * x + z * z)
+    m[:, 1, 2] = s * (y * z - x * w)
+    m[:, 2, 0] = s * (x * z - y * w)
+    m[:, 2, 1] = s * (y * z + x * w)
+    m[:, 2, 2] = 1 - s * (x * x + y * y)
+    m[norm == 0] = 0.0
+    return m.reshape(shape + (3, 3))
+
+
+def euler_to_matrix(roll, pitch, yaw):
+    """수집 스크립트의 get_euler_angles_from_matrix 의 역변환 (도 단위, R = Rz(yaw) Ry(pitch) Rx(roll))."""
+    r, p, y = (np.radians(np.asarray(a, dtype=np.float64)) for a in (roll, pitch, yaw))
+    cr, sr, cp, sp, cy, sy = np.cos(r), np.sin(r), np.cos(p), np.sin(p), np.cos(y), np.sin(y)
+    m = np.empty(r.shape + (3, 3))
+    m[..., 0, 0], m[..., 0, 1], m[..., 0, 2] = cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr
+    m[..., 1, 0], m[..., 1, 1], m[..., 1, 2] = sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr
+    m[..., 2, 0], m[..., 2, 1], m[..., 2, 2] = -sp, cp * sr, cp * cr
+    return m
+
+
+def lerp(a, b, t):
+    """선형 보간. t 는 a, b 의 마지막 축을 제외한 모양으로 브로드캐스트됩니다."""
+    t = np.asarray(t, dtype=np.float64)[..., None]
+    return a + (b - a) * t
+
+
+def slerp(q0, q1, t):
+    """
+    (..., 4) 쿼터니언 구면 선형 보간. 최단 경로를 위해 내적이 음수면 q1 의 부호를 뒤집고,
+    거의 같은 방향이면 정규화 선형 보간을 씁니다. 결과는 단위 쿼터니언 (0 쿼터니언 입력은 0 유지).
+    """
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., None]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    spherical = dot < SLERP_LINEAR_DOT
+    safe_sin = np.where(spherical, sin_theta, 1.0)
+    w0 = np.where(spherical, np.sin((1 - t) * theta) / safe_sin, 1 - t)
+    w1 = np.where(spherical, np.sin(t * theta) / safe_sin, t)
+    q = w0 * q0 + w1 * q1
+    norm = np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.divide(q, norm, out=np.zeros_like(q), where=norm > 0)
+
+
+def as_matrix(m):
+    """m[r][c] 로 인덱싱되는 3x4 행렬 (OpenVR HmdMatrix34_t, 리스트, 배열) -> (3, 4) float64 배열."""
+    if isinstance(m, np.ndarray):
+        return m.astype(np.float64, copy=False)
+    return np.array([[m[r][c] for c in range(4)] for r in range(3)], dtype=np.float64)
+
+
+def matrix_to_euler(m):
+    """(..., 3, 3) 또는 (..., 3, 4) 회전 행렬 -> (..., 3) Roll, Pitch, Yaw (도, 수집 스크립트와 같은 ZYX 규약)."""
+    m = np.asarray(m, dtype=np.float64)
+    yaw = np.arctan2(m[..., 1, 0], m[..., 0, 0])
+    pitch = np.arctan2(-m[..., 2, 0], np.sqrt(m[..., 2, 1] ** 2 + m[..., 2, 2] ** 2))
+    roll = np.arctan2(m[..., 2, 1], m[..., 2, 2])
+    return np.degrees(np.stack([roll, pitch, yaw], axis=-1))
+
+
+def pose_columns(poses, valid=None):
+    """
+    (..., 3, 4) 트래커 포즈 -> (..., 10) 수집 CSV 의 트래커 컬럼 블록
+    [pos_x, pos_y, pos_z, rot_roll, rot_pitch, rot_yaw, rot_quat_x, rot_quat_y, rot_quat_z, rot_quat_w].
+    valid 가 False 인 포즈는 기존 스크립트처럼 0 으로 채웁니다.
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    out = np.empty(poses.shape[:-2] + (10,))
+    out[..., 0:3] = poses[..., :, 3]
+    out[..., 3:6] = matrix_to_euler(poses)
+    out[..., 6:10] = matrix_to_quaternion(poses)
+    if valid is not None:
+        out[~np.asarray(valid, dtype=bool)] = 0.0
+    return out
+
+
+def get_euler_angles_from_matrix(m):
+    """회전 행렬에서 Roll, Pitch, Yaw 오일러 각도를 계산합니다. (단일 포즈용, 배치는 matrix_to_euler)"""
+    return tuple(matrix_to_euler(as_matrix(m)).tolist())
+
+
+def get_quaternion_from_matrix(m):
+    """회전 행렬에서 쿼터니언(x, y, z, w)을 계산합니다. (단일 포즈용, 배치는 matrix_to_quaternion)"""
+    return matrix_to_quaternion(as_matrix(m)).tolist()
+
+
+# --- 지난 세션의 회전 컬럼 재계산 ---
+def tracker_column_prefixes(columns):
+    """CSV 에 기록된 트래커별 컬럼 접두사 (tracker1_, tracker_1_, 단일 트래커는 tracker_)."""
+    prefixes = []
+    for i in range(1, 10):
+        for prefix in (f'tracker{i}_', f'tracker_{i}_'):
+            if f'{prefix}pos_x' in columns:
+                prefixes.append(prefix)
+    if not prefixes and 'tracker_pos_x' in columns:
+        prefixes.append('tracker_')
+    return prefixes
+
+
+def quaternion_columns(columns, prefix):
+    """트래커의 쿼터니언 컬럼 (x, y, z, w 순서). rot_quat_* (현재 형식) 또는 rot_* (이전 형식), 없으면 None."""
+    for quat_prefix in (f'{prefix}rot_quat_', f'{prefix}rot_'):
+        cols = [f'{quat_prefix}{a}' for a in 'xyzw']
+        if all(c in columns for c in cols):
+            return cols
+    return None
+
+
+def rotations_from_columns(data, prefix):
+    """DataFrame 의 트래커 회전 컬럼 -> (N, 3, 3). 쿼터니언 우선, 없으면 roll/pitch/yaw, 둘 다 없으면 None."""
+    quat_cols = quaternion_columns(data.columns, prefix)
+    if quat_cols is not None:
+        return quaternion_to_matrix(data[quat_cols].to_numpy(dtype=np.float64))
+    if f'{prefix}rot_roll' in data:
+        return euler_to_matrix(*(data[f'{prefix}rot_{a}'].to_numpy() for a in ('roll', 'pitch', 'yaw')))
+    return None
+
+
+def recompute_rotation_columns(data):
+    """
+    수집 DataFrame 의 파생 회전 컬럼 (roll/pitch/yaw, 쿼터니언) 을 한 번에 다시 계산합니다. (제자리 수정)
+    쿼터니언(없으면 오일러)에서 회전 행렬을 복원해 두 표현을 모두 채우며, 없는 표현은 해당 트래커 컬럼 뒤에 추가합니다.
+    트래커를 못 읽어 0 으로 채워진 행은 0 으로 둡니다.
+    """
+    for prefix in tracker_column_prefixes(data.columns):
+        rot = rotations_from_columns(data, prefix)
+        if rot is None:
+            continue
+        valid = np.any(rot != 0, axis=(1, 2))
+        euler = np.where(valid[:, None], matrix_to_euler(rot), 0.0)
+        quat = np.where(valid[:, None], matrix_to_quaternion(rot), 0.0)
+        euler_cols = [f'{prefix}rot_{a}' for a in ('roll', 'pitch', 'yaw')]
+        quat_cols = quaternion_columns(data.columns, prefix) or [f'{prefix}rot_quat_{a}' for a in 'xyzw']
+        for cols, values in ((euler_cols, euler), (quat_cols, quat)):
+            for j, col in enumerate(cols):
+                if col not in data:
+                    last = max(i for i, c in enumerate(data.columns) if c.startswith(prefix))
+                    data.insert(last + 1, col, 0.0)
+                data[col] = values[:, j]
+    return data
+
+
+def main(argv=None):
+    import argparse
+    import pandas as pd
+    parser = argparse.ArgumentParser(description="Recompute tracker Euler/quaternion columns of a collection CSV in bulk.")
+    parser.add_argument('csv', help="training_data_*.csv (or any CSV with tracker pose columns)")
+    parser.add_argument('-o', '--out', help="output path (default: overwrite the input)")
+    args = parser.parse_args(argv)
+
+    data = pd.read_csv(args.csv)
+    prefixes = tracker_column_prefixes(data.columns)
+    if not prefixes:
+        print(f"No tracker pose columns in '{args.csv}'.")
+        return
+    recompute_rotation_columns(data)
+    out = args.out or args.csv
+    data.to_csv(out, index=False)
+    print(f"Recomputed rotation columns for {prefixes} ({len(data)} rows) -> '{out}'")
+
+
+if __name__ == '__main__':
+    main()
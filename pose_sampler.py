@@ -0,0 +1,131 @@
+import time
+import threading
+import numpy as np
+
+from ring_buffer import RingBuffer
+from pose_math import matrix_to_quaternion, quaternion_to_matrix, lerp, slerp
+
+# --- 설정 ---
+POSE_RATE_HZ = 500.0       # 트래커 포즈 샘플링 주기 (센서 프레임 속도와 무관하게 고정)
+POSE_RING_CAPACITY = 4096  # 샘플러 -> 조인 단계 링 버퍼 (500 Hz 기준 약 8 초)
+MAX_HISTORY = POSE_RING_CAPACITY  # 조인 단계가 보간용으로 들고 있는 샘플 상한 (메인 루프가 밀려도 프레임 시각을 덮도록)
+MAX_WAIT_PERIODS = 3       # 프레임 시각 이후의 샘플을 기다리는 최대 시간 (샘플링 주기 배수). 넘으면 마지막 포즈 유지
+
+
+def make_pose_dtype(num_trackers):
+    """샘플러 링 버퍼 한 행: 샘플 시각 + 트래커별 위치, 쿼터니언 (x, y, z, w), 유효 여부."""
+    return np.dtype([
+        ('host_time', '<f8'),                 # 포즈 조회 전후 time.time() 의 중간값 (센서 프레임 host_time 과 같은 시계)
+        ('pos', '<f8', (num_trackers, 3)),
+        ('quat', '<f8', (num_trackers, 4)),
+        ('valid', '?', (num_trackers,)),
+    ])
+
+
+class PoseSampler:
+    """
+    트래커 포즈를 고정 주기로 읽는 전용 스레드 + 센서 프레임 시각으로 포즈를 보간하는 조인 단계.
+
+    - 샘플러 스레드(생산자)는 POSE_RATE_HZ 로 모든 트래커를 한 번에 조회해 타임스탬프와 함께 링 버퍼에 기록
+      -> 메인 루프는 프레임마다 OpenVR 를 호출하지 않으므로 포즈 조회 지연이 센서 소비를 막지 않음
+    - join(times) (소비자, 메인 루프) 는 각 프레임 시각을 감싸는 두 샘플 사이를 위치는 선형 보간,
+      회전은 쿼터니언 slerp 로 보간 -> 라벨이 센서 프레임 시각에 맞춰짐
+    - 두 샘플 중 하나라도 유효하지 않으면 그 프레임의 포즈는 무효
+    """
+    def __init__(self, provider, tracker_ids, rate_hz=POSE_RATE_HZ, capacity=POSE_RING_CAPACITY, metrics=None):
+        self.provider = provider
+        self.tracker_ids = list(tracker_ids)
+        self.period = 1.0 / rate_hz
+        self.dtype = make_pose_dtype(len(self.tracker_ids))
+        self.ring = RingBuffer(capacity, self.dtype)
+        self._history = np.zeros(0, dtype=self.dtype)
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.late_ticks = 0   # 조회가 주기보다 오래 걸려 건너뛴 샘플링 시점 수
+        self.held_frames = 0  # 이후 샘플이 오지 않아 마지막 포즈를 그대로 쓴 프레임 수
+        # 포즈 조회 지연 (샘플러 스레드 전용 히스토그램, metrics.Metrics 를 줄 때만)
+        self._query_latency = metrics.histogram('pose_query') if metrics is not None else None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        row = np.zeros(1, dtype=self.dtype)
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            t0 = time.time()
+            matrices, valid = self.provider.get_pose_array(self.tracker_ids)
+            t1 = time.time()
+            row['host_time'] = 0.5 * (t0 + t1)
+            if self._query_latency is not None:
+                self._query_latency.observe(t1 - t0)
+            row['pos'] = matrices[:, :, 3]
+            row['quat'] = np.where(valid[:, None], matrix_to_quaternion(matrices), 0.0)
+            row['valid'] = valid
+            self.ring.write(row)
+            self.samples += 1
+
+            next_tick += self.period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # 밀린 시점은 몰아서 조회하지 않고 건너뜀
+                self.late_ticks += int(-delay / self.period)
+                next_tick = time.perf_counter()
+
+    def _update_history(self, timeout=0):
+        new = self.ring.read(timeout=timeout)
+        if len(new):
+            self._history = np.concatenate([self._history, new])[-MAX_HISTORY:]
+        return len(new)
+
+    def join(self, times, wait=True):
+        """
+        센서 프레임 시각 (N,) 에 맞춘 트래커 포즈 (N, T, 3, 4) 행렬과 (N, T) 유효 여부를 반환합니다.
+        wait=True 이면 가장 늦은 프레임 시각 이후의 샘플이 올 때까지 최대 MAX_WAIT_PERIODS 주기만큼 기다립니다.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        num_trackers = len(self.tracker_ids)
+        self._update_history()
+        if wait and len(times):
+            deadline = time.perf_counter() + MAX_WAIT_PERIODS * self.period
+            while not len(self._history) or self._history['host_time'][-1] < times.max():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                self._update_history(timeout=remaining)
+
+        poses = np.zeros((len(times), num_trackers, 3, 4))
+        if not len(self._history):
+            return poses, np.zeros((len(times), num_trackers), dtype=bool)
+
+        history = self._history
+        sample_times = history['host_time']
+        hi = np.minimum(np.searchsorted(sample_times, times, side='right'), len(history) - 1)
+        lo = np.maximum(hi - 1, 0)
+        span = sample_times[hi] - sample_times[lo]
+        alpha = np.clip(np.divide(times - sample_times[lo], span, out=np.zeros_like(times), where=span > 0), 0.0, 1.0)
+        self.held_frames += int(np.count_nonzero(times > sample_times[-1]))
+
+        alpha = np.broadcast_to(alpha[:, None], (len(times), num_trackers))
+        poses[:, :, :, 3] = lerp(history['pos'][lo], history['pos'][hi], alpha)
+        poses[:, :, :, :3] = quaternion_to_matrix(slerp(history['quat'][lo], history['quat'][hi], alpha))
+        valid = history['valid'][lo] & history['valid'][hi]
+        poses[~valid] = 0.0
+        # 프레임 시각은 단조 증가하므로 이번에 쓴 구간 이전의 샘플은 다시 필요 없음
+        if len(times):
+            self._history = history[lo.max():]
+        return poses, valid
+
+    def stats(self):
+        return {'samples': self.samples, 'late_ticks': self.late_ticks, 'held_frames': self.held_frames,
+                'ring_overflow': self.ring.overflow}
@@ -1,36 +1,31 @@
 import serial
 import numpy as np
 import time
-import os
 import threading
 import sys
+from frame_parser import FrameParser, SENSOR_IDS
+from grid_peaks import SensorGrid
+from patch_localizer import PatchLocalizer
+from patch_tracker import PatchTracker, MAX_TRACKS, DETECTION_THRESHOLD_UT
+from clock_sync import start_clock_stream, unwrap_counter
+from replay_serial import open_serial
+from calibration import open_calibration, BASELINE_FRAMES
+from terminal_heatmap import HeatmapRenderer
 
 # --- 설정 ---
 # Teensy가 연결된 COM 포트와 통신 속도를 설정합니다.
-ARDUINO_PORT = 'COM9'  
+ARDUINO_PORT = 'COM9'  # 'replay:<training_data CSV>' 로 지정하면 녹화 세션을 재생
 BAUD_RATE = 1000000
 TOTAL_SENSORS = 24
+LOCALIZE_METHOD = 'parabolic'  # 'cell' (센서 칸만), 'centroid', 'parabolic', 'dipole' (patch_localizer.py)
+REFRESH_HZ = 20  # 화면 갱신 주기 (수신/추적과 별도 스레드)
+FRAME_PERIOD_S = 0.01  # 타임스탬프 없는 펌웨어의 프레임 간격 (24 센서 스캔 약 10 ms)
+CALIBRATION = 'capture'  # 배경장 보정: 'capture' (시작 시 자석 없이 기준선 측정), 'calibration.json' 경로, None (보정 없음)
 
 # --- 전역 변수 ---
-# 추적할 패치 개수를 관리하는 변수
-num_patches_to_track = 1
 # 스레드 종료를 위한 이벤트
 stop_event = threading.Event()
 
-# --- 사용자 입력 처리 ---
-def input_listener():
-    """
-    사용자가 Enter 키를 누르는 것을 감지하는 스레드 함수.
-    """
-    global num_patches_to_track
-    while not stop_event.is_set():
-        input() # Enter 키 입력을 기다림
-        if num_patches_to_track < 3: # 최대 3개까지 추적
-            num_patches_to_track += 1
-            print(f"\n[Info] 추적할 패치 개수가 {num_patches_to_track}개로 변경되었습니다. 계속하려면 Enter를 누르세요.")
-        else:
-            print("\n[Info] 최대 3개까지만 추적할 수 있습니다.")
-
 # --- 센서 물리적 위치 설정 ---
 def initialize_sensor_positions():
     """
@@ -47,109 +42,50 @@ def initialize_sensor_positions():
     return layout
 
 # --- 데이터 처리 및 예측 ---
-def parse_serial_data(line, total_sensors):
+def parse_serial_data(lines, parser, clock_state):
     """
-    시리얼로 들어온 한 줄의 데이터를 파싱하여 센서 ID와 Z축 자기장 값을 딕셔너리로 반환합니다.
+    시리얼로 들어온 라인 묶음을 한 번에 파싱하여 (values (N, S, 3), status (N, S), 프레임 시각 (N,) s) 배치를 반환합니다.
+    프레임 시각은 Teensy micros() (타임스탬프 모드) 를 풀어 쓰고, 타임스탬프가 없는 펌웨어면 마지막 프레임을
+    수신 시각에 두고 앞 프레임을 FRAME_PERIOD_S 간격으로 거슬러 배치합니다. (한 배치가 같은 시각이면 칼만 필터 dt 가 0)
+    clock_state: micros 랩어라운드를 풀기 위한 [직전 원시 값, 랩 수] (호출마다 갱신). 프레임이 없으면 None.
     """
-    sensor_z_values = {}
-    parts = line.strip().split(',')
-    
-    expected_length = total_sensors * 4
-    if len(parts) != expected_length:
+    values, status, _, micros = parser.parse_timed(lines)
+    if len(values) == 0:
         return None
+    if micros[0] < 0:
+        return values, status, time.perf_counter() - FRAME_PERIOD_S * np.arange(len(values) - 1, -1, -1)
+    unwrapped, clock_state[1] = unwrap_counter(micros, clock_state[0], clock_state[1])
+    clock_state[0] = int(micros[-1])
+    return values, status, unwrapped * 1e-6
 
-    for i in range(0, len(parts), 4):
-        try:
-            sensor_id = parts[i]
-            z_val = float(parts[i+3])
-            sensor_z_values[sensor_id] = z_val
-        except (ValueError, IndexError):
-            continue
-            
-    return sensor_z_values
-
-def find_strongest_sensors(sensor_z_values, num_peaks, layout):
-    """
-    Z축 자기장 절대값이 가장 큰 센서들을 num_peaks 개수만큼 찾습니다.
-    한 번 찾은 피크 주변의 센서들은 다음 검색에서 제외합니다.
-    """
-    if not sensor_z_values:
-        return []
-
-    peaks = []
-    # 원본 데이터를 훼손하지 않기 위해 복사본 사용
-    search_space = sensor_z_values.copy()
-
-    for _ in range(num_peaks):
-        if not search_space:
-            break
-
-        # 현재 탐색 공간에서 가장 강한 센서 찾기
-        strongest_id = max(search_space, key=lambda k: abs(search_space[k]))
-        peaks.append(strongest_id)
-
-        # 찾은 센서와 그 주변 센서들을 다음 탐색 공간에서 제거
-        # 1. 찾은 센서의 위치(row, col) 찾기
-        peak_r, peak_c = -1, -1
-        for r, row_data in enumerate(layout):
-            if strongest_id in row_data:
-                peak_r, peak_c = r, row_data.index(strongest_id)
-                break
-        
-        # 2. 주변 센서 제거 (3x3 영역)
-        if peak_r != -1:
-            for r_offset in range(-1, 2):
-                for c_offset in range(-1, 2):
-                    r_idx, c_idx = peak_r + r_offset, peak_c + c_offset
-                    if 0 <= r_idx < len(layout) and 0 <= c_idx < len(layout[0]):
-                        sensor_to_remove = layout[r_idx][c_idx]
-                        if sensor_to_remove in search_space:
-                            del search_space[sensor_to_remove]
-    return peaks
-
-def display_grid(peak_sensors, layout, sensor_z_values):
+def display_grid(renderer, track_ids, states, grid, values, status, num_frames):
     """
-    감지된 피크들의 위치를 6x4 그리드에 숫자로 표시합니다.
+    추적 중인 패치를 가장 가까운 센서 칸에 ID 로 표시하도록 최신 프레임과 함께 렌더러에 넘깁니다.
+    (화면 출력은 렌더러 스레드가 REFRESH_HZ 로 하므로 여기서는 바로 반환)
+    track_ids: 확정 트랙 ID (M,), states: [x, y, vx, vy] (M, 4) (mm, mm/s), values/status: 최신 프레임 (S, 3), (S,)
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    rows, cols = grid.shape
+    col = np.clip(np.rint(states[:, 0] / grid.pitch_mm).astype(int), 0, cols - 1)
+    row = np.clip(rows - 1 - np.rint(states[:, 1] / grid.pitch_mm).astype(int), 0, rows - 1)
+    sensors = grid.cell_index[row, col]
 
-    # 그리드에 표시할 내용을 담을 2D 배열 초기화
-    grid_display = [['.' for _ in row] for row in layout]
-
-    # 각 피크의 위치를 숫자로 표시
-    for i, peak_id in enumerate(peak_sensors):
-        for r, row_data in enumerate(layout):
-            if peak_id in row_data:
-                c = row_data.index(peak_id)
-                grid_display[r][c] = str(i + 1)
-                break
-    
-    # 그리드 출력
-    print(f"--- Tracking {len(peak_sensors)} Patches ---")
-    for r in range(len(layout)):
-        row_str = "| " + " ".join(grid_display[r]) + " |"
-        print(row_str)
-    print("--------------------------")
-    
-    # 각 피크의 상세 정보 출력
-    for i, peak_id in enumerate(peak_sensors):
-        z_value = sensor_z_values.get(peak_id, 0)
-        print(f"Patch {i+1}: {peak_id} (Z: {z_value:.2f} uT)")
-    print("\nPress Enter to add another patch (max 3)...")
+    # 각 패치의 상세 정보
+    lines = [f"--- Tracking {len(track_ids)} Patches ---"]
+    for patch_id, (x, y, vx, vy), sensor in zip(track_ids, states, sensors):
+        z = f"{values[sensor, 2]:.2f}" if sensor >= 0 else "-"
+        lines.append(f"Patch {patch_id}: (X: {x:.1f} mm, Y: {y:.1f} mm, V: {vx:.0f}/{vy:.0f} mm/s, Z: {z} uT)")
+    marks = {int(sensor): f"#{patch_id}" for patch_id, sensor in zip(track_ids, sensors) if sensor >= 0}
+    renderer.update(values, status, num_frames, marks, lines)
 
 
 # --- 메인 실행 로직 ---
 def main():
     layout = initialize_sensor_positions()
     
-    # 사용자 입력을 받기 위한 스레드 시작
-    listener = threading.Thread(target=input_listener, daemon=True)
-    listener.start()
-    
     try:
-        ser = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
+        ser = open_serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
         print(f"{ARDUINO_PORT}에 연결되었습니다. Teensy 초기화 대기 중...")
-    except serial.SerialException as e:
+    except (serial.SerialException, OSError) as e:
         print(f"오류: {ARDUINO_PORT}에 연결할 수 없습니다. 포트 번호를 확인하세요. 오류: {e}")
         return
 
@@ -161,21 +97,53 @@ def main():
                 break
         except UnicodeDecodeError:
             continue
+    # 프레임마다 장치 시각을 받아 칼만 필터 예측 간격으로 사용
+    start_clock_stream(ser, 'ascii')
     
+    calibration = open_calibration(CALIBRATION, SENSOR_IDS[:TOTAL_SENSORS])
+    parser = FrameParser(SENSOR_IDS[:TOTAL_SENSORS], calibration=calibration)
+    grid = SensorGrid(layout, parser.sensor_ids)
+    localizer = PatchLocalizer(grid, LOCALIZE_METHOD)
+    tracker = PatchTracker()
+    renderer = HeatmapRenderer(grid, title=f"Patch Tracking ({LOCALIZE_METHOD})", refresh_hz=REFRESH_HZ)
+    clock_state = [None, 0]
+    baseline_batches = []
+    if calibration is not None and calibration.baseline is None:
+        print("배경장 기준선 측정 중... 센서 위에 패치를 두지 마세요.")
+    else:
+        renderer.start()
+    buffer = b''
     try:
         while not stop_event.is_set():
             if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8', 'ignore').strip()
-                
-                if not line.startswith("S_"):
+                # 쌓여 있는 라인을 모두 읽어 배치로 파싱하고, 화면에는 최신 프레임만 표시
+                buffer += ser.read(ser.in_waiting)
+                if b'\n' not in buffer:
                     continue
+                *raw_lines, buffer = buffer.split(b'\n')
+                lines = [l.decode('utf-8', 'ignore').strip() for l in raw_lines]
                 
-                sensor_z_values = parse_serial_data(line, TOTAL_SENSORS)
+                batch = parse_serial_data(lines, parser, clock_state)
                 
-                if sensor_z_values:
-                    global num_patches_to_track
-                    peak_ids = find_strongest_sensors(sensor_z_values, num_patches_to_track, layout)
-                    display_grid(peak_ids, layout, sensor_z_values)
+                if batch is not None and calibration is not None and calibration.baseline is None:
+                    # 처음 BASELINE_FRAMES 프레임 (보정 전 원시값) 은 기준선 측정에만 쓰고 위치 추정은 건너뜀
+                    baseline_batches.append(batch[:2])
+                    if sum(len(v) for v, _ in baseline_batches) >= BASELINE_FRAMES:
+                        calibration.capture(np.concatenate([v for v, _ in baseline_batches]),
+                                            np.concatenate([s for _, s in baseline_batches]))
+                        baseline_batches = []
+                        print("기준선 측정 완료. 패치 추적을 시작합니다.")
+                        renderer.start()
+                elif batch is not None:
+                    values, status, frame_times = batch
+                    # 배치의 모든 프레임에 대해 한 번에 피크 검출 (FAIL/R_FAIL 센서, 약한 피크 제외)
+                    peaks = grid.detect_peaks(values[:, :, 2], status, MAX_TRACKS, DETECTION_THRESHOLD_UT)
+                    # 피크 주변 3x3 이웃으로 센서 간격보다 세밀한 좌표 (MLP 없이 쓰는 빠른 위치 추정)
+                    positions = localizer.localize(values, status, peaks)
+                    # 프레임 순서대로 추적기에 넣어 패치 ID 유지 (새 패치는 자동으로 추가, 사라진 패치는 삭제)
+                    for t, detections in zip(frame_times, positions):
+                        track_ids, states = tracker.update(t, detections)
+                    display_grid(renderer, track_ids, states, grid, values[-1], status[-1], len(values))
 
             time.sleep(0.01)
 
@@ -183,6 +151,7 @@ def main():
         print("\n사용자에 의해 프로그램이 종료되었습니다.")
     finally:
         stop_event.set()
+        renderer.stop()
         ser.close()
         print("\n시리얼 포트 연결이 종료되었습니다.")
 
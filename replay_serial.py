@@ -0,0 +1,369 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from urllib.parse import parse_qsl
+import numpy as np
+import pandas as pd
+
+from frame_protocol import (TOTAL_SENSORS, STATUS_OK, STATUS_FAIL, STATUS_R_FAIL, BINARY_MODE_COMMAND,
+                            ASCII_MODE_COMMAND, ASCII_CLOCK_COMMAND, ASCII_CLOCK_PREFIX, encode_frames)
+from frame_parser import SENSOR_IDS, SENSOR_COLUMN_NAMES
+from session_recorder import MANIFEST_NAME, load_session
+
+# --- 설정 ---
+REPLAY_PREFIX = 'replay:'   # open_serial('replay:경로?speed=2&loop=1&mode=binary') 형식
+SIM_PREFIX = 'sim:'         # open_serial('sim:?patches=2&scale=5') -> sensor_simulator 의 합성 센서 배열
+START_DELAY = 0.1           # 포트를 연 뒤 "START" 를 보내기까지의 시간 (Teensy setup() 의 센서 초기화 대신)
+REPLAY_RATE_HZ = 100.0      # timestamp 컬럼이 없을 때의 프레임 속도
+MAX_SPEED_CHUNK = 64        # speed=0 (최대 속도) 에서 한 번에 보내는 프레임 수
+RX_BUFFER_SIZE = 1 << 20    # 수신 버퍼 크기. 실시간 재생 중 넘치면 OS 버퍼처럼 새 데이터를 버림
+
+
+def ascii_line_template(sensor_ids=SENSOR_IDS, status_row=None):
+    """
+    Mux.ino 의 Serial.println(dataBuffer) 와 같은 형식의 % 템플릿 (snprintf "%.2f", 줄 끝 \\r\\n).
+    status_row 를 주면 FAIL/R_FAIL 센서 자리는 토큰으로 고정되고 정상 센서 값만 % 인자로 받습니다.
+    """
+    fields = []
+    for k, sid in enumerate(sensor_ids):
+        code = STATUS_OK if status_row is None else status_row[k]
+        if code == STATUS_FAIL:
+            fields.append(f'{sid},FAIL,FAIL,FAIL')
+        elif code == STATUS_R_FAIL:
+            fields.append(f'{sid},R_FAIL,R_FAIL,R_FAIL')
+        else:
+            fields.append(f'{sid},%.2f,%.2f,%.2f')
+    return ','.join(fields) + '\r\n'
+
+
+ASCII_LINE = ascii_line_template()
+
+
+def encode_ascii_frames(values, status=None, seq=None, micros=None, sensor_ids=SENSOR_IDS):
+    """
+    (N, 센서 수 * 3) 센서 값 (+ (N, 센서 수) 상태 코드) 을 Mux.ino 의 ASCII 출력과 바이트 단위로 같은 문자열로 인코딩합니다.
+    값은 float32 로 맞춘 뒤 포맷 (펌웨어의 float -> double 승격 후 %.2f 와 동일), 실패 센서는 FAIL/R_FAIL 토큰.
+    seq/micros (N,) 를 주면 타임스탬프 모드('T')처럼 라인 앞에 "#seq,micros," 를 붙입니다.
+    상태 조합별 템플릿을 한 번만 만들어 두므로 고정된 FAIL 센서가 있어도 라인마다 필드를 조립하지 않습니다.
+    """
+    values = np.asarray(values, dtype=np.float32).reshape(len(values), -1)
+    base = ASCII_LINE if sensor_ids is SENSOR_IDS else ascii_line_template(sensor_ids)
+    templates = {}
+    lines = []
+    for i, row in enumerate(values.tolist()):
+        if status is None or not status[i].any():
+            lines.append(base % tuple(row))
+            continue
+        key = status[i].tobytes()
+        if key not in templates:
+            templates[key] = (ascii_line_template(sensor_ids, status[i]), np.repeat(status[i] == STATUS_OK, 3))
+        template, ok = templates[key]
+        lines.append(template % tuple(np.asarray(row)[ok].tolist()))
+    if seq is not None:
+        lines = [f'{ASCII_CLOCK_PREFIX}{q},{t},{line}' for q, t, line in zip(seq.tolist(), micros.tolist(), lines)]
+    return ''.join(lines).encode('ascii')
+
+
+def status_to_masks(status):
+    """(N, 24) 상태 코드 -> 바이너리 프레임의 (fail_mask, r_fail_mask) uint32 배열."""
+    bits = np.uint32(1) << np.arange(TOTAL_SENSORS, dtype=np.uint32)
+    fail = ((status == STATUS_FAIL) * bits).sum(axis=1, dtype=np.uint32)
+    r_fail = ((status == STATUS_R_FAIL) * bits).sum(axis=1, dtype=np.uint32)
+    return fail, r_fail
+
+
+def load_frames(path):
+    """
+    재생할 (timestamps (N,) 또는 None, 센서 값 (N, 72) float32, 상태 (N, 24) int8) 을 읽습니다.
+    training_data_*.csv 또는 session_recorder 세션 디렉토리를 지원합니다. NaN 값은 R_FAIL 로 재생합니다.
+    """
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME)):
+        columns, rows = load_session(path)
+        index = {name: j for j, name in enumerate(columns)}
+        values = rows[:, [index[c] for c in SENSOR_COLUMN_NAMES]].astype(np.float32)
+        timestamps = rows[:, index['timestamp']].astype(np.float64) if 'timestamp' in index else None
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = SENSOR_COLUMN_NAMES + (['timestamp'] if 'timestamp' in header else [])
+        data = pd.read_csv(path, usecols=usecols)
+        values = data[SENSOR_COLUMN_NAMES].to_numpy(dtype=np.float32)
+        timestamps = data['timestamp'].to_numpy(dtype=np.float64) if 'timestamp' in data else None
+    failed = np.isnan(values).reshape(len(values), TOTAL_SENSORS, 3).any(axis=2)
+    status = np.where(failed, STATUS_R_FAIL, 0).astype(np.int8)
+    values = np.nan_to_num(values, nan=0.0)
+    return timestamps, values, status
+
+
+class VirtualSerial:
+    """
+    Teensy(Mux.ino) 를 흉내 내는 가상 시리얼 포트의 공통 부분. pyserial Serial 에서 수집 스크립트가
+    쓰는 부분(read/readline/in_waiting/write/reset_input_buffer/close)과 같은 인터페이스를 가집니다.
+
+    - 연결 직후 "START\\r\\n" 를 보내고, 이후 하위 클래스의 _stream() 이 _emit() 으로 프레임 바이트를 내보냄
+      (ReplaySerial: 녹화 세션 재생, sensor_simulator.SimulatedSerial: 자기장 모델 합성)
+    - 'B' / 'A' / 'T' 를 write() 하면 펌웨어처럼 바이너리 / ASCII / 타임스탬프 ASCII 로 전환
+    - 실시간 전송 중 읽지 않아 수신 버퍼(RX_BUFFER_SIZE)가 넘치면 새 데이터를 버리고 overflow_bytes 로 집계
+      (block=True 로 보내는 최대 속도 모드는 버퍼에 여유가 생길 때까지 기다림)
+    """
+    def __init__(self, timeout=1.0, frame_mode='ascii', start_delay=START_DELAY):
+        self.timeout = timeout
+        self.start_delay = float(start_delay)
+        self._binary = frame_mode == 'binary'
+        self._ascii_clock = False
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.is_open = True
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.overflow_bytes = 0
+        self._producer = threading.Thread(target=self._produce, daemon=True)
+        self._producer.start()
+
+    # --- pyserial 호환 인터페이스 ---
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def read(self, size=1):
+        """size 바이트가 모이거나 timeout 이 지날 때까지 기다렸다가 최대 size 바이트를 반환합니다."""
+        return self._take(lambda buf: size if len(buf) >= size else -1, size)
+
+    def readline(self):
+        return self._take(lambda buf: buf.find(b'\n') + 1 or -1, None)
+
+    def _take(self, ready, limit):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                n = ready(self._buffer)
+                if n > 0 or not self.is_open:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if n <= 0:
+                n = len(self._buffer) if limit is None else min(limit, len(self._buffer))
+            data = bytes(self._buffer[:n])
+            del self._buffer[:n]
+            self._cond.notify_all()
+        return data
+
+    def write(self, data):
+        """호스트 -> Teensy 명령 처리 (Mux.ino 의 checkModeCommand 와 동일: 'B' 바이너리, 'A' ASCII, 'T' 타임스탬프 ASCII)."""
+        for c in bytes(data):
+            if c == BINARY_MODE_COMMAND[0]:
+                self._binary = True
+            elif c == ASCII_MODE_COMMAND[0]:
+                self._binary = False
+                self._ascii_clock = False
+            elif c == ASCII_CLOCK_COMMAND[0]:
+                self._binary = False
+                self._ascii_clock = True
+        return len(data)
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._buffer.clear()
+            self._cond.notify_all()
+
+    flushInput = reset_input_buffer
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._stop.set()
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+        if self._producer is not threading.current_thread():
+            self._producer.join(1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- 전송 ---
+    def _emit(self, data, block):
+        with self._cond:
+            if block:
+                while len(self._buffer) + len(data) > RX_BUFFER_SIZE and not self._stop.is_set():
+                    self._cond.wait(0.1)
+            elif len(self._buffer) + len(data) > RX_BUFFER_SIZE:
+                self.overflow_bytes += len(data)
+                return
+            self._buffer += data
+            self._cond.notify_all()
+
+    def _produce(self):
+        if self._stop.wait(self.start_delay):
+            return
+        self._emit(b'START\r\n', block=True)
+        self._stream()
+
+    def _stream(self):
+        raise NotImplementedError
+
+
+class ReplaySerial(VirtualSerial):
+    """
+    녹화된 세션을 Teensy(Mux.ino) 처럼 재생하는 가상 시리얼 포트.
+
+    - 기록된 프레임을 timestamp 간격 / speed 배속으로 전송 (speed=0: 최대 속도, 처리량 측정용)
+    - seq 는 0 부터, micros 는 timestamp 간격 / speed 로 진행
+    """
+    def __init__(self, path, speed=1.0, loop=False, timeout=1.0, frame_mode='ascii', start_delay=START_DELAY):
+        self.path = path
+        self.speed = float(speed)
+        self.loop = bool(loop)
+        timestamps, self.values, self.status = load_frames(path)
+        if timestamps is None or len(timestamps) < 2:
+            timestamps = np.arange(len(self.values)) / REPLAY_RATE_HZ
+        self.offsets = timestamps - timestamps[0]
+        self.period = float(np.median(np.diff(self.offsets))) if len(self.offsets) > 1 else 1.0 / REPLAY_RATE_HZ
+        super().__init__(timeout, frame_mode, start_delay)
+
+    def _encode(self, start, stop, seq, micros_base):
+        seq = (seq + np.arange(stop - start)) % (1 << 32)
+        # 장치 시계는 재생 시각을 따름 (speed 배속이면 기록 간격 / speed, 최대 속도 재생은 기록 간격 그대로)
+        scale = 1e6 / self.speed if self.speed else 1e6
+        micros = (micros_base + (self.offsets[start:stop] * scale).astype(np.uint64)) % (1 << 32)
+        if not self._binary:
+            if not self._ascii_clock:
+                seq = micros = None
+            return encode_ascii_frames(self.values[start:stop], self.status[start:stop], seq, micros)
+        fail, r_fail = status_to_masks(self.status[start:stop])
+        return encode_frames(seq, micros, self.values[start:stop], fail, r_fail)
+
+    def _stream(self):
+        n = len(self.values)
+        seq = 0
+        micros_base = 0
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            i = 0
+            while i < n and not self._stop.is_set():
+                if self.speed:
+                    # 지금까지 도착했어야 할 프레임을 한 번에 보냄
+                    elapsed = (time.perf_counter() - t0) * self.speed
+                    j = int(np.searchsorted(self.offsets, elapsed, side='right'))
+                    if j == i:
+                        time.sleep(min((self.offsets[i] - elapsed) / self.speed, 0.01))
+                        continue
+                else:
+                    j = min(i + MAX_SPEED_CHUNK, n)
+                data = self._encode(i, j, seq, micros_base)
+                self._emit(data, block=not self.speed)
+                self.frames_sent += j - i
+                self.bytes_sent += len(data)
+                seq += j - i
+                i = j
+            if not self.loop:
+                break
+            micros_base += int((self.offsets[-1] + self.period) * (1e6 / self.speed if self.speed else 1e6))
+
+
+class PtyPortMixin:
+    """
+    VirtualSerial 의 출력을 의사 터미널(pty)로 내보냅니다. (Linux/macOS)
+    slave_name (예: /dev/pts/5) 을 수집 스크립트의 ARDUINO_PORT 로 지정하면 코드 수정 없이 pyserial 로 열 수 있습니다.
+    가상 포트를 별도 프로세스에서 돌리므로 수집 스크립트와 GIL 을 나눠 쓰지 않습니다.
+    """
+    def __init__(self, *args, **kwargs):
+        import tty
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.slave_name = os.ttyname(self.slave_fd)
+        super().__init__(*args, **kwargs)
+        self._command_reader = threading.Thread(target=self._read_commands, daemon=True)
+        self._command_reader.start()
+
+    def _emit(self, data, block):
+        view = memoryview(data)
+        while view and not self._stop.is_set():
+            try:
+                written = os.write(self.master_fd, view)
+                view = view[written:]
+            except BlockingIOError:
+                if not block:
+                    # 읽는 쪽이 없거나 느림: 실제 UART 처럼 남은 데이터는 버림
+                    self.overflow_bytes += len(view)
+                    return
+                time.sleep(0.001)
+
+    def _read_commands(self):
+        while not self._stop.is_set():
+            try:
+                self.write(os.read(self.master_fd, 64))
+            except BlockingIOError:
+                time.sleep(0.01)
+            except OSError:
+                break
+
+    def close(self):
+        super().close()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+
+class PtyReplay(PtyPortMixin, ReplaySerial):
+    pass
+
+
+def open_serial(port, baudrate=1000000, timeout=1.0):
+    """
+    수집/추론 스크립트용 포트 열기. port 가 'replay:<세션 경로>[?speed=..&loop=1&mode=binary]' 이면
+    ReplaySerial 을, 'sim:[?patches=..&scale=..]' 이면 sensor_simulator.SimulatedSerial 을,
+    아니면 pyserial Serial 을 반환합니다.
+    """
+    if port.startswith(REPLAY_PREFIX):
+        path, _, query = port[len(REPLAY_PREFIX):].partition('?')
+        params = dict(parse_qsl(query))
+        return ReplaySerial(path, speed=float(params.get('speed', 1.0)),
+                            loop=params.get('loop', '0') not in ('0', 'false', ''),
+                            timeout=timeout, frame_mode=params.get('mode', 'ascii'))
+    if port.startswith(SIM_PREFIX):
+        from sensor_simulator import open_simulator
+        return open_simulator(port, timeout)
+    import serial
+    return serial.Serial(port, baudrate, timeout=timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded session as a virtual Teensy serial port.")
+    parser.add_argument('session', help="training_data_*.csv or session_recorder directory")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed factor (0 = as fast as possible)")
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--mode', default='ascii', choices=('ascii', 'binary'),
+                        help="initial frame mode (the client can switch with 'B'/'A'/'T' like the firmware)")
+    args = parser.parse_args(argv)
+
+    replay = PtyReplay(args.session, speed=args.speed, loop=args.loop, frame_mode=args.mode)
+    print(f"Replaying {len(replay.values)} frames from '{args.session}' on {replay.slave_name}")
+    print(f"Set ARDUINO_PORT = '{replay.slave_name}' in the collection script. Ctrl+C to stop.")
+    try:
+        last_frames, last_time = 0, time.perf_counter()
+        while replay._producer.is_alive():
+            time.sleep(1.0)
+            now = time.perf_counter()
+            rate = (replay.frames_sent - last_frames) / (now - last_time)
+            last_frames, last_time = replay.frames_sent, now
+            print(f"\rframes {replay.frames_sent} ({rate:.0f}/s), bytes {replay.bytes_sent}, "
+                  f"dropped bytes {replay.overflow_bytes}", end='')
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.close()
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """
+    미리 할당된 numpy 배열 위의 단일 생산자 / 단일 소비자(SPSC) 링 버퍼.
+
+    - 쓰기 인덱스(_head)는 생산자만, 읽기 인덱스(_tail)는 소비자만 갱신하므로 데이터 경로에 락이 없음
+      (파이썬 int 대입은 GIL 하에서 원자적)
+    - 생산자는 write() 한 번에 여러 행을 넣고 이벤트를 한 번만 알림 -> 소비자는 배치당 한 번 깨어남
+    - 가득 차면 새로 들어온 행을 버리고 overflow 로 집계 (소비자 소유의 _tail 은 건드리지 않음)
+    """
+    def __init__(self, capacity, dtype, row_shape=()):
+        self.capacity = int(capacity)
+        self._data = np.zeros((self.capacity,) + tuple(row_shape), dtype=dtype)
+        self._head = 0  # 지금까지 쓴 행 수 (생산자 전용)
+        self._tail = 0  # 지금까지 읽은 행 수 (소비자 전용)
+        self._data_ready = threading.Event()
+        self.overflow = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def write(self, rows):
+        """행 배열을 한 번에 기록하고 실제로 기록한 행 수를 반환합니다. (생산자 스레드 전용)"""
+        n = len(rows)
+        if n == 0:
+            return 0
+        free = self.capacity - (self._head - self._tail)
+        if n > free:
+            self.overflow += n - free
+            rows = rows[:free]
+            n = free
+        if n:
+            start = self._head % self.capacity
+            first = min(n, self.capacity - start)
+            self._data[start:start + first] = rows[:first]
+            if first < n:
+                self._data[:n - first] = rows[first:]
+            self._head += n
+            self.high_water = max(self.high_water, self._head - self._tail)
+        self._data_ready.set()
+        return n
+
+    def read(self, max_rows=None, timeout=None):
+        """
+        쌓인 행을 최대 max_rows 개까지 복사해서 반환합니다. (소비자 스레드 전용)
+        비어 있으면 timeout 초 동안 블로킹하며 기다리고, 그래도 없으면 빈 배열을 반환합니다.
+        """
+        self._data_ready.clear()
+        if self._head == self._tail and timeout != 0:
+            self._data_ready.wait(timeout)
+
+        n = self._head - self._tail
+        if max_rows is not None:
+            n = min(n, max_rows)
+        start = self._tail % self.capacity
+        first = min(n, self.capacity - start)
+        if first == n:
+            out = self._data[start:start + n].copy()
+        else:
+            out = np.concatenate([self._data[start:], self._data[:n - first]])
+        self._tail += n
+        return out
+
+    def stats(self):
+        """버퍼 상태 요약 (용량, 현재 적재량, 누적 쓰기/읽기, 오버플로우, 최고 수위)."""
+        return {
+            'capacity': self.capacity,
+            'size': len(self),
+            'written': self._head,
+            'read': self._tail,
+            'overflow': self.overflow,
+            'high_water': self.high_water,
+        }
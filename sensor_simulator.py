@@ -0,0 +1,263 @@
+import sys
+import time
+import argparse
+from urllib.parse import parse_qsl
+import numpy as np
+
+from frame_protocol import TOTAL_SENSORS, STATUS_OK, STATUS_FAIL, STATUS_R_FAIL, FRAME_SIZE, encode_frames
+from grid_peaks import SENSOR_PITCH
+from replay_serial import (SIM_PREFIX, START_DELAY, VirtualSerial, PtyPortMixin, encode_ascii_frames,
+                           status_to_masks)
+
+# --- 설정 ---
+NUM_MUXES = 3                 # 현재 보드: TCA9548A 3 개 (0x70 ~ 0x72)
+SENSORS_PER_MUX = 8           # 멀티플렉서 채널 수 (TCA9548A 최대 8)
+FIRST_MUX_ADDRESS = 0x70
+CONVERSION_US = 350.0         # MLX90393 단일 측정 변환 시간 (us)
+I2C_OVERHEAD_US = 60.0        # 센서 하나당 채널 선택 + 측정 명령 + 결과 읽기 I2C 시간 (1 MHz 클럭)
+TX_BYTES_PER_S = 10e6         # Teensy USB 시리얼 출력 속도 (프레임 전송이 다음 스캔을 늦추는 정도)
+ASCII_BYTES_PER_SENSOR = 31   # "S_70_0,-123.45,67.89,-10.11," 정도
+NOISE_UT = 1.5                # 축별 측정 잡음 표준편차 (uT)
+LSB_UT = (0.200, 0.200, 0.323)  # MLX90393 GAIN_1_33X, RES 0 의 축별 분해능 (uT/LSB). 16 비트 범위에서 포화
+BACKGROUND_UT = (20.0, 0.0, -45.0)  # 지자기 + 주변 배경 (uT)
+OFFSET_SPREAD_UT = 5.0        # 센서별 고정 오프셋 표준편차 (uT)
+MAGNET_MOMENT = 0.05          # 패치 자석 쌍극자 모멘트 (A·m², 지름 5 mm x 2 mm N52 정도), 센서 쪽(-z)을 향함
+MAGNET_HEIGHT = 0.012         # 센서 면에서 자석 중심까지 높이 (m). 센서 바로 위에서도 Z 축이 포화되지 않는 정도
+MOTION_PERIOD = 4.0           # 패치 리사주 궤적 주기 (s)
+MU0_OVER_4PI = 1e-7
+MAX_CHUNK = 64                # 한 번에 생성/전송하는 최대 프레임 수
+COUNTER_WRAP = 1 << 32
+
+
+def sensor_ids(num_muxes=NUM_MUXES, sensors_per_mux=SENSORS_PER_MUX):
+    """Mux.ino 출력 순서 (MUX 순, 채널 순) 의 센서 ID. 기본값은 frame_parser.SENSOR_IDS 와 같음."""
+    return [f"S_{FIRST_MUX_ADDRESS + m:x}_{c}" for m in range(num_muxes) for c in range(sensors_per_mux)]
+
+
+def sensor_layout(num_muxes=NUM_MUXES, sensors_per_mux=SENSORS_PER_MUX):
+    """
+    position.py 의 initialize_sensor_positions 배치를 일반화한 센서 ID 격자 (행 리스트, 위쪽 행부터).
+    MUX 하나가 두 열을 차지하고 (마지막 MUX 가 왼쪽), 왼쪽 열은 위에서부터 채널 7~4, 오른쪽 열은 3~0.
+    """
+    if sensors_per_mux % 2 or not 0 < sensors_per_mux <= 8:
+        raise ValueError("sensors_per_mux must be an even number between 2 and 8.")
+    rows = sensors_per_mux // 2
+    layout = [[None] * (2 * num_muxes) for _ in range(rows)]
+    for m in range(num_muxes):
+        col = 2 * (num_muxes - 1 - m)
+        for r in range(rows):
+            layout[r][col] = f"S_{FIRST_MUX_ADDRESS + m:x}_{rows + rows - 1 - r}"
+            layout[r][col + 1] = f"S_{FIRST_MUX_ADDRESS + m:x}_{rows - 1 - r}"
+    return layout
+
+
+def sensor_positions(ids, layout, pitch=SENSOR_PITCH):
+    """센서 ID 순서대로 (S, 3) 좌표 (m). 격자 왼쪽 아래 센서가 원점, 센서 면은 z = 0."""
+    cell = {sid: (r, c) for r, row in enumerate(layout) for c, sid in enumerate(row)}
+    rows = len(layout)
+    return np.array([[cell[sid][1] * pitch, (rows - 1 - cell[sid][0]) * pitch, 0.0] for sid in ids])
+
+
+def dipole_field(sensor_pos, magnet_pos, moment):
+    """
+    자기 쌍극자 장 B = mu0/4pi * (3 (m·r^) r^ - m) / |r|^3 (uT).
+    sensor_pos, magnet_pos, moment 는 (..., 3) 로 브로드캐스트됩니다.
+    """
+    r = sensor_pos - magnet_pos
+    dist = np.linalg.norm(r, axis=-1, keepdims=True)
+    r_hat = r / dist
+    m_dot_r = np.sum(moment * r_hat, axis=-1, keepdims=True)
+    return MU0_OVER_4PI * (3.0 * m_dot_r * r_hat - moment) / dist ** 3 * 1e6
+
+
+class HallArraySimulator:
+    """
+    홀 센서 배열 + 자석 패치 모델. 포트와 무관하게 프레임 (스캔 시작 시각, 값, 상태) 만 생성합니다.
+
+    - 센서 배치: sensor_layout (position.py 격자의 일반화), 간격 SENSOR_PITCH
+    - 패치: 높이 MAGNET_HEIGHT 에서 격자 위를 리사주 궤적으로 움직이는 쌍극자 (패치마다 위상이 다름)
+    - Mux.ino 타이밍: 센서를 MUX/채널 순서로 하나씩 읽으므로 센서 k 는 스캔 시작 후
+      k * (conversion_us + I2C_OVERHEAD_US) / scale 에 측정 -> 움직이는 자석은 센서마다 다른 위치에서 보임
+      프레임 주기 = 센서 수 * 센서당 시간 + 프레임 전송 시간
+    - MLX90393: 배경 + 센서별 오프셋 + 가우시안 잡음, 축별 LSB 양자화와 16 비트 포화
+    - fail_rate: setup() 에서 연결 실패한 센서 비율 (세션 내내 FAIL), r_fail_rate: 측정마다의 R_FAIL 확률
+    - scale: 센서당 시간을 줄여 프레임 속도를 scale 배로 (현재 보드보다 빠른 구성의 부하 시험용)
+    """
+    def __init__(self, num_patches=1, num_muxes=NUM_MUXES, sensors_per_mux=SENSORS_PER_MUX,
+                 conversion_us=CONVERSION_US, noise_ut=NOISE_UT, fail_rate=0.0, r_fail_rate=0.0,
+                 scale=1.0, seed=0):
+        self.sensor_ids = sensor_ids(num_muxes, sensors_per_mux)
+        self.layout = sensor_layout(num_muxes, sensors_per_mux)
+        self.positions = sensor_positions(self.sensor_ids, self.layout)
+        self.num_sensors = len(self.sensor_ids)
+        self.num_patches = int(num_patches)
+        self.noise_ut = float(noise_ut)
+        self.r_fail_rate = float(r_fail_rate)
+        self.rng = np.random.default_rng(seed)
+        self.sensor_time = (conversion_us + I2C_OVERHEAD_US) * 1e-6 / scale
+        self.sample_offsets = np.arange(self.num_sensors) * self.sensor_time
+        self.connected = self.rng.random(self.num_sensors) >= fail_rate
+        self.offsets_ut = np.asarray(BACKGROUND_UT) + self.rng.normal(0.0, OFFSET_SPREAD_UT, (self.num_sensors, 3))
+        self.lsb = np.asarray(LSB_UT)
+        self.limit = 32767 * self.lsb
+        self.moment = np.array([0.0, 0.0, -MAGNET_MOMENT])
+        extent = self.positions.max(axis=0)
+        self._center = extent / 2
+        self._amplitude = extent / 2 * 0.8
+
+    def frame_period(self, binary):
+        frame_bytes = FRAME_SIZE if binary else self.num_sensors * ASCII_BYTES_PER_SENSOR
+        return self.num_sensors * self.sensor_time + frame_bytes / TX_BYTES_PER_S
+
+    def patch_positions(self, times):
+        """times (...) 에서의 패치 자석 위치 (..., P, 3) (m). 위치 추정 결과와 비교할 정답으로도 씁니다."""
+        t = np.asarray(times, dtype=np.float64)[..., None]
+        phase = 2 * np.pi * np.arange(self.num_patches) / max(self.num_patches, 1)
+        w = 2 * np.pi / MOTION_PERIOD
+        pos = np.empty(t.shape[:-1] + (self.num_patches, 3))
+        pos[..., 0] = self._center[0] + self._amplitude[0] * np.sin(w * t + phase)
+        pos[..., 1] = self._center[1] + self._amplitude[1] * np.sin(2 * w * t + 1.3 * phase)
+        pos[..., 2] = MAGNET_HEIGHT
+        return pos
+
+    def generate(self, scan_starts):
+        """
+        스캔 시작 시각 (N,) (s) 의 프레임을 생성합니다.
+        반환: values (N, 센서 수 * 3) float32 (FAIL/R_FAIL 센서는 0), status (N, 센서 수) int8
+        """
+        times = np.asarray(scan_starts)[:, None] + self.sample_offsets  # (N, S) 센서별 측정 시각
+        field = dipole_field(self.positions[:, None, :], self.patch_positions(times), self.moment).sum(axis=2)
+        field += self.offsets_ut + self.rng.normal(0.0, self.noise_ut, field.shape)
+        field = np.clip(np.round(field / self.lsb) * self.lsb, -self.limit, self.limit)
+
+        status = np.where(self.connected, STATUS_OK, STATUS_FAIL).astype(np.int8)
+        status = np.broadcast_to(status, times.shape).copy()
+        if self.r_fail_rate:
+            status[(self.rng.random(times.shape) < self.r_fail_rate) & self.connected] = STATUS_R_FAIL
+        field[status != STATUS_OK] = 0.0
+        return field.reshape(len(times), -1).astype(np.float32), status
+
+
+class SimulatedSerial(VirtualSerial):
+    """
+    HallArraySimulator 의 프레임을 Mux.ino 와 같은 형식(ASCII / 타임스탬프 ASCII / 바이너리)으로 내보내는 가상 포트.
+    realtime=False 이면 수신 버퍼에 여유가 생기는 대로 최대 속도로 생성합니다. (호스트 처리량 상한 측정)
+    drift_ppm 만큼 장치 micros() 를 빠르게/느리게 흘려 clock_sync 의 드리프트 추정도 시험할 수 있습니다.
+    바이너리 프레임 구조는 센서 24 개 고정이므로 센서 수가 다르면 'B' 명령을 무시하고 ASCII 로 보냅니다.
+    """
+    def __init__(self, simulator, realtime=True, drift_ppm=0.0, timeout=1.0, frame_mode='ascii',
+                 start_delay=START_DELAY):
+        self.sim = simulator
+        self.realtime = bool(realtime)
+        self.clock_rate = 1.0 + drift_ppm * 1e-6
+        self.device_time = 0.0
+        self.max_backlog = 0  # 실시간 모드에서 보내야 했는데 아직 생성하지 못한 최대 프레임 수 (시뮬레이터 자체 한계)
+        super().__init__(timeout, frame_mode, start_delay)
+
+    def _binary_ok(self):
+        return self._binary and self.sim.num_sensors == TOTAL_SENSORS
+
+    def _stream(self):
+        seq = 0
+        t0 = time.perf_counter()
+        while not self._stop.is_set():
+            binary = self._binary_ok()
+            period = self.sim.frame_period(binary)
+            if self.realtime:
+                # 스캔과 전송이 끝난 프레임만 보냄
+                due = int((time.perf_counter() - t0 - self.device_time) / period)
+                if due <= 0:
+                    time.sleep(min(period, 0.01))
+                    continue
+                self.max_backlog = max(self.max_backlog, due)
+                n = min(due, MAX_CHUNK)
+            else:
+                n = MAX_CHUNK
+            scan_starts = self.device_time + np.arange(n) * period
+            values, status = self.sim.generate(scan_starts)
+            seqs = (seq + np.arange(n)) % COUNTER_WRAP
+            micros = (scan_starts * self.clock_rate * 1e6).astype(np.int64) % COUNTER_WRAP
+            if binary:
+                fail, r_fail = status_to_masks(status)
+                data = encode_frames(seqs, micros, values, fail, r_fail)
+            elif self._ascii_clock:
+                data = encode_ascii_frames(values, status, seqs, micros, sensor_ids=self.sim.sensor_ids)
+            else:
+                data = encode_ascii_frames(values, status, sensor_ids=self.sim.sensor_ids)
+            self._emit(data, block=not self.realtime)
+            self.frames_sent += n
+            self.bytes_sent += len(data)
+            self.device_time += n * period
+            seq += n
+
+
+class PtySimulator(PtyPortMixin, SimulatedSerial):
+    pass
+
+
+SIM_PARAMS = {
+    # 쿼리 키: (HallArraySimulator 인자, 변환 함수)
+    'patches': ('num_patches', int),
+    'muxes': ('num_muxes', int),
+    'sensors_per_mux': ('sensors_per_mux', int),
+    'conversion_us': ('conversion_us', float),
+    'noise_ut': ('noise_ut', float),
+    'fail': ('fail_rate', float),
+    'r_fail': ('r_fail_rate', float),
+    'scale': ('scale', float),
+    'seed': ('seed', int),
+}
+
+
+def open_simulator(port, timeout=1.0):
+    """'sim:?patches=2&scale=5&fail=0.05&r_fail=0.001&drift_ppm=30&realtime=0&mode=binary' 형식의 포트를 엽니다."""
+    params = dict(parse_qsl(port[len(SIM_PREFIX):].partition('?')[2]))
+    kwargs = {name: cast(params[key]) for key, (name, cast) in SIM_PARAMS.items() if key in params}
+    return SimulatedSerial(HallArraySimulator(**kwargs),
+                           realtime=params.get('realtime', '1') not in ('0', 'false', ''),
+                           drift_ppm=float(params.get('drift_ppm', 0.0)),
+                           timeout=timeout, frame_mode=params.get('mode', 'ascii'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate the hall-sensor array as a virtual Teensy serial port.")
+    parser.add_argument('--patches', type=int, default=1)
+    parser.add_argument('--muxes', type=int, default=NUM_MUXES)
+    parser.add_argument('--sensors-per-mux', type=int, default=SENSORS_PER_MUX)
+    parser.add_argument('--conversion-us', type=float, default=CONVERSION_US)
+    parser.add_argument('--noise-ut', type=float, default=NOISE_UT)
+    parser.add_argument('--fail', type=float, default=0.0, help="fraction of sensors missing at startup")
+    parser.add_argument('--r-fail', type=float, default=0.0, help="per-reading R_FAIL probability")
+    parser.add_argument('--scale', type=float, default=1.0, help="frame-rate multiplier over the modelled board")
+    parser.add_argument('--drift-ppm', type=float, default=0.0)
+    parser.add_argument('--max-speed', action='store_true', help="generate as fast as the reader consumes")
+    parser.add_argument('--mode', default='ascii', choices=('ascii', 'binary'),
+                        help="initial frame mode (the client can switch with 'B'/'A'/'T' like the firmware)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sim = HallArraySimulator(args.patches, args.muxes, args.sensors_per_mux, args.conversion_us, args.noise_ut,
+                             args.fail, args.r_fail, args.scale, args.seed)
+    port = PtySimulator(sim, realtime=not args.max_speed, drift_ppm=args.drift_ppm, frame_mode=args.mode)
+    print(f"{sim.num_sensors} sensors ({int(np.sum(~sim.connected))} FAIL), {sim.num_patches} patch(es), "
+          f"{1.0 / sim.frame_period(args.mode == 'binary'):.0f} frames/s in {args.mode} mode on {port.slave_name}")
+    print(f"Set ARDUINO_PORT = '{port.slave_name}' in the collection script. Ctrl+C to stop.")
+    try:
+        last_frames, last_time = 0, time.perf_counter()
+        while port._producer.is_alive():
+            time.sleep(1.0)
+            now = time.perf_counter()
+            rate = (port.frames_sent - last_frames) / (now - last_time)
+            last_frames, last_time = port.frames_sent, now
+            print(f"\rframes {port.frames_sent} ({rate:.0f}/s), bytes {port.bytes_sent}, "
+                  f"dropped bytes {port.overflow_bytes}, generator backlog {port.max_backlog}", end='')
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        port.close()
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import time
+import numpy as np
+
+from frame_protocol import TOTAL_SENSORS, SYNC_BYTES, FrameDecoder, frame_status
+from frame_parser import FrameParser
+from ring_buffer import RingBuffer
+
+# --- 리더 스레드 -> 메인 루프로 전달되는 파싱 완료 프레임 한 행 ---
+FRAME_ROW_DTYPE = np.dtype([
+    ('host_time', '<f8'),                    # 프레임을 수신한 호스트 시각 (time.time())
+    ('values', '<f4', (TOTAL_SENSORS * 3,)),  # 센서 순서대로 x, y, z (실패한 센서는 0)
+    ('status', 'i1', (TOTAL_SENSORS,)),       # frame_protocol.STATUS_* 코드
+    ('seq', '<i8'),                          # 장치 프레임 순번 (타임스탬프 없는 ASCII 펌웨어는 -1)
+    ('micros', '<i8'),                       # 장치 스캔 시작 시각 micros() (32비트, 랩어라운드 전 값. 없으면 -1)
+])
+
+RING_CAPACITY = 1 << 16  # 약 65000 프레임 (1 Mbaud 기준 수 분 분량)
+READ_SIZE = 8192
+# 바이너리 모드에서 이만큼 받는 동안 동기 워드가 한 번도 없으면 'B' 를 모르는 기존 ASCII 펌웨어로 보고 전환
+BINARY_DETECT_BYTES = 4096
+
+
+def make_frame_ring(capacity=RING_CAPACITY):
+    """시리얼 리더와 메인 루프 사이에서 쓰는 프레임 링 버퍼를 생성합니다."""
+    return RingBuffer(capacity, FRAME_ROW_DTYPE)
+
+
+def serial_reader(ser, ring, stop_event, frame_mode='ascii', metrics=None, calibration=None):
+    """
+    시리얼 리더 스레드 함수.
+    쌓인 바이트를 한 번에 읽고(비어 있으면 포트 타임아웃까지 블로킹) ASCII/바이너리 프레임을
+    배치로 디코딩해 링 버퍼에 한 번에 기록합니다. 메인 루프는 read() 한 번으로 배치 전체를 받습니다.
+    metrics (metrics.Metrics) 를 주면 read 바이트, 파싱/거부 프레임, FAIL 센서, 링 적재량을 read 마다 집계합니다.
+    calibration (calibration.SensorCalibration) 을 주면 링에 넣기 전에 배경 기준선을 뺍니다. ASCII 는 FrameParser 가,
+    바이너리는 디코딩 직후 같은 객체로 처리. 기준선은 리더가 도는 중에 calibration.capture() 로 채워도 됩니다.
+    바이너리 모드인데 처음 BINARY_DETECT_BYTES 바이트 안에 동기 워드가 없으면 경고 후 ASCII 로 전환합니다.
+    """
+    print("시리얼 리더 스레드 시작.")
+    parser = FrameParser(fill_value=0.0, calibration=calibration)
+    decoder = FrameDecoder()
+    buffer = b''
+    probe = b'' if frame_mode == 'binary' else None  # 동기 워드를 확인하기 전까지 받은 바이트
+    if metrics is not None:
+        bytes_read = metrics.counter('bytes')
+        frames_parsed = metrics.counter('frames')
+        frames_rejected = metrics.counter('rejected')  # ASCII: 길이 불일치/깨진 라인, 바이너리: CRC 오류
+        fail_sensors = metrics.counter('fail_sensors')
+        queue_depth = metrics.histogram('queue', scale=1)
+        rejected_before = 0
+    while not stop_event.is_set():
+        try:
+            data = ser.read(min(max(ser.in_waiting, 1), READ_SIZE))
+        except (OSError, TypeError):
+            break
+        if not data:
+            continue
+        now = time.time()
+
+        if probe is not None:
+            probe += data
+            if SYNC_BYTES in probe:
+                probe = None
+            elif len(probe) >= BINARY_DETECT_BYTES:
+                # 동기 워드(0xA5 0x5A)는 ASCII 출력에 나올 수 없음 -> 지금까지 받은 바이트를 ASCII 로 다시 파싱
+                print(f"경고: {len(probe)} 바이트 동안 바이너리 동기 워드가 없습니다. "
+                      "펌웨어가 바이너리 모드를 지원하지 않는 것으로 보고 ASCII 모드로 전환합니다.")
+                frame_mode = 'ascii'
+                data, probe = probe, None
+
+        if frame_mode == 'binary':
+            frames = decoder.feed(data)
+            rows = np.empty(len(frames), dtype=FRAME_ROW_DTYPE)
+            rows['values'] = frames['values']
+            rows['status'] = frame_status(frames)
+            rows['seq'] = frames['seq']
+            rows['micros'] = frames['micros']
+            if calibration is not None:
+                calibration.apply(rows['values'].reshape(len(rows), TOTAL_SENSORS, 3), rows['status'])
+        else:
+            buffer += data
+            if b'\n' not in data:
+                continue
+            *raw_lines, buffer = buffer.split(b'\n')
+            lines = [l.decode('utf-8', 'ignore').strip() for l in raw_lines]
+            values, status, seq, micros = parser.parse_timed([l for l in lines if l])
+            rows = np.empty(len(values), dtype=FRAME_ROW_DTYPE)
+            rows['values'] = values.reshape(len(values), TOTAL_SENSORS * 3)
+            rows['status'] = status
+            rows['seq'] = seq
+            rows['micros'] = micros
+
+        rows['host_time'] = now
+        ring.write(rows)
+
+        if metrics is not None:
+            bytes_read.add(len(data))
+            frames_parsed.add(len(rows))
+            rejected = decoder.crc_errors if frame_mode == 'binary' else parser.lines_rejected
+            frames_rejected.add(rejected - rejected_before)
+            rejected_before = rejected
+            fail_sensors.add(int(np.count_nonzero(rows['status'])))
+            queue_depth.observe(len(ring))
+
+    if frame_mode == 'binary':
+        print(f"시리얼 리더 스레드 종료. (프레임 {decoder.frames_decoded}개, CRC 오류 {decoder.crc_errors}개)")
+    else:
+        print(f"시리얼 리더 스레드 종료. (프레임 {parser.frames_parsed}개, 길이 불일치 등으로 건너뛴 라인 {parser.lines_rejected}개)")
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# --- 설정 ---
+CHUNK_ROWS = 10000      # 세그먼트 하나의 행 수 (93열 float64 기준 약 7.4 MB)
+FLUSH_INTERVAL = 1.0    # 백그라운드 flush + 매니페스트 갱신 주기 (초). 크래시 시 최대 이만큼만 유실
+CSV_EXPORT_ROWS = 50000  # CSV 내보내기 시 한 번에 변환하는 행 수
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def _write_json_atomic(path, obj):
+    """임시 파일에 쓰고 os.replace 로 교체합니다. 어느 시점에 죽어도 완전한 파일만 남습니다."""
+    # 스레드/프로세스마다 다른 임시 파일 (같은 .tmp 를 동시에 쓰면 os.replace 가 실패할 수 있음)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SessionRecorder:
+    """
+    수집 데이터를 고정 크기 .npy 세그먼트(memmap)에 바로 기록하는 세션 레코더.
+
+    - 메인 루프는 append() 로 현재 세그먼트의 memmap 행에 직접 씀 (DataFrame/리스트 누적 없음)
+    - 세그먼트가 차면 다음 세그먼트 파일을 열고 계속 기록 -> 세션 길이 제한 없음, RAM 사용량은 세그먼트 하나 분량
+    - 백그라운드 스레드가 FLUSH_INTERVAL 마다 memmap 을 디스크로 flush 하고
+      매니페스트(세그먼트 목록, 세그먼트별 유효 행 수, 컬럼, 지오메트리 파일)를 원자적으로 갱신
+    - 프로그램이 비정상 종료되어도 매니페스트에 기록된 행까지는 load_session()/export_csv() 로 복구 가능
+    """
+    def __init__(self, session_dir, columns, chunk_rows=CHUNK_ROWS, flush_interval=FLUSH_INTERVAL,
+                 dtype=np.float64):
+        self.session_dir = session_dir
+        self.columns = list(columns)
+        self.chunk_rows = int(chunk_rows)
+        self.flush_interval = flush_interval
+        self.dtype = np.dtype(dtype)
+        os.makedirs(session_dir, exist_ok=True)
+
+        self._manifest = {
+            'version': MANIFEST_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'status': 'recording',
+            'columns': self.columns,
+            'dtype': self.dtype.str,
+            'chunk_rows': self.chunk_rows,
+            'total_rows': 0,
+            'segments': [],
+            'geometry': None,
+            'csv': None,
+            'info': {},
+        }
+        self._lock = threading.Lock()  # 세그먼트 목록 교체 시에만 사용 (행 쓰기 경로에는 락 없음)
+        # 매니페스트 dict 수정과 파일 쓰기 (메인 스레드의 set_info/set_geometry 와 flush 스레드가 같이 사용)
+        self._manifest_lock = threading.RLock()
+        self._segments = []            # 완료된 세그먼트: [파일명, 행 수]
+        self._retired = []             # 다 찬 세그먼트의 memmap (백그라운드 스레드가 flush 후 닫음)
+        self._current = None
+        self._current_name = None
+        self._count = 0                # 현재 세그먼트에 기록된 행 수 (메인 스레드 전용)
+        self.rows = 0                  # 전체 기록 행 수
+        self._current, self._current_name = self._open_segment(0)
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.session_dir, MANIFEST_NAME)
+
+    def _open_segment(self, index):
+        name = f"seg_{index:05d}.npy"
+        memmap = np.lib.format.open_memmap(
+            os.path.join(self.session_dir, name), mode='w+',
+            dtype=self.dtype, shape=(self.chunk_rows, len(self.columns)))
+        return memmap, name
+
+    def _rotate_segment(self):
+        # 새 memmap 을 먼저 만들고, 교체는 락 안에서 한 번에 (스냅샷이 같은 세그먼트를 두 번 보지 않도록)
+        memmap, name = self._open_segment(len(self._segments) + 1)
+        with self._lock:
+            self._segments.append([self._current_name, self._count])
+            self._retired.append(self._current)
+            self._current, self._current_name, self._count = memmap, name, 0
+
+    def append(self, row):
+        """한 행(리스트/배열, 길이 = 컬럼 수)을 기록합니다. (메인 스레드 전용)"""
+        if self._count == self.chunk_rows:
+            self._rotate_segment()
+        self._current[self._count] = row
+        self._count += 1
+        self.rows += 1
+
+    def append_rows(self, rows):
+        """(N, 컬럼 수) 배열을 한 번에 기록합니다. (메인 스레드 전용)"""
+        rows = np.asarray(rows, dtype=self.dtype)
+        i = 0
+        while i < len(rows):
+            if self._count == self.chunk_rows:
+                self._rotate_segment()
+            n = min(len(rows) - i, self.chunk_rows - self._count)
+            self._current[self._count:self._count + n] = rows[i:i + n]
+            self._count += n
+            self.rows += n
+            i += n
+
+    def set_geometry(self, filename):
+        """이 세션과 짝이 되는 지오메트리 파일을 매니페스트에 연결합니다. (세션 디렉토리 기준 상대 경로로 기록)"""
+        with self._manifest_lock:
+            self._manifest['geometry'] = os.path.relpath(filename, self.session_dir)
+            self._write_manifest()
+
+    def set_info(self, key, value):
+        """세션 부가 정보(클럭 동기화 통계 등, JSON 직렬화 가능한 값)를 매니페스트의 info 에 기록합니다."""
+        with self._manifest_lock:
+            self._manifest['info'][key] = value
+            self._write_manifest()
+
+    def _snapshot_segments(self):
+        with self._lock:
+            segments = [list(s) for s in self._segments]
+            current, name, count = self._current, self._current_name, self._count
+            retired, self._retired = self._retired, []
+        return segments, retired, current, name, count
+
+    def _write_manifest(self, status=None):
+        with self._manifest_lock:
+            self._write_manifest_locked(status)
+
+    def _write_manifest_locked(self, status):
+        segments, retired, current, name, count = self._snapshot_segments()
+        # 행 수를 먼저 읽고 flush 하므로, 매니페스트에 적히는 행은 항상 디스크에 있는 행
+        for mm in retired:
+            mm.flush()
+        if current is not None:
+            current.flush()
+            if count:
+                segments.append([name, count])
+        if status is not None:
+            self._manifest['status'] = status
+        self._manifest['segments'] = [{'file': f, 'rows': n} for f, n in segments]
+        self._manifest['total_rows'] = sum(n for _, n in segments)
+        self._manifest['updated'] = datetime.now().isoformat(timespec='seconds')
+        _write_json_atomic(self.manifest_path, self._manifest)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self._write_manifest()
+            except Exception as e:
+                # 한 번 실패해도 flush 스레드는 계속 돌아야 함 (스레드가 죽으면 이후 행이 매니페스트에 안 남음)
+                print(f"세션 매니페스트 갱신 실패: {e}")
+
+    def close(self):
+        """백그라운드 flush 를 멈추고, 마지막 세그먼트를 실제 행 수로 잘라 저장한 뒤 세션을 완료 상태로 표시합니다."""
+        self._stop.set()
+        self._flusher.join()
+        with self._lock:
+            current, name, count = self._current, self._current_name, self._count
+            self._current = None
+        path = os.path.join(self.session_dir, name)
+        if count:
+            # 마지막 세그먼트만 실제 길이로 다시 저장 (최대 CHUNK_ROWS 행이라 부담 없음)
+            trimmed = np.array(current[:count])
+            del current
+            np.save(path + '.tmp.npy', trimmed)
+            os.replace(path + '.tmp.npy', path)
+            self._segments.append([name, count])
+        else:
+            del current
+            os.remove(path)
+        self._write_manifest(status='complete')
+        return self.manifest_path
+
+
+def load_manifest(session_dir):
+    with open(os.path.join(session_dir, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_segments(session_dir):
+    """매니페스트에 기록된 유효 행만 세그먼트 단위 memmap 뷰로 순회합니다. (비정상 종료된 세션도 가능)"""
+    manifest = load_manifest(session_dir)
+    for seg in manifest['segments']:
+        data = np.load(os.path.join(session_dir, seg['file']), mmap_mode='r')
+        yield data[:seg['rows']]
+
+
+def load_session(session_dir):
+    """세션 전체를 (columns, (N, 컬럼 수) 배열) 로 읽습니다."""
+    manifest = load_manifest(session_dir)
+    segments = list(iter_segments(session_dir))
+    if segments:
+        data = np.concatenate(segments)
+    else:
+        data = np.empty((0, len(manifest['columns'])), dtype=manifest['dtype'])
+    return manifest['columns'], data
+
+
+def export_csv(session_dir, csv_path, chunk_rows=CSV_EXPORT_ROWS):
+    """
+    세션을 기존 training_data_*.csv 와 같은 형식의 CSV 로 내보냅니다.
+    세그먼트를 chunk_rows 단위로 잘라 이어 쓰므로 세션 길이와 무관하게 메모리 사용량이 일정합니다.
+    """
+    manifest = load_manifest(session_dir)
+    total = 0
+    header = True
+    with open(csv_path, 'w', newline='') as f:
+        for segment in iter_segments(session_dir):
+            for i in range(0, len(segment), chunk_rows):
+                block = pd.DataFrame(np.asarray(segment[i:i + chunk_rows]), columns=manifest['columns'])
+                block.to_csv(f, header=header, index=False)
+                header = False
+                total += len(block)
+        if header:
+            pd.DataFrame(columns=manifest['columns']).to_csv(f, index=False)
+    manifest['csv'] = os.path.relpath(csv_path, session_dir)
+    _write_json_atomic(os.path.join(session_dir, MANIFEST_NAME), manifest)
+    return total
+
+
+if __name__ == '__main__':
+    # 비정상 종료 등으로 CSV 가 만들어지지 않은 세션을 나중에 내보낼 때 사용
+    # 사용법: python session_recorder.py <세션 디렉토리> [출력 CSV 경로]
+    if len(sys.argv) < 2:
+        print("사용법: python session_recorder.py <세션 디렉토리> [출력 CSV 경로]")
+        sys.exit(1)
+    session_dir = sys.argv[1].rstrip('/\\')
+    csv_path = sys.argv[2] if len(sys.argv) > 2 else session_dir + '.csv'
+    t0 = time.time()
+    n = export_csv(session_dir, csv_path)
+    print(f"{n}개 행을 '{csv_path}' 로 내보냈습니다. ({time.time() - t0:.1f}초)")
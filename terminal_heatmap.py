@@ -0,0 +1,232 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+from frame_protocol import STATUS_OK, STATUS_FAIL, BINARY_MODE_COMMAND
+from frame_parser import SENSOR_IDS
+from grid_peaks import SensorGrid
+
+# --- 설정 ---
+REFRESH_HZ = 20.0        # 화면 갱신 주기. 수신 속도와 무관하게 이 주기로 최신 상태만 그림
+HEATMAP_SCALE_UT = 3000.0  # 이 크기 (uT) 이상이면 가장 진한 색. 색 단계는 sqrt 로 압축해 약한 배경장도 보이게 함
+COLOR_LEVELS = 5         # 부호마다 색 단계 수 (0 은 흰색, + 는 빨강, - 는 파랑)
+CELL_WIDTH = 6           # 칸 너비 (문자)
+AXES = 'xyz'
+
+# ANSI 제어 문자열
+CURSOR_HOME = '\x1b[H'
+CLEAR_SCREEN = '\x1b[2J'
+CLEAR_LINE = '\x1b[K'
+CLEAR_BELOW = '\x1b[J'
+HIDE_CURSOR = '\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+RESET = '\x1b[0m'
+
+
+def _build_palette(levels=COLOR_LEVELS):
+    """
+    256 색 큐브 (16 + 36r + 6g + b, 0..5) 로 만든 발산형 팔레트. 인덱스 0 은 가장 진한 파랑, levels 는 흰색,
+    2 * levels 는 가장 진한 빨강. 진한 배경에는 흰 글씨, 옅은 배경에는 검은 글씨.
+    """
+    palette = []
+    for k in range(-levels, levels + 1):
+        fade = 5 - round(5 * abs(k) / levels)           # 0 에서 멀수록 다른 두 채널을 줄임
+        r, g, b = (5, fade, fade) if k > 0 else (fade, fade, 5)
+        foreground = 231 if abs(k) > levels * 0.6 else 16
+        palette.append(f'\x1b[48;5;{16 + 36 * r + 6 * g + b};38;5;{foreground}m')
+    return palette
+
+
+PALETTE = _build_palette()
+FAIL_STYLE = '\x1b[48;5;240;38;5;250m'  # FAIL/R_FAIL 센서 (회색)
+MARK_STYLE = '\x1b[1;4m'                # 표시한 칸 (굵게 + 밑줄, 색은 유지)
+
+
+def _format_cell(value, width=CELL_WIDTH):
+    """칸 너비에 맞춘 값 문자열. 너무 크면 k 단위."""
+    if abs(value) >= 10 ** (width - 2):
+        return f"{value / 1000:>{width - 2}.0f}k "
+    return f"{value:>{width - 1}.0f} "
+
+
+class HeatmapRenderer:
+    """
+    os.system('cls') 없이 ANSI 커서 이동으로 센서 격자를 제자리에 다시 그리는 터미널 히트맵.
+
+    - update(): 수신 루프가 최신 프레임을 넘기는 곳. 마지막 값만 바꿔 두고 바로 반환 (출력/대기 없음)
+    - 그리기는 별도 데몬 스레드가 refresh_hz 주기로 최신 상태만 샘플링해서 한 번의 write 로 출력
+      -> 수신 속도가 화면 속도에 묶이지 않고, 그 사이 들어온 프레임은 그리지 않고 건너뜀
+    - X/Y/Z 세 축을 나란히 색 히트맵으로 표시. FAIL/R_FAIL 센서는 회색, 격자의 빈 칸은 공백
+    - marks (센서 번호 -> 라벨) 는 값 대신 라벨을 굵게 표시, lines 는 격자 아래에 덧붙이는 텍스트
+    update() 는 한 스레드에서만 호출합니다. (값 교체는 튜플 대입 한 번이라 락이 필요 없음)
+    """
+    def __init__(self, grid, title='Sensor Heatmap', refresh_hz=REFRESH_HZ, scale=HEATMAP_SCALE_UT,
+                 axes=AXES, stream=sys.stdout):
+        self.grid = grid
+        self.title = title
+        self.period = 1.0 / refresh_hz
+        self.scale = float(scale)
+        self.axes = [AXES.index(a) for a in axes]
+        self.axis_names = axes.upper()
+        self.stream = stream
+        self._latest = None
+        self._frames = 0      # update() 로 받은 누적 프레임 수 (수신 속도 표시용)
+        self._version = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.draws = 0
+        self.draw_time = 0.0
+        self.updates = 0
+        self.rate = 0.0       # 최근 1 초 수신 속도 (frames/s)
+
+    def start(self):
+        if os.name == 'nt':
+            os.system('')  # Windows 콘솔의 ANSI (VT) 처리 활성화
+        self.stream.write(HIDE_CURSOR + CLEAR_SCREEN)
+        self.stream.flush()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """마지막 상태를 한 번 더 그리고 커서를 되돌립니다. 두 번 불러도 안전합니다."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.draw()
+        self.stream.write(RESET + SHOW_CURSOR + '\n')
+        self.stream.flush()
+
+    def update(self, values, status=None, frames=1, marks=None, lines=()):
+        """
+        values: 최신 프레임 (S, 3) 또는 (S * 3,) (uT), status: (S,) STATUS_* (None 이면 모두 OK),
+        frames: 이번 호출까지 새로 받은 프레임 수 (배치 단위로 호출하면 배치 크기).
+        값은 복사해 두므로 호출한 쪽에서 배열을 다시 써도 됩니다.
+        """
+        values = np.array(values, dtype=np.float32).reshape(-1, 3)
+        status = np.zeros(len(values), dtype=np.int8) if status is None else np.array(status, dtype=np.int8)
+        self._latest = (values, status, dict(marks or {}), list(lines))
+        self._frames += frames
+        self._version += 1
+        self.updates += 1
+
+    def _run(self):
+        drawn = -1
+        last_time, last_frames = time.perf_counter(), 0
+        while not self._stop.wait(self.period):
+            now, frames = time.perf_counter(), self._frames
+            if now - last_time >= 1.0:
+                self.rate = (frames - last_frames) / (now - last_time)
+                last_time, last_frames = now, frames
+            if self._version == drawn:
+                continue
+            drawn = self._version
+            try:
+                self.draw()
+            except Exception as e:
+                self.stream.write(f"\n화면 출력 실패: {e}\n")
+
+    def draw(self):
+        """현재 최신 상태를 한 번 그립니다. (그리기 스레드 또는 stop() 에서 호출)"""
+        latest = self._latest
+        if latest is None:
+            return
+        t0 = time.perf_counter()
+        text = self.render(*latest)
+        self.stream.write(CURSOR_HOME + text + CLEAR_BELOW)
+        self.stream.flush()
+        self.draw_time += time.perf_counter() - t0
+        self.draws += 1
+
+    def render(self, values, status, marks, lines):
+        """화면 전체 문자열. 줄마다 끝을 지워서 이전 화면의 긴 줄이 남지 않게 합니다."""
+        grid = self.grid
+        cells = grid.cell_index
+        ok = status == STATUS_OK
+        # 센서 x 축마다 색 단계: sign * sqrt(|v| / scale) 를 -levels..levels 로
+        with np.errstate(invalid='ignore'):
+            level = np.rint(np.sign(values) * np.sqrt(np.minimum(np.abs(values) / self.scale, 1.0)) * COLOR_LEVELS)
+        level = np.nan_to_num(level).astype(int) + COLOR_LEVELS
+
+        width = grid.shape[1] * CELL_WIDTH
+        out = [f"--- {self.title} --- {self.rate:,.0f} frames/s, {1 / self.period:.0f} Hz, "
+               f"scale ±{self.scale:.0f} uT ---",
+               '   '.join(f"{name:<{width}}" for name in self.axis_names)]
+        for r in range(grid.shape[0]):
+            panels = []
+            for axis in self.axes:
+                row = []
+                for sensor in cells[r]:
+                    if sensor < 0:
+                        row.append(' ' * CELL_WIDTH)
+                    elif not ok[sensor]:
+                        row.append(FAIL_STYLE + (' FAIL ' if status[sensor] == STATUS_FAIL else 'R_FAIL')[:CELL_WIDTH] + RESET)
+                    elif sensor in marks:
+                        row.append(PALETTE[level[sensor, axis]] + MARK_STYLE
+                                   + f"{marks[sensor]:^{CELL_WIDTH}}"[:CELL_WIDTH] + RESET)
+                    else:
+                        row.append(PALETTE[level[sensor, axis]] + _format_cell(values[sensor, axis]) + RESET)
+                panels.append(''.join(row))
+            out.append('   '.join(panels))
+        out.extend(lines)
+        return (CLEAR_LINE + '\n').join(out) + CLEAR_LINE + '\n'
+
+    def stats(self):
+        return {'refresh_hz': 1 / self.period, 'updates': self.updates, 'frames': self._frames, 'draws': self.draws,
+                'mean_draw_ms': round(self.draw_time / self.draws * 1e3, 3) if self.draws else None}
+
+
+def main(argv=None):
+    from replay_serial import open_serial
+    from serial_stream import make_frame_ring, serial_reader
+    from sensor_simulator import sensor_layout
+
+    parser = argparse.ArgumentParser(description="Live terminal heatmap of all sensor axes.")
+    parser.add_argument('port', help="serial port, 'replay:<session>' or 'sim:?patches=2'")
+    parser.add_argument('--mode', default='binary', choices=('ascii', 'binary'))
+    parser.add_argument('--baud', type=int, default=1000000)
+    parser.add_argument('--hz', type=float, default=REFRESH_HZ)
+    parser.add_argument('--scale', type=float, default=HEATMAP_SCALE_UT)
+    parser.add_argument('--axes', default=AXES)
+    parser.add_argument('--no-render', action='store_true', help="ingest only (to compare the frame rate)")
+    args = parser.parse_args(argv)
+
+    ser = open_serial(args.port, args.baud, timeout=1)
+    while ser.readline().decode('utf-8', 'ignore').strip() != 'START':
+        pass
+    if args.mode == 'binary':
+        ser.write(BINARY_MODE_COMMAND)
+    ring = make_frame_ring()
+    stop = threading.Event()
+    reader = threading.Thread(target=serial_reader, args=(ser, ring, stop, args.mode))
+    reader.start()
+    renderer = HeatmapRenderer(SensorGrid(sensor_layout(3, 8), SENSOR_IDS), refresh_hz=args.hz, scale=args.scale,
+                               axes=args.axes, title=args.port)
+    if not args.no_render:
+        renderer.start()
+    count, t0 = 0, time.perf_counter()
+    try:
+        while True:
+            frames = ring.read(timeout=0.1)
+            if len(frames):
+                count += len(frames)
+                renderer.update(frames['values'][-1], frames['status'][-1], len(frames),
+                                lines=["Ctrl+C to stop."])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.perf_counter() - t0
+        renderer.stop()
+        stop.set()
+        reader.join()
+        ser.close()
+    print(f"Ingested {count} frames in {elapsed:.1f} s ({count / elapsed:,.0f} frames/s), renderer {renderer.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import os
+import time
+import argparse
+from urllib.parse import parse_qsl
+import numpy as np
+import pandas as pd
+
+from pose_math import as_matrix, euler_to_matrix, tracker_column_prefixes, rotations_from_columns
+
+# --- 설정 ---
+MOCK_PREFIX = 'mock'          # open_tracker_provider('mock:circle') / 'mock:<training_data CSV>?latency_us=300&loop=1'
+MOCK_FIRST_DEVICE_ID = 1      # OpenVR 처럼 0 번은 HMD 자리로 비워 둠
+SYNTHETIC_RATE_HZ = 100.0     # 합성 궤적에서 get_poses() 한 번이 진행하는 시간 (1 / 샘플링 주파수)
+CIRCLE_RADIUS = 0.05          # 합성 원 궤적 반지름 (m)
+CIRCLE_PERIOD = 4.0           # 합성 원 궤적 한 바퀴 시간 (s)
+BENCHMARK_FRAMES = 20000
+
+
+def load_tracker_poses(path):
+    """
+    수집 CSV 의 트래커 컬럼에서 (N, T, 3, 4) 포즈 행렬과 (N, T) 유효 여부를 읽습니다.
+    회전은 rot_quat_{x,y,z,w} / rot_{x,y,z,w} 쿼터니언, 없으면 rot_roll/pitch/yaw, 그것도 없으면 단위 행렬.
+    수집 스크립트는 트래커를 못 읽은 행을 0 으로 채우므로 위치와 회전이 모두 0 인 포즈는 무효로 봅니다.
+    """
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    prefixes = tracker_column_prefixes(columns)
+    if not prefixes:
+        raise ValueError(f"No tracker pose columns in '{path}'.")
+    data = pd.read_csv(path, usecols=[c for c in columns if c.startswith(tuple(prefixes))])
+    n = len(data)
+    poses = np.zeros((n, len(prefixes), 3, 4))
+    for t, prefix in enumerate(prefixes):
+        rot = rotations_from_columns(data, prefix)
+        poses[:, t, :, :3] = np.eye(3) if rot is None else rot
+        poses[:, t, :, 3] = data[[f'{prefix}pos_{a}' for a in 'xyz']].to_numpy(dtype=np.float64)
+    valid = np.any(poses != 0, axis=(2, 3))
+    return np.nan_to_num(poses), valid
+
+
+def circle_trajectory(num_frames, num_trackers, rate_hz=SYNTHETIC_RATE_HZ):
+    """합성 궤적: 트래커마다 위상이 다른 수평 원 운동 + 진행 방향으로 yaw 회전. (N, T, 3, 4), 모두 유효."""
+    t = np.arange(num_frames) / rate_hz
+    poses = np.zeros((num_frames, num_trackers, 3, 4))
+    for k in range(num_trackers):
+        angle = 2 * np.pi * t / CIRCLE_PERIOD + np.pi * k
+        poses[:, k, :, :3] = euler_to_matrix(np.zeros_like(t), np.zeros_like(t), np.degrees(angle))
+        poses[:, k, 0, 3] = 0.1 * k + CIRCLE_RADIUS * np.cos(angle)
+        poses[:, k, 1, 3] = CIRCLE_RADIUS * np.sin(angle)
+        poses[:, k, 2, 3] = 0.02 * np.sin(2 * angle)
+    return poses, np.ones((num_frames, num_trackers), dtype=bool)
+
+
+def static_trajectory(num_trackers):
+    poses = np.zeros((1, num_trackers, 3, 4))
+    poses[:, :, :, :3] = np.eye(3)
+    poses[0, :, 0, 3] = 0.1 * np.arange(num_trackers)
+    return poses, np.ones((1, num_trackers), dtype=bool)
+
+
+class TrackerProvider:
+    """
+    트래커 포즈 공급자 공통 인터페이스. 수집 스크립트는 이 인터페이스만 사용합니다.
+    get_poses() 는 기존 get_tracker_poses 와 같은 {장치 ID: {'pos': [x, y, z], 'matrix': 3x4}} 를 반환하고
+    (유효하지 않은 트래커는 빠짐), 호출 횟수와 소요 시간을 집계해 stats() 로 포즈 경로 비용을 보여 줍니다.
+    """
+    name = None
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+
+    def find_trackers(self, count=None):
+        raise NotImplementedError
+
+    def _query(self, tracker_ids):
+        raise NotImplementedError
+
+    def get_poses(self, tracker_ids):
+        t0 = time.perf_counter()
+        poses = self._query(tracker_ids)
+        self.total_time += time.perf_counter() - t0
+        self.calls += 1
+        return poses
+
+    def get_pose(self, tracker_id):
+        """단일 트래커의 (pos, matrix). 유효하지 않으면 (None, None)."""
+        pose = self.get_poses([tracker_id]).get(tracker_id)
+        return (pose['pos'], pose['matrix']) if pose else (None, None)
+
+    def get_pose_array(self, tracker_ids):
+        """get_poses() 결과를 (T, 3, 4) 행렬 배열과 (T,) 유효 여부로 반환합니다. (pose_sampler 용)"""
+        poses = self.get_poses(tracker_ids)
+        matrices = np.zeros((len(tracker_ids), 3, 4))
+        valid = np.zeros(len(tracker_ids), dtype=bool)
+        for k, tracker_id in enumerate(tracker_ids):
+            pose = poses.get(tracker_id)
+            if pose:
+                matrices[k] = as_matrix(pose['matrix'])
+                valid[k] = True
+        return matrices, valid
+
+    def stats(self):
+        mean = self.total_time / self.calls if self.calls else 0.0
+        return {'backend': self.name, 'calls': self.calls, 'mean_us': mean * 1e6,
+                'max_fps': 1.0 / mean if mean > 0 else float('inf')}
+
+    def shutdown(self):
+        pass
+
+
+class OpenVRProvider(TrackerProvider):
+    """SteamVR(OpenVR) 백엔드. 프레임마다 getDeviceToAbsoluteTrackingPose 를 한 번 호출해 요청한 트래커를 모두 읽습니다."""
+    name = 'openvr'
+
+    def __init__(self):
+        super().__init__()
+        import openvr
+        self.openvr = openvr
+        self.vr_system = openvr.init(openvr.VRApplication_Other)
+
+    def find_trackers(self, count=None):
+        openvr = self.openvr
+        tracker_ids = []
+        for i in range(openvr.k_unMaxTrackedDeviceCount):
+            if self.vr_system.getTrackedDeviceClass(i) == openvr.TrackedDeviceClass_GenericTracker:
+                tracker_ids.append(i)
+                if count is not None and len(tracker_ids) == count:
+                    break
+        return tracker_ids
+
+    def _query(self, tracker_ids):
+        # 필요한 장치 번호까지만 요청 (전체 k_unMaxTrackedDeviceCount 개를 받아 오는 변환 비용을 줄임)
+        poses = self.vr_system.getDeviceToAbsoluteTrackingPose(
+            self.openvr.TrackingUniverseStanding, 0, max(tracker_ids) + 1)
+        tracker_data = {}
+        for tracker_id in tracker_ids:
+            if poses[tracker_id].bPoseIsValid:
+                matrix = poses[tracker_id].mDeviceToAbsoluteTracking
+                tracker_data[tracker_id] = {'pos': [matrix[0][3], matrix[1][3], matrix[2][3]], 'matrix': matrix}
+        return tracker_data
+
+    def shutdown(self):
+        self.openvr.shutdown()
+
+
+class MockTrackerProvider(TrackerProvider):
+    """
+    SteamVR 없이 쓰는 결정적 백엔드. 미리 계산한 (N, T, 3, 4) 포즈를 get_poses() 호출마다 한 행씩 내보냅니다.
+    (수집 스크립트는 센서 프레임마다 한 번 호출하므로 녹화된 CSV 의 행 순서가 그대로 재현됨)
+    latency_us 를 주면 호출마다 그만큼 바쁜 대기를 해서 실제 OpenVR 호출 비용을 흉내 냅니다.
+    """
+    name = 'mock'
+
+    def __init__(self, poses, valid, loop=True, latency_us=0.0):
+        super().__init__()
+        self.poses = np.asarray(poses, dtype=np.float64)
+        self.valid = np.asarray(valid, dtype=bool)
+        self.loop = loop
+        self.latency = latency_us * 1e-6
+        self.index = 0
+        self.device_ids = list(range(MOCK_FIRST_DEVICE_ID, MOCK_FIRST_DEVICE_ID + self.poses.shape[1]))
+        self._slot = {device_id: k for k, device_id in enumerate(self.device_ids)}
+
+    @classmethod
+    def from_source(cls, source='circle', num_trackers=2, loop=True, latency_us=0.0):
+        """source: 'circle', 'static' 또는 트래커 컬럼이 있는 수집 CSV 경로."""
+        if source == 'circle':
+            poses, valid = circle_trajectory(int(CIRCLE_PERIOD * SYNTHETIC_RATE_HZ), num_trackers)
+        elif source == 'static':
+            poses, valid = static_trajectory(num_trackers)
+        elif os.path.exists(source):
+            poses, valid = load_tracker_poses(source)
+        else:
+            raise ValueError(f"Unknown mock tracker source '{source}' (use 'circle', 'static' or a CSV path).")
+        return cls(poses, valid, loop=loop, latency_us=latency_us)
+
+    def find_trackers(self, count=None):
+        return self.device_ids[:count]
+
+    def _query(self, tracker_ids):
+        if self.latency:
+            deadline = time.perf_counter() + self.latency
+            while time.perf_counter() < deadline:
+                pass
+        row = self.index
+        if self.index + 1 < len(self.poses):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+        tracker_data = {}
+        for tracker_id in tracker_ids:
+            k = self._slot.get(tracker_id)
+            if k is not None and self.valid[row, k]:
+                matrix = self.poses[row, k]
+                tracker_data[tracker_id] = {'pos': matrix[:, 3].tolist(), 'matrix': matrix}
+        return tracker_data
+
+
+def open_tracker_provider(source='openvr', num_trackers=2):
+    """
+    수집 스크립트용 트래커 공급자 열기.
+    'openvr' -> SteamVR, 'mock' / 'mock:circle' / 'mock:static' / 'mock:<CSV 경로>[?latency_us=300&loop=0]' -> 모의 공급자.
+    """
+    if source == 'openvr':
+        return OpenVRProvider()
+    if source == MOCK_PREFIX or source.startswith(MOCK_PREFIX + ':'):
+        spec, _, query = source[len(MOCK_PREFIX) + 1:].partition('?')
+        params = dict(parse_qsl(query))
+        return MockTrackerProvider.from_source(spec or 'circle', num_trackers,
+                                               loop=params.get('loop', '1') not in ('0', 'false', ''),
+                                               latency_us=float(params.get('latency_us', 0.0)))
+    raise ValueError(f"Unknown tracker source '{source}'.")
+
+
+def benchmark(provider, tracker_ids, num_frames=BENCHMARK_FRAMES, per_frame=None):
+    """
+    수집 루프처럼 프레임마다 get_poses() 를 호출해 포즈 경로만의 처리량(frames/s)을 측정합니다.
+    per_frame(poses) 를 주면 포즈 -> 행 변환 비용까지 포함합니다.
+    """
+    t0 = time.perf_counter()
+    for _ in range(num_frames):
+        poses = provider.get_poses(tracker_ids)
+        if per_frame is not None:
+            per_frame(poses)
+    elapsed = time.perf_counter() - t0
+    return num_frames / elapsed, elapsed / num_frames * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tracker pose path used by the collection scripts.")
+    parser.add_argument('source', nargs='?', default='mock:circle',
+                        help="'openvr', 'mock:circle', 'mock:static' or 'mock:<training_data CSV>[?latency_us=..]'")
+    parser.add_argument('--trackers', type=int, default=2)
+    parser.add_argument('--frames', type=int, default=BENCHMARK_FRAMES)
+    args = parser.parse_args(argv)
+
+    provider = open_tracker_provider(args.source, args.trackers)
+    try:
+        tracker_ids = provider.find_trackers(args.trackers)
+        if not tracker_ids:
+            print("No trackers found.")
+            return
+        fps, us = benchmark(provider, tracker_ids, args.frames)
+        print(f"{provider.name}: trackers {tracker_ids}, {args.frames} frames")
+        print(f"pose path: {us:.1f} us/frame -> at most {fps:.0f} frames/s")
+    finally:
+        provider.shutdown()
+
+
+if __name__ == '__main__':
+    main()